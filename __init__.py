@@ -12,6 +12,7 @@ if "bpy" in locals():
 	
 	imp.reload(modifiers) 
 	imp.reload(platforms)
+	imp.reload(mesh_simplify)
 
 
 else:
@@ -26,6 +27,7 @@ else:
 
 	from . import modifiers
 	from . import platforms
+	from . import mesh_simplify
 
 
 import bpy, bmesh
@@ -70,9 +72,81 @@ from bpy.props import (
 class Panel_Preferences(bpy.types.AddonPreferences):
 	bl_idname = __name__
 
+	export_workers: bpy.props.IntProperty (
+		name="Export Workers",
+		default=1,
+		min=1,
+		max=64,
+		description="Number of background Blender processes exporting bundles in parallel. 1 exports in this Blender"
+	)
+	native_fbx: bpy.props.BoolProperty (
+		name="Native FBX Writer",
+		default=False,
+		description="Write Unity and Unreal FBX files of static meshes with the add-on's own writer instead of Blender's FBX exporter. Bundles with armatures, shape keys or animation always use Blender's exporter"
+	)
+	export_threads: bpy.props.IntProperty (
+		name="Writer Threads",
+		default=0,
+		min=0,
+		max=16,
+		description="Threads writing files while the next bundles are read from Blender, for platforms with the add-on's own writers. 0 writes each file before reading the next bundle"
+	)
+	export_batch: bpy.props.BoolProperty (
+		name="Batch FBX Export",
+		default=False,
+		description="Stage all bundles first and write them with a single call of Blender's FBX exporter, faster for many small bundles. Uses more memory"
+	)
+	memory_bounded: bpy.props.BoolProperty (
+		name="Memory Bounded",
+		default=False,
+		description="For very large bundles: merge meshes in batches, free temporary data after every bundle and turn off undo while exporting. Slower"
+	)
+	memory_limit: bpy.props.IntProperty (
+		name="Memory Limit (MB)",
+		default=0,
+		min=0,
+		description="Memory above which merge batches get smaller and written files are flushed before reading more bundles. 0 for no limit"
+	)
+	cache_folder: bpy.props.StringProperty (
+		name="Cache Folder",
+		default="",
+		subtype='DIR_PATH',
+		description="Folder for generated data reused across exports, such as LOD meshes. Can be shared by a team. Empty uses the system's temp folder"
+	)
+	profile_memory: bpy.props.BoolProperty (
+		name="Profile Memory",
+		default=False,
+		description="Trace Python allocations and resident memory around every export stage and modifier, and list the top allocation sites in the export report. Slows exports down"
+	)
+	profile_calls: bpy.props.BoolProperty (
+		name="Profile Calls",
+		default=False,
+		description="Write a cProfile .prof file per bundle to .fbxbundle_profiles in the output folder"
+	)
+
 	def draw(self, context):
 		layout = self.layout
 
+		box = layout.box()
+		row = box.row()
+		row.label(text="Export")
+		col = box.column(align=True)
+		col.prop(self, "export_workers")
+		col.prop(self, "export_threads")
+		col.prop(self, "native_fbx")
+		col.prop(self, "export_batch")
+		col.prop(self, "memory_bounded")
+		row = col.row()
+		row.enabled = self.memory_bounded
+		row.prop(self, "memory_limit")
+		col.prop(self, "cache_folder")
+
+		box = layout.box()
+		row = box.row()
+		row.label(text="Profiling")
+		col = box.column(align=True)
+		col.prop(self, "profile_memory")
+		col.prop(self, "profile_calls")
 
 		box = layout.box()
 		row = box.row()
@@ -122,6 +196,7 @@ class FBXBundleSettings(bpy.types.PropertyGroup):
 			('UNREAL', 'Unreal', 'Unreal engine export'),
 			('BLENDER', 'Collada', 'Default Blender *.DAE export'),
 			('GLTF', 'glTF', 'GL Transmission Format'),
+			('GLB', 'GLB', 'Binary glTF, written by the add-on'),
 			('OBJ', 'OBJ', 'OBJ'),
 			('HOUDINI', 'Houdini', 'SideFX Houdini export')
 		], 
@@ -129,6 +204,16 @@ class FBXBundleSettings(bpy.types.PropertyGroup):
 		name = "Target Platform", 
 		default = 'UNITY'
 	)
+	quantize: bpy.props.BoolProperty (
+		name="Quantize Vertices",
+		default=False,
+		description="Store glTF positions, normals and UVs as 8 and 16 bit integers (KHR_mesh_quantization), for static meshes"
+	)
+	deterministic: bpy.props.BoolProperty (
+		name="Reproducible",
+		default=False,
+		description="Export identical files for identical input: fixed timestamps and names, objects in name order"
+	)
 
 
 
@@ -168,13 +253,17 @@ class Panel_Core(bpy.types.Panel):
 		row.prop(context.scene.FBXBundleSettings, "mode_bundle", text="Bundle", icon='GROUP')
 		row.operator("wm.url_open", text="", icon='QUESTION').url = "http://renderhjs.net/fbxbundle/#settings_bundle"
 
+		row = col.row(align=True)
+		row.prop(context.scene.FBXBundleSettings, "deterministic")
+		if mode in ('GLTF', 'GLB'):
+			row.prop(context.scene.FBXBundleSettings, "quantize")
 
 		col = box.column(align=True)
 		row = col.row(align=True)
 
 		# Warnings
 
-		if context.space_data.local_view:
+		if context.space_data and context.space_data.local_view:
 			box = col.box()
 			box.label(text="Can't export in local view mode.", icon='CANCEL')
 
@@ -261,7 +350,9 @@ class Panel_Files(bpy.types.Panel):
 		
 		c = split.column(align=True)
 		c.scale_y = 1.85
-		c.operator(op_file_export.op.bl_idname, text="Export {}x".format(len(bundles)), icon_value=icon)
+		r = c.row(align=True)
+		r.operator(op_file_export.op.bl_idname, text="Export {}x".format(len(bundles)), icon_value=icon)
+		r.operator(op_file_export.op.bl_idname, text="", icon='FILE_REFRESH').force = True
 		
 
 		if len(bpy.context.scene.FBXBundleSettings.recent) > 0:
@@ -377,9 +468,9 @@ def icon_get(name):
 
 
 preview_icons = None
-def icon_register(fileName):
+def icon_register(fileName, name=None):
 	print(fileName)
-	name = fileName.split('.')[0]   # Don't include file extension
+	name = name or fileName.split('.')[0]   # Don't include file extension
 	icons_dir = os.path.join(os.path.dirname(__file__), "icons")
 	preview_icons.load(name, os.path.join(icons_dir, fileName), 'IMAGE')
 
@@ -407,6 +498,9 @@ def register():
 	# Register scene settings
 	bpy.types.Scene.FBXBundleSettings= bpy.props.PointerProperty(type=FBXBundleSettings)
 
+	# Keep the bundle index in sync with scene changes
+	objects_organise.handlers_register()
+
 	# Register modifier settings
 	for modifier in modifiers.modifiers:
 		print("loop name: {}".format(modifier.__module__))
@@ -426,13 +520,16 @@ def register():
 	]
 	for icon in icons:
 		icon_register(icon)
+	icon_register("gltf.png", "glb")
 
-	# handle the keymap
-	km = bpy.context.window_manager.keyconfigs.addon.keymaps.new(name='Object Mode', space_type='EMPTY')
-	kmi = km.keymap_items.new(op_file_export.op.bl_idname, 'E', 'PRESS', ctrl=True, shift=False)
-	kmi = km.keymap_items.new(op_file_export_recent.op.bl_idname, 'E', 'PRESS', ctrl=True, shift=True)
-	# kmi.properties.total = 4
-	addon_keymaps.append(km)
+	# handle the keymap (no addon keyconfig when running in background)
+	kc = bpy.context.window_manager.keyconfigs.addon
+	if kc:
+		km = kc.keymaps.new(name='Object Mode', space_type='EMPTY')
+		kmi = km.keymap_items.new(op_file_export.op.bl_idname, 'E', 'PRESS', ctrl=True, shift=False)
+		kmi = km.keymap_items.new(op_file_export_recent.op.bl_idname, 'E', 'PRESS', ctrl=True, shift=True)
+		# kmi.properties.total = 4
+		addon_keymaps.append(km)
 
 
 
@@ -448,10 +545,15 @@ def unregister():
 	#Unregister Settings
 	del bpy.types.Scene.FBXBundleSettings
 
+	objects_organise.handlers_unregister()
+
 	# Unregister modifier settings
 	for modifier in modifiers.modifiers:
 		modifier.unregister()
 
+	# Worker processes of the quadric simplifier
+	mesh_simplify.shutdown()
+
 	# Remove icons
 	icons_unregister()
 
@@ -0,0 +1,457 @@
+import bpy
+import os
+import time
+import pathlib
+import traceback
+import collections
+import contextlib
+import concurrent.futures
+import imp
+
+from . import objects_organise
+from . import modifiers
+from . import platforms
+from . import export_manifest
+from . import export_parallel
+from . import export_copies
+from . import export_report
+from . import export_output
+from . import export_memory
+
+imp.reload(objects_organise)
+imp.reload(modifiers)
+imp.reload(platforms)
+imp.reload(export_manifest)
+imp.reload(export_parallel)
+imp.reload(export_copies)
+imp.reload(export_report)
+imp.reload(export_output)
+imp.reload(export_memory)
+
+
+# Scripting interface for planning and exporting bundles from explicit
+# inputs, independent of the selection and the scene's FBX Bundle settings:
+#
+#	from fbx_bundle import api
+#	plan = api.plan(bpy.data.collections['Props'].all_objects, 'PARENT')
+#	results = api.export(plan, 'UNITY', "/path/to/output")
+
+
+class Bundle:
+	# Objects exported together into one file, placed relative to the pivot
+	def __init__(self, name, objects, pivot):
+		self.name = name
+		self.objects = objects
+		self.pivot = pivot
+
+	def __repr__(self):
+		return "Bundle({!r}, {}x objects)".format(self.name, len(self.objects))
+
+
+
+class Result:
+	# Outcome of a bundle export, status is 'EXPORTED', 'UNCHANGED' or 'FAILED'
+	def __init__(self, name, path, status, error=None):
+		self.name = name
+		self.path = path
+		self.status = status
+		self.error = error
+
+	def __repr__(self):
+		return "Result({!r}, {!r}, {})".format(self.name, self.path, self.status)
+
+
+
+def plan(objects, mode, scene=None, view_layer=None, fast=False):
+	# Bundles of the given objects for a bundle mode ('PARENT', 'COLLECTION',
+	# 'COLLECTION_INSTANCE' or 'SCENE'), expanded like a selection would be
+	scene = scene or bpy.context.scene
+	view_layer = view_layer or bpy.context.view_layer
+
+	graph = objects_organise.ObjectGraph(scene, view_layer)
+	objects = objects_organise.collect_objects(objects, mode, graph, scene, fast)
+	bundles = objects_organise.group_bundles(objects, mode, graph, scene)
+
+	return [Bundle(name, objects, objects_organise.get_pivot(objects, graph, mode).copy()) for name, objects in bundles.items()]
+
+
+
+def get_active_modifiers():
+	return [modifier for modifier in modifiers.modifiers if modifier.get("active")]
+
+
+
+def get_path(name, folder, platform, modifiers=None):
+	# Output file of a bundle after the modifiers renamed it
+	if modifiers is None:
+		modifiers = get_active_modifiers()
+
+	path_folder = folder
+	path_name = name
+	for modifier in modifiers:
+		path_folder = modifier.process_path(path_name, path_folder)
+		path_name = modifier.process_name(path_name)
+
+	return os.path.join(path_folder, path_name) + "." + platforms.platforms[platform].extension
+
+
+
+def export(plan, platform, folder, modifiers=None, force=False, workers=1, report=None, batch=False, threads=0, memory_limit=None):
+	# Export a plan to folder for a platform ('UNITY', 'UNREAL', ...). Uses the
+	# scene's active modifiers unless a list is given. Returns a Result per bundle.
+	# Timings are added to 'report' if given and saved next to the files. With
+	# 'batch' platforms that support it write all bundles with one exporter call,
+	# with 'threads' files are written on that many threads while the next
+	# bundles are read. A 'memory_limit' in MB, 0 for no limit, exports memory
+	# bounded, see export_memory.
+	if platform not in platforms.platforms:
+		raise ValueError("Platform '{}' not supported".format(platform))
+
+	valid, message = platforms.platforms[platform].is_valid()
+	if not valid:
+		raise ValueError(message)
+
+	if modifiers is None:
+		modifiers = get_active_modifiers()
+
+	if report is None:
+		report = export_report.Report()
+
+	# Other exporters writing to the same folder wait for this one
+	with export_output.lock(folder):
+		return export_locked(plan, platform, folder, modifiers, force, workers, report, batch, threads, memory_limit)
+
+
+
+def export_locked(plan, platform, folder, modifiers, force, workers, report, batch, threads, memory_limit):
+	state = store_state()
+	bounded = export_memory.bounded(memory_limit) if memory_limit is not None else contextlib.nullcontext()
+	try:
+		with export_report.count_operators(report), bounded:
+			if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+				bpy.ops.object.mode_set(mode='OBJECT')
+
+			bpy.context.scene.unit_settings.system = 'METRIC'
+			bpy.context.tool_settings.transform_pivot_point = 'MEDIAN_POINT'
+
+			# Skip bundles whose inputs match the last export
+			manifest = export_manifest.Manifest(folder)
+			depsgraph = bpy.context.evaluated_depsgraph_get()
+			results = []
+			pending = {}
+
+			for bundle in plan:
+				path_full = get_path(bundle.name, folder, platform, modifiers)
+				with report.stage("fingerprint", bundle.name):
+					fingerprint = export_manifest.get_fingerprint(bundle, platform, modifiers, depsgraph)
+				if not force and manifest.is_unchanged(path_full, fingerprint):
+					results.append(Result(bundle.name, path_full, 'UNCHANGED'))
+				else:
+					pending[bundle.name] = (bundle, path_full, fingerprint)
+
+			# Export in background workers, in one batch, pipelined or bundle by bundle
+			errors = {}
+			bundles = [bundle for bundle, path_full, fingerprint in pending.values()]
+			if workers > 1 and len(pending) > 1:
+				errors = export_parallel.export(bundles, folder, platform, modifiers, workers, report)
+			elif batch and len(pending) > 1 and can_batch(bundles, platform):
+				errors = export_batch(bundles, folder, platform, modifiers, depsgraph, report)
+			elif threads > 0 and len(pending) > 1:
+				errors = export_pipelined(bundles, folder, platform, modifiers, depsgraph, report, threads)
+			else:
+				for bundle, path_full, fingerprint in pending.values():
+					try:
+						export_bundle(bundle, folder, platform, modifiers, depsgraph, report)
+					except Exception:
+						traceback.print_exc()
+						errors[bundle.name] = traceback.format_exc().strip().splitlines()[-1]
+
+			for name, (bundle, path_full, fingerprint) in pending.items():
+				if name in errors:
+					results.append(Result(name, path_full, 'FAILED', errors[name]))
+				else:
+					manifest.set(path_full, fingerprint)
+					results.append(Result(name, path_full, 'EXPORTED'))
+
+			manifest.save()
+
+	finally:
+		restore_state(state)
+
+	for result in results:
+		report.set_bundle(result.name, path=result.path, status=result.status, error=result.error)
+	report.save(folder)
+
+	return results
+
+
+
+def export_bundle(bundle, folder, platform, modifiers, depsgraph=None, report=None):
+	# Modifiers and the exporter work on temporary copies, the scene is left as is
+	if report is None:
+		report = export_report.Report()
+
+	copies, processed_objects = process_bundle(bundle, modifiers, depsgraph, report)
+	try:
+		path_full = get_path(bundle.name, folder, platform, modifiers)
+
+		# Create path if not yet available
+		directory = os.path.dirname(path_full)
+		pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+
+		# Select all objects in the bundle
+		objects_organise.select_objects(processed_objects, objects_organise.get_mesh_type(processed_objects))
+
+		# Export per platform (Unreal, Unity, ...) into a staging folder, files
+		# that changed are then moved over the old ones
+		print("Export {}x = {}".format(len(processed_objects), path_full))
+		staging = export_output.create_staging(directory, os.path.basename(path_full))
+		try:
+			with report.stage("export", bundle.name):
+				# Platforms with their own writers may return extra statistics
+				path_staged = os.path.join(staging, os.path.basename(path_full))
+				statistics = platforms.platforms[platform].file_export(path_staged) or {}
+				write_sidecars(path_staged, processed_objects, modifiers)
+
+			with report.stage("commit", bundle.name):
+				replaced = export_output.commit(staging, directory)
+		finally:
+			export_output.remove_staging(staging)
+
+		set_statistics(bundle, path_full, processed_objects, report, replaced=len(replaced), **statistics)
+
+	finally:
+		# Delete the copies and everything the modifiers made of them
+		with report.stage("cleanup", bundle.name):
+			export_copies.remove(copies)
+
+	return path_full
+
+
+
+def export_batch(bundles, folder, platform, modifiers, depsgraph, report):
+	# Stages every bundle in its own collection and writes them all with one
+	# exporter call. Returns errors by bundle name like export_parallel.
+	errors = {}
+	staged = []
+	staging = export_output.create_staging(folder, "batch")
+	try:
+		for index, bundle in enumerate(bundles):
+			try:
+				copies, processed_objects = process_bundle(bundle, modifiers, depsgraph, report)
+			except Exception:
+				traceback.print_exc()
+				errors[bundle.name] = traceback.format_exc().strip().splitlines()[-1]
+				continue
+
+			# The exporter names files after the collections, the copies
+			# collection gets a plain name that is mapped back to the bundle
+			copies.collection.name = "FBXBundle_Batch_{:04d}".format(index)
+			staged.append((bundle, copies, processed_objects, copies.collection.name))
+
+		print("Export {}x bundles in one batch".format(len(staged)))
+		with report.stage("export"):
+			platforms.platforms[platform].file_export_batch(staging, [copies.collection for bundle, copies, objects, name in staged])
+
+		for bundle, copies, processed_objects, name in staged:
+			path_staged = os.path.join(staging, bpy.path.clean_name(name) + ".fbx")
+			path_full = get_path(bundle.name, folder, platform, modifiers)
+			if not os.path.isfile(path_staged):
+				errors[bundle.name] = "Not written by the batch export"
+				continue
+
+			# Sidecars are named after the staged file, then after the bundle's
+			stem_staged = os.path.splitext(path_staged)[0]
+			for path_sidecar in write_sidecars(path_staged, processed_objects, modifiers):
+				export_output.commit_file(path_sidecar, os.path.splitext(path_full)[0] + path_sidecar[len(stem_staged):])
+
+			with report.stage("commit", bundle.name):
+				replaced = export_output.commit_file(path_staged, path_full)
+			set_statistics(bundle, path_full, processed_objects, report, replaced=int(replaced))
+
+	except Exception:
+		# The batch failed as a whole
+		traceback.print_exc()
+		error = traceback.format_exc().strip().splitlines()[-1]
+		for bundle, copies, processed_objects, name in staged:
+			errors.setdefault(bundle.name, error)
+
+	finally:
+		export_output.remove_staging(staging)
+		# Copies of later bundles renamed objects of earlier ones, undo in reverse
+		for bundle, copies, processed_objects, name in reversed(staged):
+			with report.stage("cleanup", bundle.name):
+				export_copies.remove(copies)
+
+	return errors
+
+
+
+def export_pipelined(bundles, folder, platform, modifiers, depsgraph, report, threads):
+	# Bundle N+1 is read from Blender while threads write the file of bundle N.
+	# At most 'threads' + 1 read bundles wait for their files, which caps the
+	# memory they hold. Returns errors by bundle name like export_parallel.
+	errors = {}
+	pending = collections.deque()
+
+	def finish(bundle, path_full, future, values):
+		try:
+			seconds, replaced, statistics = future.result()
+		except Exception as error:
+			traceback.print_exception(type(error), error, error.__traceback__)
+			errors[bundle.name] = "{}: {}".format(type(error).__name__, error)
+			return
+
+		report.add("write", seconds, 0, bundle.name)
+		report.set_bundle(bundle.name, size=export_report.get_file_size(path_full), replaced=len(replaced), **values, **statistics)
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+		for bundle in bundles:
+			while len(pending) > threads:
+				finish(*pending.popleft())
+
+			# Over the memory limit, write everything read so far first
+			if export_memory.spill_if_over_limit():
+				while pending:
+					finish(*pending.popleft())
+
+			try:
+				path_full, write, staging, values = read_bundle(bundle, folder, platform, modifiers, depsgraph, report)
+			except Exception:
+				traceback.print_exc()
+				errors[bundle.name] = traceback.format_exc().strip().splitlines()[-1]
+				continue
+
+			future = pool.submit(write_staged, write, staging, os.path.dirname(path_full))
+			pending.append((bundle, path_full, future, values))
+
+		while pending:
+			finish(*pending.popleft())
+
+	return errors
+
+
+
+def read_bundle(bundle, folder, platform, modifiers, depsgraph, report):
+	# Main thread part of a pipelined export: copies, modifiers and reading the
+	# data the file needs. Platforms without a deferred writer export right away.
+	copies, processed_objects = process_bundle(bundle, modifiers, depsgraph, report)
+	try:
+		path_full = get_path(bundle.name, folder, platform, modifiers)
+		directory = os.path.dirname(path_full)
+		pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+
+		objects_organise.select_objects(processed_objects, objects_organise.get_mesh_type(processed_objects))
+
+		staging = export_output.create_staging(directory, os.path.basename(path_full))
+		try:
+			path_staged = os.path.join(staging, os.path.basename(path_full))
+			with report.stage("export", bundle.name):
+				write = platforms.platforms[platform].file_export_deferred(path_staged)
+				if write is None:
+					statistics = platforms.platforms[platform].file_export(path_staged) or {}
+					write = lambda: statistics
+				write_sidecars(path_staged, processed_objects, modifiers)
+
+			with report.stage("statistics", bundle.name):
+				values = {'triangles': export_report.get_triangle_count(processed_objects, bpy.context.evaluated_depsgraph_get())}
+
+		except Exception:
+			export_output.remove_staging(staging)
+			raise
+
+	finally:
+		with report.stage("cleanup", bundle.name):
+			export_copies.remove(copies)
+
+	return path_full, write, staging, values
+
+
+
+def write_staged(write, staging, directory):
+	# Writer thread part of a pipelined export, no bpy from here on
+	start = time.perf_counter()
+	try:
+		statistics = write() or {}
+		replaced = export_output.commit(staging, directory)
+	finally:
+		export_output.remove_staging(staging)
+	return time.perf_counter() - start, replaced, statistics
+
+
+
+def write_sidecars(path, objects, modifiers):
+	# Files the modifiers write next to the exported file, returns their paths
+	return [path_sidecar for modifier in modifiers for path_sidecar in modifier.write_sidecars(path, objects)]
+
+
+
+def can_batch(bundles, platform):
+	# Bundles sharing objects can't be staged at the same time
+	objects = [obj for bundle in bundles for obj in bundle.objects]
+	return len(objects) == len(set(objects)) and platforms.platforms[platform].is_batch_supported(objects)
+
+
+
+def process_bundle(bundle, modifiers, depsgraph, report):
+	# Copies of the bundle with the modifiers applied. Returns the copies, to
+	# be removed with export_copies.remove, and the objects to export.
+	export_memory.reset_peak_memory()
+	with report.stage("copies", bundle.name):
+		if depsgraph is None:
+			depsgraph = bpy.context.evaluated_depsgraph_get()
+		else:
+			depsgraph.update()
+
+		copies = export_copies.create(bundle.objects, bundle.pivot, depsgraph)
+
+	try:
+		objects = export_copies.get_objects(copies, bundle.objects)
+
+		# Modifiers and exporters still read the selection, set it once per bundle
+		objects_organise.select_objects(objects, objects[0])
+
+		# Apply modifiers
+		processed_objects = objects
+		for modifier in modifiers:
+			with report.stage("modifier.{}".format(modifier.id), bundle.name):
+				processed_objects = modifier.process_objects(bundle.name, processed_objects)
+
+	except Exception:
+		export_copies.remove(copies)
+		raise
+
+	return copies, processed_objects
+
+
+
+def set_statistics(bundle, path_full, objects, report, **values):
+	with report.stage("statistics", bundle.name):
+		report.set_bundle(bundle.name,
+			size=export_report.get_file_size(path_full),
+			triangles=export_report.get_triangle_count(objects, bpy.context.evaluated_depsgraph_get()),
+			**values
+		)
+
+
+
+def store_state():
+	return {
+		'selection'	: bpy.context.selected_objects.copy(),
+		'active'	: bpy.context.view_layer.objects.active,
+		'unit_system'	: bpy.context.scene.unit_settings.system,
+		'pivot'		: bpy.context.tool_settings.transform_pivot_point,
+		'cursor'	: bpy.context.scene.cursor.location.copy(),
+	}
+
+
+
+def restore_state(state):
+	bpy.context.scene.unit_settings.system = state['unit_system']
+	bpy.context.tool_settings.transform_pivot_point = state['pivot']
+	bpy.context.scene.cursor.location = state['cursor']
+	# Objects joined or removed during export are skipped
+	view_layer_objects = bpy.context.view_layer.objects
+	objects_organise.select_objects([obj for obj in state['selection'] if objects_organise.is_object_alive(obj) and obj.name in view_layer_objects])
+	if objects_organise.is_object_alive(state['active']):
+		view_layer_objects.active = state['active']
@@ -0,0 +1,106 @@
+# Bundle assignment benchmark. Run headless from the add-on folder:
+#
+#	blender -b --factory-startup --python benchmarks/bench_bundles.py -- --max 100000
+#
+# Builds scenes of N empties arranged in parent hierarchies, collections and
+# collection instances, selects everything and times building the bundles
+# in every bundle mode. With linear bundling the time per object stays flat
+# as N grows.
+
+import bpy
+import os
+import sys
+import time
+import argparse
+import importlib
+
+
+def import_addon():
+	# Import the add-on package from the folder this script lives in
+	path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	sys.path.insert(0, os.path.dirname(path))
+	addon = importlib.import_module(os.path.basename(path))
+	if not hasattr(bpy.types.Scene, "FBXBundleSettings"):
+		addon.register()
+	return addon
+
+
+def clear_scene():
+	for obj in list(bpy.data.objects):
+		bpy.data.objects.remove(obj)
+	for collection in list(bpy.data.collections):
+		bpy.data.collections.remove(collection)
+
+
+def build_scene(count, children=10, per_collection=100):
+	# Roots with a chain of children, grouped into collections. Every tenth
+	# root instances the collection of the previous group.
+	scene = bpy.context.scene
+	collections = []
+	root = None
+	for i in range(count):
+		if i % per_collection == 0:
+			collection = bpy.data.collections.new("Group_{}".format(i // per_collection))
+			scene.collection.children.link(collection)
+			collections.append(collection)
+
+		obj = bpy.data.objects.new("Object_{}".format(i), None)
+		collection.objects.link(obj)
+		if i % children == 0:
+			root = obj
+			if i % (children * 10) == 0 and len(collections) > 1:
+				obj.instance_type = 'COLLECTION'
+				obj.instance_collection = collections[-2]
+		else:
+			obj.parent = root
+
+	bpy.context.view_layer.update()
+	for obj in bpy.context.view_layer.objects:
+		obj.select_set(state=True)
+
+
+def run(counts, modes, repeat=3):
+	addon = import_addon()
+	objects_organise = addon.objects_organise
+
+	results = {}
+	for count in counts:
+		clear_scene()
+		build_scene(count)
+
+		for mode in modes:
+			bpy.context.scene.FBXBundleSettings.mode_bundle = mode
+			best = None
+			for i in range(repeat):
+				start = time.perf_counter()
+				bundles = objects_organise.build_bundles()
+				duration = time.perf_counter() - start
+				best = duration if best is None else min(best, duration)
+
+			results.setdefault(mode, []).append((count, best, len(bundles)))
+			print("{:<20} {:>8} objects {:>8.3f}s  {:>6.2f}us/object  {} bundles".format(
+				mode, count, best, best / count * 1e6, len(bundles)))
+
+	# Per object cost relative to the smallest scene, ~1.0 means linear
+	print()
+	for mode, rows in results.items():
+		base = rows[0][1] / rows[0][0]
+		ratios = ["{}: {:.2f}".format(count, (duration / count) / base) for count, duration, _ in rows]
+		print("{:<20} {}".format(mode, "  ".join(ratios)))
+
+	return results
+
+
+def main():
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+	parser = argparse.ArgumentParser(description="Time bundle assignment per bundle mode")
+	parser.add_argument("--max", type=int, default=100000, help="Largest object count")
+	parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best is kept")
+	args = parser.parse_args(argv)
+
+	counts = [c for c in (1000, 5000, 10000, 50000, 100000) if c <= args.max]
+	run(counts, ['PARENT', 'COLLECTION', 'COLLECTION_INSTANCE', 'SCENE'], args.repeat)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,97 @@
+# FBX writer benchmark. Run headless from the add-on folder:
+#
+#	blender -b --factory-startup --python benchmarks/bench_fbx.py -- --objects 20 --verts 100000
+#
+# Exports the same generated static meshes with bpy.ops.export_scene.fbx and
+# with the native writer, using the Unity and Unreal platform settings, and
+# prints time and file size of both.
+
+import bpy
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_bundles
+import bench_suite
+
+
+def build_scene(objects, verts):
+	template = bench_suite.create_grid("Grid", verts)
+	template.materials.append(bpy.data.materials.new("Material"))
+	template.color_attributes.new("Color", 'BYTE_COLOR', 'CORNER')
+
+	root = None
+	for i in range(objects):
+		obj = bpy.data.objects.new("Object_{}".format(i), template.copy())
+		obj.location = (i * 2, 0, 0)
+		bpy.context.scene.collection.objects.link(obj)
+		if root is None:
+			root = obj
+		else:
+			obj.parent = root
+
+	bpy.context.view_layer.update()
+	for obj in bpy.context.view_layer.objects:
+		obj.select_set(state=True)
+
+
+
+def run(args):
+	addon = bench_bundles.import_addon()
+	platforms = addon.platforms.platforms
+	writer_fbx = addon.writer_fbx
+
+	bench_bundles.clear_scene()
+	build_scene(args.objects, args.verts)
+	objects = bpy.context.selected_objects
+
+	folder = tempfile.mkdtemp(prefix="fbxbundle_bench_")
+	try:
+		for key in ('UNITY', 'UNREAL'):
+			platform = platforms[key]
+			exporters = {
+				'stock': lambda path: bpy.ops.export_scene.fbx(
+					filepath=path, use_selection=True,
+					axis_forward=platform.axis_forward, axis_up=platform.axis_up,
+					apply_scale_options=platform.scale_options, apply_unit_scale=True,
+					use_mesh_modifiers=True, mesh_smooth_type='FACE',
+					bake_space_transform=platform.bake_space_transform),
+				'native': lambda path: writer_fbx.write(path, objects,
+					axis_forward=platform.axis_forward, axis_up=platform.axis_up,
+					scale_options=platform.scale_options,
+					bake_space_transform=platform.bake_space_transform)
+			}
+
+			times = {}
+			for name, export in exporters.items():
+				path = os.path.join(folder, "{}_{}.fbx".format(key, name))
+				best = None
+				for i in range(args.repeat):
+					start = time.perf_counter()
+					export(path)
+					duration = time.perf_counter() - start
+					best = duration if best is None else min(best, duration)
+				times[name] = best
+				print("{:<8} {:<8} {:>8.3f}s  {:>10} bytes".format(key, name, best, os.path.getsize(path)))
+
+			print("{:<8} native is {:.1f}x faster".format(key, times['stock'] / times['native']))
+	finally:
+		shutil.rmtree(folder, ignore_errors=True)
+
+
+
+def main():
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+	parser = argparse.ArgumentParser(description="Compare the native FBX writer against Blender's FBX exporter")
+	parser.add_argument("--objects", type=int, default=10, help="Mesh objects")
+	parser.add_argument("--verts", type=int, default=100000, help="Vertices per mesh")
+	parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best is kept")
+	run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+	main()
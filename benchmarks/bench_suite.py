@@ -0,0 +1,237 @@
+# Benchmark suite for bundling, export modifiers and platforms. Run headless
+# from the add-on folder:
+#
+#	blender -b --factory-startup --python benchmarks/bench_suite.py -- --bundles 50 --objects 20 --verts 1000 --out results.json
+#	blender -b --factory-startup --python benchmarks/bench_suite.py -- --out new.json --baseline results.json
+#
+# Generates a scene of N bundles with M mesh objects of V vertices each, in
+# parent hierarchies and collections, with collection instances and skinned
+# armatures. Times building the bundles in every bundle mode, every export
+# modifier and every platform, batched where supported, writes the timings
+# as JSON and flags measurements that got slower than a stored baseline.
+
+import bpy
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import traceback
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_bundles
+
+
+version = 1
+modes = ['PARENT', 'COLLECTION', 'COLLECTION_INSTANCE', 'SCENE']
+
+
+def create_grid(name, verts):
+	# Grid mesh of about 'verts' vertices built with foreach_set
+	side = max(2, int(math.ceil(math.sqrt(verts))))
+	x, y = np.meshgrid(np.arange(side, dtype=np.float32), np.arange(side, dtype=np.float32))
+	positions = np.stack([x.ravel(), y.ravel(), np.zeros(side * side, dtype=np.float32)], axis=1) / side
+
+	corner = np.arange(side - 1)
+	starts = (corner[:, None] * side + corner[None, :]).ravel()
+	corners = np.stack([starts, starts + 1, starts + side + 1, starts + side], axis=1).ravel()
+
+	mesh = bpy.data.meshes.new(name)
+	mesh.vertices.add(len(positions))
+	mesh.vertices.foreach_set('co', positions.ravel())
+	mesh.loops.add(len(corners))
+	mesh.loops.foreach_set('vertex_index', corners.astype(np.int32))
+	mesh.polygons.add(len(starts))
+	mesh.polygons.foreach_set('loop_start', np.arange(0, len(corners), 4, dtype=np.int32))
+	mesh.polygons.foreach_set('loop_total', np.full(len(starts), 4, dtype=np.int32))
+	mesh.uv_layers.new(name="UVMap")
+	mesh.update(calc_edges=True)
+	mesh.validate()
+	return mesh
+
+
+
+def build_scene(bundles, objects, verts, armature_every=4):
+	# A collection per bundle holding a root mesh with 'objects' - 1 children.
+	# Every bundle is instanced once in an 'Instances' collection and every
+	# 'armature_every' bundle is skinned to an armature.
+	scene = bpy.context.scene
+	template = create_grid("Grid", verts)
+	material = bpy.data.materials.new("Material")
+	template.materials.append(material)
+
+	instances = bpy.data.collections.new("Instances")
+	scene.collection.children.link(instances)
+
+	for b in range(bundles):
+		collection = bpy.data.collections.new("Bundle_{}".format(b))
+		scene.collection.children.link(collection)
+
+		root = None
+		for o in range(objects):
+			obj = bpy.data.objects.new("Bundle_{}_{}".format(b, o), template.copy())
+			obj.location = (o % 10, o // 10, 0)
+			collection.objects.link(obj)
+			if root is None:
+				root = obj
+				root.location = (b * 20, 0, 0)
+			else:
+				obj.parent = root
+
+		if armature_every and b % armature_every == 0:
+			armature = bpy.data.objects.new("Bundle_{}_Armature".format(b), bpy.data.armatures.new("Armature_{}".format(b)))
+			collection.objects.link(armature)
+			root.parent = armature
+			mod = root.modifiers.new("Armature", 'ARMATURE')
+			mod.object = armature
+
+		instance = bpy.data.objects.new("Instance_{}".format(b), None)
+		instance.instance_type = 'COLLECTION'
+		instance.instance_collection = collection
+		instance.location = (b * 20, 50, 0)
+		instances.objects.link(instance)
+
+	bpy.context.view_layer.update()
+	for obj in bpy.context.view_layer.objects:
+		obj.select_set(state=True)
+
+
+
+def measure(function, repeat):
+	# Best of 'repeat' runs in seconds
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		function()
+		duration = time.perf_counter() - start
+		best = duration if best is None else min(best, duration)
+	return best
+
+
+
+def run(args):
+	addon = bench_bundles.import_addon()
+	api = addon.api
+	settings = bpy.context.scene.FBXBundleSettings
+
+	bench_bundles.clear_scene()
+	build_scene(args.bundles, args.objects, args.verts)
+
+	results = {}
+	errors = {}
+
+	def record(key, function, repeat):
+		try:
+			results[key] = measure(function, repeat)
+			print("{:<32} {:>10.4f}s".format(key, results[key]))
+		except Exception:
+			traceback.print_exc()
+			errors[key] = traceback.format_exc().strip().splitlines()[-1]
+			print("{:<32} {:>10}".format(key, "failed"))
+
+	# Bundles in every mode
+	for mode in modes:
+		settings.mode_bundle = mode
+		record("bundles.{}".format(mode), addon.objects_organise.build_bundles, args.repeat)
+
+	# Export modifiers, one at a time on temporary copies of every bundle
+	plan = api.plan(bpy.context.view_layer.objects, 'PARENT')
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	for modifier in addon.modifiers.modifiers:
+		def process():
+			for bundle in plan:
+				copies = addon.export_copies.create(bundle.objects, bundle.pivot, depsgraph)
+				try:
+					modifier.process_objects(bundle.name, addon.export_copies.get_objects(copies, bundle.objects))
+				finally:
+					addon.export_copies.remove(copies)
+				depsgraph.update()
+		record("modifier.{}".format(modifier.id), process, 1)
+
+	# Platforms without modifiers, always writing every file
+	folder = tempfile.mkdtemp(prefix="fbxbundle_bench_")
+	try:
+		for key, platform in addon.platforms.platforms.items():
+			if not platform.is_valid()[0]:
+				print("{:<32} {:>10}".format("platform." + key, "skipped"))
+				continue
+			record("platform.{}".format(key), lambda: api.export(plan, key, folder, modifiers=[], force=True), 1)
+			if platform.batch:
+				record("batch.{}".format(key), lambda: api.export(plan, key, folder, modifiers=[], force=True, batch=True), 1)
+	finally:
+		shutil.rmtree(folder, ignore_errors=True)
+
+	return {
+		'version': version,
+		'blender': bpy.app.version_string,
+		'parameters': {'bundles': args.bundles, 'objects': args.objects, 'verts': args.verts},
+		'results': results,
+		'errors': errors
+	}
+
+
+
+def compare(data, baseline, tolerance, threshold):
+	# Measurements slower than the baseline by more than 'tolerance' (a ratio)
+	# and 'threshold' seconds
+	if baseline.get('parameters') != data['parameters']:
+		print("Baseline was measured with different parameters: {}".format(baseline.get('parameters')))
+
+	regressions = {}
+	print()
+	for key, seconds in sorted(data['results'].items()):
+		base = baseline.get('results', {}).get(key)
+		if base is None:
+			print("{:<32} {:>10.4f}s  new".format(key, seconds))
+			continue
+
+		ratio = seconds / base if base > 0 else 1.0
+		regressed = ratio > 1 + tolerance and seconds - base > threshold
+		if regressed:
+			regressions[key] = ratio
+		print("{:<32} {:>10.4f}s  {:>10.4f}s  {:>6.2f}x{}".format(key, base, seconds, ratio, "  REGRESSION" if regressed else ""))
+
+	for key in data['errors']:
+		if key in baseline.get('results', {}):
+			regressions[key] = None
+			print("{:<32} failed, passed in baseline".format(key))
+
+	return regressions
+
+
+
+def main():
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+	parser = argparse.ArgumentParser(description="Time bundling, export modifiers and platforms on a generated scene")
+	parser.add_argument("--bundles", type=int, default=20, help="Number of bundles")
+	parser.add_argument("--objects", type=int, default=10, help="Mesh objects per bundle")
+	parser.add_argument("--verts", type=int, default=1000, help="Vertices per mesh")
+	parser.add_argument("--repeat", type=int, default=3, help="Runs per bundling measurement, best is kept")
+	parser.add_argument("--out", help="Write results to this JSON file")
+	parser.add_argument("--baseline", help="Compare against results of an earlier run")
+	parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline, 0.2 = 20%%")
+	parser.add_argument("--threshold", type=float, default=0.01, help="Ignore slowdowns below this many seconds")
+	args = parser.parse_args(argv)
+
+	data = run(args)
+
+	if args.out:
+		with open(args.out, 'w') as file:
+			json.dump(data, file, indent=1, sort_keys=True)
+
+	regressions = {}
+	if args.baseline:
+		with open(args.baseline, 'r') as file:
+			regressions = compare(data, json.load(file), args.tolerance, args.threshold)
+		print("{} regressions".format(len(regressions)))
+
+	if bpy.app.background:
+		sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+	main()
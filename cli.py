@@ -0,0 +1,201 @@
+# Headless batch exporter. Exports the bundles of many .blend files in one
+# Blender run:
+#
+#	blender -b --python fbx_bundle/cli.py -- --platform UNITY --out dir a.blend b.blend
+#	blender -b --python-expr "from fbx_bundle import cli; cli.main()" -- --platform UNITY --out dir a.blend
+#
+# Progress is kept per bundle in a SQLite job table (by default inside the
+# output folder), so a crashed or killed run picks up where it stopped when
+# started again with the same arguments.
+
+import bpy
+import os
+import sys
+import time
+import argparse
+import importlib
+import traceback
+
+
+def get_addon():
+	# Works as add-on submodule as well as a script run with --python
+	if __package__:
+		return importlib.import_module(__package__)
+
+	path = os.path.dirname(os.path.abspath(__file__))
+	sys.path.insert(0, os.path.dirname(path))
+	return importlib.import_module(os.path.basename(path))
+
+
+
+class JobQueue:
+	# Per bundle export state: pending, running, done or failed
+
+	def __init__(self, path):
+		import sqlite3
+		self.connection = sqlite3.connect(path)
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+			blend TEXT, bundle TEXT, platform TEXT, folder TEXT,
+			status TEXT, error TEXT, updated REAL,
+			PRIMARY KEY (blend, bundle, platform, folder))""")
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS files (
+			blend TEXT, platform TEXT, folder TEXT, mtime REAL, status TEXT,
+			PRIMARY KEY (blend, platform, folder))""")
+		self.connection.commit()
+
+
+	def reset(self):
+		self.connection.execute("DELETE FROM jobs")
+		self.connection.execute("DELETE FROM files")
+		self.connection.commit()
+
+
+	def is_file_done(self, blend, platform, folder):
+		row = self.connection.execute("SELECT mtime, status FROM files WHERE blend=? AND platform=? AND folder=?",
+			(blend, platform, folder)).fetchone()
+		return row is not None and row[1] == 'done' and row[0] == os.path.getmtime(blend)
+
+
+	def set_file(self, blend, platform, folder, status):
+		self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+			(blend, platform, folder, os.path.getmtime(blend), status))
+		self.connection.commit()
+
+
+	def add(self, blend, bundles, platform, folder):
+		# Jobs done for an older version of the file are exported again. The
+		# file is marked running at this version, so a crashed run resumes.
+		row = self.connection.execute("SELECT mtime FROM files WHERE blend=? AND platform=? AND folder=?",
+			(blend, platform, folder)).fetchone()
+		if row is not None and row[0] != os.path.getmtime(blend):
+			self.connection.execute("UPDATE jobs SET status='pending', error=NULL WHERE blend=? AND platform=? AND folder=?",
+				(blend, platform, folder))
+		self.set_file(blend, platform, folder, 'running')
+		self.connection.executemany("INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, 'pending', NULL, ?)",
+			[(blend, bundle, platform, folder, time.time()) for bundle in bundles])
+		self.connection.commit()
+
+
+	def get_pending(self, blend, platform, folder):
+		# Bundles left 'running' were interrupted by a crash
+		rows = self.connection.execute("SELECT bundle FROM jobs WHERE blend=? AND platform=? AND folder=? AND status != 'done' ORDER BY bundle",
+			(blend, platform, folder))
+		return [row[0] for row in rows]
+
+
+	def set(self, blend, bundle, platform, folder, status, error=None):
+		self.connection.execute("UPDATE jobs SET status=?, error=?, updated=? WHERE blend=? AND bundle=? AND platform=? AND folder=?",
+			(status, error, time.time(), blend, bundle, platform, folder))
+		self.connection.commit()
+
+
+	def get_counts(self):
+		return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+
+
+def export_file(addon, queue, blend, args):
+	api = addon.api
+
+	if blend != bpy.data.filepath:
+		bpy.ops.wm.open_mainfile(filepath=blend)
+
+	settings = bpy.context.scene.FBXBundleSettings
+	mode = args.mode or settings.mode_bundle
+	if args.deterministic:
+		settings.deterministic = True
+
+	# Export everything unless asked to use the selection saved in the file
+	if args.select == 'ALL':
+		objects = list(bpy.context.view_layer.objects)
+	else:
+		objects = bpy.context.selected_objects
+
+	# One report per file, saved to the output folder after every bundle
+	report = addon.export_report.Report()
+	with report.stage("plan"):
+		plan = {bundle.name: bundle for bundle in api.plan(objects, mode)}
+	queue.add(blend, plan.keys(), args.platform, args.out)
+	failed = 0
+
+	for name in queue.get_pending(blend, args.platform, args.out):
+		if name not in plan:
+			# Bundle no longer in the file
+			queue.set(blend, name, args.platform, args.out, 'done')
+			continue
+
+		queue.set(blend, name, args.platform, args.out, 'running')
+		try:
+			result = api.export([plan[name]], args.platform, args.out, force=args.force, report=report, memory_limit=args.memory_limit)[0]
+			error = result.error
+		except Exception:
+			traceback.print_exc()
+			error = traceback.format_exc()
+
+		if error:
+			failed += 1
+			queue.set(blend, name, args.platform, args.out, 'failed', error)
+		else:
+			queue.set(blend, name, args.platform, args.out, 'done')
+
+	return failed == 0
+
+
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+	addon = get_addon()
+	if not hasattr(bpy.types.Scene, "FBXBundleSettings"):
+		addon.register()
+
+	parser = argparse.ArgumentParser(prog="fbx_bundle.cli", description="Export FBX Bundle bundles of .blend files without the UI")
+	parser.add_argument("files", nargs="*", help=".blend files to export, defaults to the file Blender opened")
+	parser.add_argument("--platform", required=True, choices=sorted(addon.platforms.platforms.keys()), help="Target platform")
+	parser.add_argument("--out", required=True, help="Output folder")
+	parser.add_argument("--mode", choices=['PARENT', 'COLLECTION', 'COLLECTION_INSTANCE', 'SCENE'], help="Bundle mode, defaults to the mode saved in each file")
+	parser.add_argument("--select", choices=['ALL', 'SAVED'], default='ALL', help="Export all objects or the selection saved in each file")
+	parser.add_argument("--jobs", help="SQLite job file, defaults to .fbxbundle_jobs.sqlite in the output folder")
+	parser.add_argument("--force", action="store_true", help="Export bundles that are unchanged since the last export")
+	parser.add_argument("--deterministic", action="store_true", help="Write identical bytes for identical input, regardless of the setting saved in each file")
+	parser.add_argument("--memory-limit", type=int, metavar="MB", help="Export memory bounded for very large bundles, with merge batches getting smaller above this many MB, 0 for no limit")
+	parser.add_argument("--restart", action="store_true", help="Forget progress of previous runs")
+	args = parser.parse_args(argv)
+
+	files = [os.path.abspath(f) for f in args.files] or [bpy.data.filepath]
+	if not files[0]:
+		parser.error("no .blend files given and Blender opened no saved file")
+
+	args.out = os.path.abspath(args.out)
+	os.makedirs(args.out, exist_ok=True)
+
+	queue = JobQueue(args.jobs or os.path.join(args.out, ".fbxbundle_jobs.sqlite"))
+	if args.restart:
+		queue.reset()
+
+	success = True
+	for index, blend in enumerate(files):
+		if queue.is_file_done(blend, args.platform, args.out):
+			print("[{}/{}] {} already exported".format(index+1, len(files), blend))
+			continue
+
+		print("[{}/{}] {}".format(index+1, len(files), blend))
+		try:
+			done = export_file(addon, queue, blend, args)
+		except Exception:
+			traceback.print_exc()
+			done = False
+
+		queue.set_file(blend, args.platform, args.out, 'done' if done else 'failed')
+		success = success and done
+
+	print("Jobs: {}".format(", ".join("{} {}".format(count, status) for status, count in queue.get_counts().items())))
+
+	if bpy.app.background:
+		sys.exit(0 if success else 1)
+
+
+
+if __name__ == "__main__":
+	main()
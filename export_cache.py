@@ -0,0 +1,96 @@
+import bpy
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from . import objects_organise
+from . import export_output
+
+
+# Generated data reused across exports and sessions, such as LOD meshes.
+# Entries are .npz files named after a hash of everything they were made
+# from, so they never need invalidating. The folder is set in the add-on
+# preferences and may be shared, defaults to the system's temp folder.
+folder_name = "fbxbundle_cache"
+
+# Part of every key, raised whenever the data made changes, e.g. the output
+# of mesh_simplify
+version = 2
+
+
+def get_folder():
+	folder = objects_organise.get_preference("cache_folder", "")
+	if folder:
+		return bpy.path.abspath(folder)
+	return os.path.join(tempfile.gettempdir(), folder_name)
+
+
+
+def get_key(*values):
+	# Hash of the values, the cache version and Blender's version
+	hash = hashlib.sha1()
+	hash.update(repr((version, tuple(bpy.app.version)) + values).encode())
+	return hash.hexdigest()
+
+
+
+def get_path(kind, key):
+	return os.path.join(get_folder(), kind, key[:2], key + ".npz")
+
+
+
+def load_arrays(kind, key):
+	# Arrays by name, None if not cached or unreadable
+	path = get_path(kind, key)
+	if not os.path.isfile(path):
+		return None
+	try:
+		with np.load(path, allow_pickle=False) as data:
+			return {name: data[name] for name in data.files}
+	except (OSError, ValueError) as error:
+		print("Ignoring unreadable cache entry {}: {}".format(path, error))
+		return None
+
+
+
+def save_arrays(kind, key, arrays):
+	path = get_path(kind, key)
+	try:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		# Exporters sharing the folder never read a half-written entry
+		with export_output.open_atomic(path, 'wb') as file:
+			np.savez(file, **arrays)
+	except OSError as error:
+		print("Could not write cache entry {}: {}".format(path, error))
+
+
+
+def load_mesh(kind, key):
+	# Mesh arrays in the layout of mesh_merge.create_mesh
+	flat = load_arrays(kind, key)
+	if flat is None:
+		return None
+
+	arrays = {'uvs': {}, 'colors': {}, 'normals': None}
+	for name, values in flat.items():
+		if name.startswith("uv:"):
+			arrays['uvs'][name[3:]] = values
+		elif name.startswith("color:"):
+			data_type, color_name = name[6:].split(":", 1)
+			arrays['colors'][color_name] = (data_type, values)
+		else:
+			arrays[name] = values
+	return arrays
+
+
+
+def save_mesh(kind, key, arrays):
+	flat = {name: arrays[name] for name in ('positions', 'corners', 'sizes', 'materials', 'smooth')}
+	for name, uvs in arrays['uvs'].items():
+		flat["uv:" + name] = uvs
+	for name, (data_type, colors) in arrays['colors'].items():
+		flat["color:{}:{}".format(data_type, name)] = colors
+	if arrays.get('normals') is not None:
+		flat['normals'] = arrays['normals']
+	save_arrays(kind, key, flat)
@@ -0,0 +1,143 @@
+import bpy
+from mathutils import Matrix
+
+from . import objects_organise
+from . import export_memory
+
+
+# Temporary stand-ins the export modifiers and exporters work on, so the
+# user's objects are never moved, joined or converted. Copies take over the
+# names of their originals for the duration of the export.
+
+collection_name = "FBXBundle_Export"
+suffix = "__fbxbundle"
+
+
+class Copies:
+	def __init__(self):
+		self.objects = {}
+		self.names = {}
+		self.data = []
+		self.collection = None
+		# Data-blocks before the copies, in memory bounded exports
+		self.data_blocks = None
+
+
+
+def create(objects, pivot, depsgraph, scene=None):
+	scene = scene or bpy.context.scene
+	copies = Copies()
+	if export_memory.is_active():
+		copies.data_blocks = export_memory.get_data_blocks()
+
+	copies.collection = bpy.data.collections.new(collection_name)
+	scene.collection.children.link(copies.collection)
+
+	# Removes what was created so far when a copy fails, nothing is left behind
+	try:
+		# Evaluated meshes of unmodified objects, shared like their data
+		meshes = {}
+		for obj in objects:
+			copies.objects[obj] = create_copy(obj, depsgraph, copies, meshes)
+
+		# Rebuild the hierarchy within the bundle, roots relative to the pivot
+		offset = Matrix.Translation(-pivot)
+		for obj, copy in copies.objects.items():
+			if obj.parent in copies.objects:
+				copy.parent = copies.objects[obj.parent]
+				copy.matrix_parent_inverse = obj.matrix_parent_inverse.copy()
+				copy.matrix_basis = obj.matrix_basis.copy()
+			else:
+				copy.parent = None
+				copy.matrix_world = offset @ obj.matrix_world
+
+		# Swap names so exported nodes and name based settings match the originals
+		for obj, copy in copies.objects.items():
+			name = obj.name
+			copies.names[obj] = name
+			obj.name = name + suffix
+			copy.name = name
+
+	except Exception:
+		remove(copies)
+		raise
+
+	return copies
+
+
+
+def create_copy(obj, depsgraph, copies, meshes):
+	if obj.type in ('MESH', 'CURVE', 'FONT') and not is_deformed(obj):
+		key = obj.data if obj.type == 'MESH' and len(obj.modifiers) == 0 else obj
+		if key in meshes:
+			mesh = meshes[key]
+		else:
+			# Bake modifiers and geometry nodes from the shared depsgraph
+			try:
+				mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+			except RuntimeError:
+				# Not part of the depsgraph, e.g. hidden instanced collections
+				mesh = bpy.data.meshes.new_from_object(obj)
+			meshes[key] = mesh
+			copies.data.append(mesh)
+
+		if obj.type == 'MESH':
+			copy = obj.copy()
+			copy.data = mesh
+			copy.modifiers.clear()
+		else:
+			# Curves and text become mesh objects
+			copy = bpy.data.objects.new(obj.name + suffix, mesh)
+			copy.matrix_world = obj.matrix_world
+			for index, slot in enumerate(obj.material_slots):
+				if slot.link == 'OBJECT' and index < len(copy.material_slots):
+					copy.material_slots[index].link = 'OBJECT'
+					copy.material_slots[index].material = slot.material
+
+	else:
+		copy = obj.copy()
+		if obj.type == 'MESH':
+			# Skinned meshes keep their modifiers for the exporter to apply
+			copy.data = obj.data.copy()
+			copies.data.append(copy.data)
+
+	copy.hide_viewport = False
+	copy.hide_select = False
+	copies.collection.objects.link(copy)
+	return copy
+
+
+
+def is_deformed(obj):
+	# Meshes driven by an armature or shape keys
+	if any(mod.type == 'ARMATURE' for mod in obj.modifiers):
+		return True
+	return obj.type == 'MESH' and obj.data.shape_keys is not None
+
+
+
+def get_objects(copies, objects):
+	return [copies.objects[obj] for obj in objects if obj in copies.objects]
+
+
+
+def remove(copies):
+	# Everything in the collection, including objects the modifiers created
+	meshes = list(copies.data)
+	for obj in list(copies.collection.all_objects):
+		if obj.type == 'MESH':
+			meshes.append(obj.data)
+		bpy.data.objects.remove(obj)
+
+	for mesh in set(meshes):
+		if objects_organise.is_object_alive(mesh) and mesh.users == 0:
+			bpy.data.meshes.remove(mesh)
+
+	bpy.data.collections.remove(copies.collection)
+
+	for obj, name in copies.names.items():
+		obj.name = name
+
+	# Meshes, materials and images the modifiers and exporters left behind
+	if copies.data_blocks is not None:
+		export_memory.free_orphans(copies.data_blocks)
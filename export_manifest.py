@@ -0,0 +1,173 @@
+import bpy
+import os
+import json
+import hashlib
+import imp
+
+from . import mesh_arrays
+from . import objects_organise
+from . import export_output
+
+imp.reload(mesh_arrays)
+imp.reload(export_output)
+
+
+# Stored in the output folder. The leading dot keeps Unity from importing it.
+filename = ".fbxbundle_manifest.json"
+version = 1
+
+
+class Manifest:
+	# Fingerprints of the inputs each exported file was written from
+
+	def __init__(self, folder):
+		self.path = os.path.join(folder, filename)
+		self.files = {}
+		self.folder = folder
+
+		if os.path.exists(self.path):
+			try:
+				with open(self.path, 'r') as file:
+					data = json.load(file)
+				if data.get('version') == version:
+					self.files = data.get('files', {})
+			except (OSError, ValueError):
+				print("Ignoring unreadable manifest {}".format(self.path))
+
+
+	def get_key(self, path):
+		return os.path.relpath(path, self.folder).replace(os.path.sep, '/')
+
+
+	def is_unchanged(self, path, fingerprint):
+		return self.files.get(self.get_key(path)) == fingerprint and os.path.exists(path)
+
+
+	def set(self, path, fingerprint):
+		self.files[self.get_key(path)] = fingerprint
+
+
+	def save(self):
+		with export_output.open_atomic(self.path) as file:
+			json.dump({'version': version, 'files': self.files}, file, indent=1, sort_keys=True)
+
+
+
+def get_fingerprint(bundle, platform, modifiers, depsgraph):
+	# Hash of everything the exported file of a bundle depends on
+	hash = hashlib.sha1()
+	update = lambda value: hash.update(repr(value).encode())
+
+	update((version, bundle.name, platform))
+	update(tuple(bundle.pivot))
+
+	# Scene settings that change the written bytes
+	settings = bpy.context.scene.FBXBundleSettings
+	update((settings.quantize, settings.deterministic))
+
+	# Native or stock FBX writer, set in the add-on preferences
+	addon = bpy.context.preferences.addons.get(__package__)
+	update(bool(addon and getattr(addon.preferences, "native_fbx", False)))
+
+	# Export modifiers and their settings
+	for modifier in modifiers:
+		update(modifier.id)
+		update(get_rna_values(getattr(bpy.context.scene, modifier.settings_path())))
+
+	for obj in sorted(bundle.objects, key=lambda obj: obj.name):
+		update_object(hash, obj, depsgraph, 0)
+
+	return hash.hexdigest()
+
+
+
+def update_object(hash, obj, depsgraph, depth):
+	update = lambda value: hash.update(repr(value).encode())
+
+	update((obj.name, obj.type, obj.parent.name if obj.parent else None))
+	update([tuple(row) for row in obj.matrix_world])
+	update([(slot.link, get_material_values(slot.material)) for slot in obj.material_slots])
+
+	if obj.type in ('MESH', 'CURVE', 'FONT'):
+		# Evaluated mesh covers modifiers, shape keys and geometry nodes
+		try:
+			obj_eval = obj.evaluated_get(depsgraph)
+		except RuntimeError:
+			# Not part of the depsgraph, e.g. hidden instanced collections
+			obj_eval = None
+
+		if obj_eval:
+			mesh = obj_eval.to_mesh()
+			if mesh:
+				update_mesh(hash, mesh)
+			obj_eval.to_mesh_clear()
+		elif obj.type == 'MESH':
+			update_mesh(hash, obj.data)
+
+	elif obj.type == 'ARMATURE':
+		bones = obj.data.bones
+		update([bone.name for bone in bones])
+		hash.update(mesh_arrays.get_array(bones, 'matrix_local', 'f', 16).tobytes())
+		hash.update(mesh_arrays.get_array(bones, 'head_local', 'f', 3).tobytes())
+		hash.update(mesh_arrays.get_array(bones, 'tail_local', 'f', 3).tobytes())
+
+	elif obj.type == 'EMPTY' and obj.instance_collection and depth < objects_organise.ObjectGraph.limit:
+		for child in sorted(obj.instance_collection.all_objects, key=lambda child: child.name):
+			update_object(hash, child, depsgraph, depth+1)
+
+	# Object modifiers are applied on export
+	for mod in obj.modifiers:
+		update(get_rna_values(mod))
+
+	if obj.animation_data and obj.animation_data.action:
+		for fcurve in obj.animation_data.action.fcurves:
+			update((fcurve.data_path, fcurve.array_index))
+			hash.update(mesh_arrays.get_array(fcurve.keyframe_points, 'co', 'f', 2).tobytes())
+
+
+
+def update_mesh(hash, mesh):
+	hash.update(mesh_arrays.get_face_sizes(mesh).tobytes())
+	hash.update(mesh_arrays.get_corner_verts(mesh).tobytes())
+
+	for attribute in sorted(mesh.attributes, key=lambda attribute: attribute.name):
+		# Skip internal attributes such as edit mode selection
+		if attribute.name.startswith('.'):
+			continue
+		values = mesh_arrays.get_attribute(attribute)
+		if values is not None:
+			hash.update(repr((attribute.name, attribute.domain, attribute.data_type)).encode())
+			hash.update(values.tobytes())
+
+
+
+def get_material_values(material):
+	if not material:
+		return None
+
+	values = [material.name, tuple(material.diffuse_color), material.metallic, material.roughness]
+	if material.use_nodes and material.node_tree:
+		for node in material.node_tree.nodes:
+			values.append((node.bl_idname, node.name, getattr(getattr(node, 'image', None), 'filepath', None)))
+			for socket in node.inputs:
+				if hasattr(socket, 'default_value'):
+					value = socket.default_value
+					values.append(tuple(value) if hasattr(value, '__len__') else value)
+	return values
+
+
+
+def get_rna_values(struct):
+	# Plain property values of a struct, ID pointers by name
+	values = []
+	for prop in struct.bl_rna.properties:
+		if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+			continue
+
+		value = getattr(struct, prop.identifier, None)
+		if prop.type == 'POINTER':
+			value = value.name if isinstance(value, bpy.types.ID) else None
+		elif getattr(prop, 'is_array', False):
+			value = tuple(value)
+		values.append((prop.identifier, value))
+	return values
@@ -0,0 +1,195 @@
+import bpy
+import os
+import sys
+import ctypes
+from contextlib import contextmanager
+
+
+# Memory bounded exports for bundles too large to hold several times over.
+# While active the Merge modifier joins in batches, data-blocks the export
+# orphaned are freed after every bundle and global undo is off. Going over
+# the memory limit halves the batches.
+
+# Vertices joined at once, before any spilling
+batch_vertices = 1000000
+batch_vertices_min = 10000
+
+# Data-blocks modifiers and exporters create and leave behind
+orphan_types = ('meshes', 'curves', 'materials', 'images')
+
+
+class State:
+	def __init__(self, limit):
+		self.limit = limit
+		self.batch_vertices = batch_vertices
+		self.spills = 0
+
+state = None
+
+# Whether the peak was reset, peaks are then per bundle
+peak_reset = False
+
+
+
+@contextmanager
+def bounded(limit_mb=0):
+	# Memory bounded mode for the duration of an export, 'limit_mb' of 0
+	# means no limit
+	global state
+	state = State(limit_mb * 1024 * 1024)
+
+	preferences = bpy.context.preferences
+	use_global_undo = preferences.edit.use_global_undo
+	is_dirty = preferences.is_dirty
+	preferences.edit.use_global_undo = False
+	try:
+		yield state
+	finally:
+		preferences.edit.use_global_undo = use_global_undo
+		preferences.is_dirty = is_dirty
+		state = None
+
+
+
+def is_active():
+	return state is not None
+
+
+
+def get_batch_vertices():
+	return state.batch_vertices if state else None
+
+
+
+def spill_if_over_limit():
+	# Halves the batches when memory is over the limit, returns whether it was
+	if not state or state.limit <= 0 or get_memory() <= state.limit:
+		return False
+
+	state.batch_vertices = max(batch_vertices_min, state.batch_vertices // 2)
+	state.spills += 1
+	print("Memory over {} MB, batches reduced to {} vertices".format(state.limit // (1024 * 1024), state.batch_vertices))
+	return True
+
+
+
+def get_data_blocks():
+	# Snapshot to compare against with free_orphans
+	return {name: set(getattr(bpy.data, name)) for name in orphan_types}
+
+
+
+def free_orphans(before):
+	# Data-blocks created since the snapshot that nothing uses anymore
+	count = 0
+	for name, existing in before.items():
+		collection = getattr(bpy.data, name)
+		for block in [block for block in collection if block not in existing]:
+			if block.users == 0:
+				collection.remove(block)
+				count += 1
+	return count
+
+
+
+def free_meshes(meshes):
+	for mesh in set(meshes):
+		try:
+			if mesh.users == 0:
+				bpy.data.meshes.remove(mesh)
+		except ReferenceError:
+			pass
+
+
+
+def get_memory():
+	# Resident memory of this process in bytes, 0 where unknown
+	if sys.platform.startswith('linux'):
+		try:
+			with open("/proc/self/statm", 'r') as file:
+				return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+		except (OSError, ValueError, IndexError):
+			return 0
+
+	if sys.platform == 'win32':
+		counters = get_windows_counters()
+		return counters.WorkingSetSize if counters else 0
+
+	# Elsewhere only the peak is reported, see get_peak_memory
+	return 0
+
+
+
+def reset_peak_memory():
+	# Linux can reset the peak, returns whether it did
+	global peak_reset
+	try:
+		with open("/proc/self/clear_refs", 'w') as file:
+			file.write("5")
+		peak_reset = True
+	except OSError:
+		pass
+	return peak_reset
+
+
+
+def get_peak_memory():
+	# Peak resident memory in bytes, since reset_peak_memory on Linux and
+	# since the start of the process elsewhere. 0 where unknown.
+	if sys.platform.startswith('linux'):
+		try:
+			with open("/proc/self/status", 'r') as file:
+				for line in file:
+					if line.startswith("VmHWM:"):
+						return int(line.split()[1]) * 1024
+		except (OSError, ValueError, IndexError):
+			pass
+		return 0
+
+	if sys.platform == 'win32':
+		counters = get_windows_counters()
+		return counters.PeakWorkingSetSize if counters else 0
+
+	# In bytes on macOS, kilobytes on other BSD style platforms
+	try:
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	except (ImportError, OSError):
+		return 0
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+
+
+def get_bundle_peak():
+	# Peak since the bundle started where it can be reset, the current memory
+	# otherwise
+	return get_peak_memory() if peak_reset else get_memory()
+
+
+
+def get_windows_counters():
+	from ctypes import wintypes
+
+	class Counters(ctypes.Structure):
+		_fields_ = [
+			('cb', wintypes.DWORD),
+			('PageFaultCount', wintypes.DWORD),
+			('PeakWorkingSetSize', ctypes.c_size_t),
+			('WorkingSetSize', ctypes.c_size_t),
+			('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+			('QuotaPagedPoolUsage', ctypes.c_size_t),
+			('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+			('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+			('PagefileUsage', ctypes.c_size_t),
+			('PeakPagefileUsage', ctypes.c_size_t),
+		]
+
+	counters = Counters()
+	counters.cb = ctypes.sizeof(Counters)
+	try:
+		process = ctypes.windll.kernel32.GetCurrentProcess()
+		if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+			return counters
+	except (AttributeError, OSError):
+		pass
+	return None
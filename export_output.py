@@ -0,0 +1,181 @@
+import os
+import time
+import shutil
+import socket
+import getpass
+import filecmp
+import threading
+from contextlib import contextmanager
+
+
+# Exporters write into a staging folder next to the output file. Files are
+# moved in place with an atomic rename only when their bytes changed, so
+# Unity and Unreal don't reimport identical files and never see half-written
+# ones. An advisory lock file serializes exporters sharing an output folder.
+# Leading dots keep Unity from importing either.
+lock_filename = ".fbxbundle.lock"
+staging_prefix = ".fbxbundle_staging_"
+
+# Seconds to wait for another exporter, and after which a lock that wasn't
+# refreshed is considered left behind by a crashed one
+lock_timeout = 60
+lock_stale = 120
+
+
+class LockError(RuntimeError):
+	pass
+
+
+
+def get_owner():
+	try:
+		user = getpass.getuser()
+	except Exception:
+		user = "unknown"
+	return "{}@{} (pid {})".format(user, socket.gethostname(), os.getpid())
+
+
+
+def read_owner(path):
+	try:
+		with open(path, 'r') as file:
+			return file.read().strip() or "another exporter"
+	except OSError:
+		return "another exporter"
+
+
+
+def is_stale(path, stale):
+	try:
+		return time.time() - os.path.getmtime(path) > stale
+	except OSError:
+		return False
+
+
+
+@contextmanager
+def lock(folder, timeout=None, stale=None):
+	# Held while exporting to folder, raises LockError if another exporter
+	# keeps it longer than 'timeout' seconds
+	timeout = lock_timeout if timeout is None else timeout
+	stale = lock_stale if stale is None else stale
+
+	os.makedirs(folder, exist_ok=True)
+	path = os.path.join(folder, lock_filename)
+	deadline = time.time() + timeout
+	while True:
+		try:
+			descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+			break
+		except FileExistsError:
+			if is_stale(path, stale):
+				print("Removing stale lock of {}".format(read_owner(path)))
+				remove_stale(path, stale)
+				continue
+			if time.time() > deadline:
+				raise LockError("Output folder is locked by {}".format(read_owner(path)))
+			time.sleep(0.5)
+
+	owner = get_owner()
+	with os.fdopen(descriptor, 'w') as file:
+		file.write(owner)
+
+	# Keep the lock fresh while exporting, however long bundles take
+	stop = threading.Event()
+	def refresh():
+		while not stop.wait(stale / 4):
+			try:
+				os.utime(path)
+			except OSError:
+				pass
+
+	thread = threading.Thread(target=refresh, daemon=True)
+	thread.start()
+	try:
+		yield
+	finally:
+		stop.set()
+		thread.join()
+		# Not if another exporter took it over in the meantime
+		if read_owner(path) == owner:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+
+
+def remove_stale(path, stale):
+	# Renamed to a name of this thread's first, so of several exporters
+	# waiting only one gets the file, and removed only when it is still stale.
+	# A fresh lock created since it was found stale is put back.
+	moved = "{}.{}.{}.stale".format(path, os.getpid(), threading.get_ident())
+	try:
+		os.rename(path, moved)
+	except OSError:
+		return
+
+	if not is_stale(moved, stale):
+		try:
+			os.link(moved, path)
+		except OSError:
+			pass
+	try:
+		os.remove(moved)
+	except OSError:
+		pass
+
+
+
+def create_staging(directory, name):
+	# On the same drive as the output, so renames out of it are atomic. Named
+	# after the file as exporters write their path into it, the folder lock
+	# keeps other exporters out.
+	staging = os.path.join(directory, staging_prefix + name)
+	remove_staging(staging)
+	os.makedirs(staging)
+	return staging
+
+
+
+def remove_staging(staging):
+	shutil.rmtree(staging, ignore_errors=True)
+
+
+
+def commit(staging, directory):
+	# Move staged files over their targets in directory, files with
+	# identical bytes are left untouched. Returns the replaced paths.
+	replaced = []
+	for root, folders, files in os.walk(staging):
+		for name in files:
+			source = os.path.join(root, name)
+			target = os.path.join(directory, os.path.relpath(source, staging))
+			if commit_file(source, target):
+				replaced.append(target)
+	return replaced
+
+
+
+def commit_file(source, target):
+	# Returns whether target was replaced
+	if os.path.isfile(target) and filecmp.cmp(source, target, shallow=False):
+		return False
+
+	os.makedirs(os.path.dirname(target), exist_ok=True)
+	os.replace(source, target)
+	return True
+
+
+
+@contextmanager
+def open_atomic(path, mode='w'):
+	# Written next to path and renamed over it once complete
+	path_temp = "{}.{}.tmp".format(path, os.getpid())
+	try:
+		with open(path_temp, mode) as file:
+			yield file
+		os.replace(path_temp, path)
+	finally:
+		if os.path.exists(path_temp):
+			os.remove(path_temp)
@@ -0,0 +1,131 @@
+import bpy
+import os
+import sys
+import json
+import shutil
+import tempfile
+import traceback
+import subprocess
+from mathutils import Vector
+
+
+# Python run by each worker: enable the add-on and export its shard
+worker_expression = "import addon_utils, importlib; addon_utils.check({package!r})[1] or addon_utils.enable({package!r}, default_set=False); importlib.import_module({module!r}).worker_main()"
+
+
+def export(bundles, folder, platform, modifiers, workers, report=None):
+	# Export bundles across background Blender processes.
+	# Returns {name: error message} for the bundles that failed.
+	directory = tempfile.mkdtemp(prefix="fbxbundle_")
+	try:
+		# Workers load a copy of the current state, unsaved changes included
+		path_blend = os.path.join(directory, "export.blend")
+		bpy.ops.wm.save_as_mainfile(filepath=path_blend, copy=True, compress=False)
+
+		processes = []
+		for index, shard in enumerate(get_shards(bundles, workers)):
+			path_job = os.path.join(directory, "job_{}.json".format(index))
+			path_result = os.path.join(directory, "result_{}.json".format(index))
+			path_log = os.path.join(directory, "log_{}.txt".format(index))
+
+			with open(path_job, 'w') as file:
+				json.dump({
+					'folder': folder,
+					'platform': platform,
+					'modifiers': [modifier.id for modifier in modifiers],
+					'result': path_result,
+					'bundles': [{
+						'name': bundle.name,
+						'objects': [obj.name for obj in bundle.objects],
+						'pivot': tuple(bundle.pivot)
+					} for bundle in shard]
+				}, file)
+
+			expression = worker_expression.format(package=__package__, module=__name__)
+			command = [bpy.app.binary_path, "-b", path_blend, "--python-expr", expression, "--", path_job]
+			log = open(path_log, 'w')
+			print("Export worker {} = {}x bundles".format(index, len(shard)))
+			processes.append((subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT), log, shard, path_result, path_log))
+
+		# Collect results, a crashed worker fails all of its bundles
+		errors = {}
+		for process, log, shard, path_result, path_log in processes:
+			process.wait()
+			log.close()
+
+			results = {}
+			if os.path.exists(path_result):
+				with open(path_result, 'r') as file:
+					results = json.load(file)
+
+			for bundle in shard:
+				if bundle.name not in results:
+					errors[bundle.name] = "Worker exited with code {}, see log: {}".format(process.returncode, get_log_tail(path_log))
+					continue
+
+				if results[bundle.name]['error']:
+					errors[bundle.name] = results[bundle.name]['error']
+				if report and results[bundle.name]['report']:
+					report.merge_bundle(bundle.name, results[bundle.name]['report'])
+
+		return errors
+
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+
+
+
+def get_shards(bundles, workers):
+	# Balance by object count, largest bundles first
+	shards = [[] for i in range(min(workers, len(bundles)))]
+	loads = [0] * len(shards)
+	for bundle in sorted(bundles, key=lambda bundle: len(bundle.objects), reverse=True):
+		index = loads.index(min(loads))
+		shards[index].append(bundle)
+		loads[index] += len(bundle.objects)
+	return [shard for shard in shards if shard]
+
+
+
+def get_log_tail(path, lines=5):
+	if not os.path.exists(path):
+		return ""
+	with open(path, 'r', errors='replace') as file:
+		return " | ".join(file.read().strip().splitlines()[-lines:])
+
+
+
+def worker_main():
+	# Entry point inside a background worker
+	from . import api
+	from . import modifiers
+	from . import export_report
+
+	path_job = sys.argv[sys.argv.index("--") + 1]
+	with open(path_job, 'r') as file:
+		job = json.load(file)
+
+	bpy.context.scene.unit_settings.system = 'METRIC'
+	bpy.context.tool_settings.transform_pivot_point = 'MEDIAN_POINT'
+
+	job_modifiers = [modifier for modifier in modifiers.modifiers if modifier.id in job['modifiers']]
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+
+	results = {}
+	report = export_report.Report()
+	for data in job['bundles']:
+		name = data['name']
+		objects = [bpy.data.objects[n] for n in data['objects'] if n in bpy.data.objects]
+		bundle = api.Bundle(name, objects, Vector(data['pivot']))
+		error = None
+		try:
+			with export_report.count_operators(report):
+				api.export_bundle(bundle, job['folder'], job['platform'], job_modifiers, depsgraph, report)
+		except Exception:
+			traceback.print_exc()
+			error = traceback.format_exc().strip().splitlines()[-1]
+		results[name] = {'error': error, 'report': report.bundles.get(name)}
+
+		# Results are written as they come so a crash keeps finished bundles
+		with open(job['result'], 'w') as file:
+			json.dump(results, file)
@@ -0,0 +1,265 @@
+import bpy
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+from . import mesh_arrays
+from . import export_output
+from . import export_memory
+
+
+# Written to the output folder after every export, the leading dot keeps
+# Unity from importing it.
+filename = ".fbxbundle_report.json"
+version = 1
+
+# cProfile files per bundle, with profiling
+profiles_folder = ".fbxbundle_profiles"
+
+# Allocation sites kept per stage and in total
+sites_limit = 10
+
+
+class Report:
+	# Seconds and bpy.ops calls per stage, in total and per bundle
+
+	def __init__(self, profile_memory=False, profile_calls=False):
+		self.started = time.time()
+		self.stages = {}
+		self.bundles = {}
+		self.ops = 0
+		self.profiler = Profiler(profile_memory, profile_calls) if profile_memory or profile_calls else None
+
+
+	@contextmanager
+	def stage(self, name, bundle=None):
+		ops = self.ops
+		profiled = self.profiler.begin(bundle) if self.profiler else None
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add(name, time.perf_counter() - start, self.ops - ops, bundle)
+			if profiled:
+				memory = self.profiler.end(profiled, bundle)
+				if memory and bundle:
+					self.get_bundle(bundle).setdefault('memory', {})[name] = memory
+				elif memory:
+					self.stages[name]['memory'] = memory
+			if bundle:
+				self.sample_memory(bundle)
+
+
+	def sample_memory(self, name):
+		# Peak resident memory of a bundle in bytes
+		bundle = self.get_bundle(name)
+		bundle['peak_rss'] = max(bundle.get('peak_rss', 0), export_memory.get_bundle_peak())
+
+
+	def add(self, name, seconds, ops, bundle=None):
+		entries = [self.stages]
+		if bundle:
+			entries.append(self.get_bundle(bundle)['stages'])
+
+		for stages in entries:
+			stage = stages.setdefault(name, {'seconds': 0.0, 'ops': 0, 'calls': 0})
+			stage['seconds'] += seconds
+			stage['ops'] += ops
+			stage['calls'] += 1
+
+
+	def get_bundle(self, name):
+		return self.bundles.setdefault(name, {'stages': {}})
+
+
+	def set_bundle(self, name, **values):
+		self.get_bundle(name).update(values)
+
+
+	def merge_bundle(self, name, data):
+		# Bundle entry reported by a background worker
+		for stage, values in data.get('stages', {}).items():
+			self.add(stage, values['seconds'], values['ops'], name)
+		self.set_bundle(name, **{key: value for key, value in data.items() if key != 'stages'})
+
+
+	def get_summary(self, limit=6):
+		stages = sorted(self.stages.items(), key=lambda item: item[1]['seconds'], reverse=True)
+		summary = ["{}: {:.2f}s, {}x ops".format(name, stage['seconds'], stage['ops']) for name, stage in stages[:limit]]
+
+		# Buffer bytes saved by quantization and 16 bit indices
+		written = sum(bundle.get('buffer_bytes', 0) for bundle in self.bundles.values())
+		unquantized = sum(bundle.get('buffer_bytes_unquantized', 0) for bundle in self.bundles.values())
+		if unquantized > written:
+			summary.append("buffers: {:.1f} of {:.1f} MB, {:.0f}% saved".format(written / 1e6, unquantized / 1e6, 100 * (1 - written / unquantized)))
+
+		peaks = [(bundle.get('peak_rss', 0), name) for name, bundle in self.bundles.items()]
+		if peaks and max(peaks)[0] > 0:
+			summary.append("peak memory: {:.0f} MB in {}".format(max(peaks)[0] / 1e6, max(peaks)[1]))
+
+		if self.profiler and self.profiler.sites:
+			site, size = max(self.profiler.sites.items(), key=lambda item: item[1])
+			summary.append("top allocation: {}, {:.1f} MB".format(site, size / 1e6))
+		return summary
+
+
+	def save(self, folder):
+		data = {
+			'version': version,
+			'started': self.started,
+			'seconds': time.time() - self.started,
+			'stages': self.stages,
+			'bundles': self.bundles
+		}
+		if self.profiler:
+			data['allocations'] = self.profiler.get_top_sites()
+			self.profiler.save(os.path.join(folder, profiles_folder))
+
+		path = os.path.join(folder, filename)
+		with export_output.open_atomic(path) as file:
+			json.dump(data, file, indent=1, sort_keys=True)
+		return path
+
+
+	def close(self):
+		# Stops tracing started by this report
+		if self.profiler:
+			self.profiler.stop()
+
+
+
+class Profiler:
+	# Opt-in, tracing slows Python down several times. Takes tracemalloc
+	# snapshots and resident memory around every stage, Blender's own C
+	# allocations only show in the resident memory. With 'calls' every bundle
+	# gets a cProfile of its stages on the main thread.
+
+	def __init__(self, memory=True, calls=False):
+		self.memory = memory and not tracemalloc.is_tracing()
+		self.calls = calls
+		self.sites = {}
+		self.profiles = {}
+		if self.memory:
+			tracemalloc.start()
+
+
+	def begin(self, bundle):
+		snapshot = None
+		if self.memory:
+			if hasattr(tracemalloc, 'reset_peak'):
+				tracemalloc.reset_peak()
+			snapshot = get_snapshot()
+
+		profile = None
+		if self.calls and bundle:
+			profile = self.profiles.setdefault(bundle, cProfile.Profile())
+			try:
+				profile.enable()
+			except ValueError:
+				# Another profiler is active
+				profile = None
+
+		return snapshot, export_memory.get_memory(), profile
+
+
+	def end(self, profiled, bundle):
+		snapshot, rss, profile = profiled
+		if profile:
+			profile.disable()
+		if snapshot is None:
+			return None
+
+		peak = tracemalloc.get_traced_memory()[1]
+		differences = get_snapshot().compare_to(snapshot, 'lineno')
+		sites = []
+		for difference in differences:
+			site = get_site(difference.traceback[0])
+			self.sites[site] = self.sites.get(site, 0) + difference.size_diff
+			if len(sites) < sites_limit and difference.size_diff > 0:
+				sites.append({'site': site, 'bytes': difference.size_diff, 'count': difference.count_diff})
+
+		return {
+			'allocated': sum(difference.size_diff for difference in differences),
+			'peak': peak,
+			'rss_before': rss,
+			'rss_after': export_memory.get_memory(),
+			'sites': sites
+		}
+
+
+	def get_top_sites(self):
+		# Net bytes allocated per site over the whole export
+		sites = sorted(self.sites.items(), key=lambda item: item[1], reverse=True)
+		return [{'site': site, 'bytes': size} for site, size in sites[:sites_limit] if size > 0]
+
+
+	def save(self, folder):
+		if not self.profiles:
+			return
+		os.makedirs(folder, exist_ok=True)
+		for bundle, profile in self.profiles.items():
+			profile.dump_stats(os.path.join(folder, bpy.path.clean_name(bundle) + ".prof"))
+
+
+	def stop(self):
+		if self.memory:
+			tracemalloc.stop()
+			self.memory = False
+
+
+
+def get_snapshot():
+	# Without the allocations of tracing, the report itself and imports
+	return tracemalloc.take_snapshot().filter_traces((
+		tracemalloc.Filter(False, tracemalloc.__file__),
+		tracemalloc.Filter(False, __file__),
+		tracemalloc.Filter(False, export_memory.__file__),
+		tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+		tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+	))
+
+
+
+def get_site(frame):
+	# File with its folder and line
+	folder, name = os.path.split(frame.filename)
+	return "{}/{}:{}".format(os.path.basename(folder), name, frame.lineno)
+
+
+
+@contextmanager
+def count_operators(report):
+	# Every operator goes through bpy.ops._op_call, wrap it while exporting
+	module = sys.modules.get('bpy.ops')
+	call = getattr(module, '_op_call', None)
+	if call is None:
+		yield
+		return
+
+	def counted(*args, **kwargs):
+		report.ops += 1
+		return call(*args, **kwargs)
+
+	module._op_call = counted
+	try:
+		yield
+	finally:
+		module._op_call = call
+
+
+
+def get_triangle_count(objects, depsgraph):
+	count = 0
+	for obj in objects:
+		if obj.type == 'MESH':
+			count += mesh_arrays.get_triangle_count(obj.evaluated_get(depsgraph).data)
+	return count
+
+
+
+def get_file_size(path):
+	return os.path.getsize(path) if os.path.exists(path) else 0
@@ -0,0 +1,114 @@
+import bpy
+import numpy as np
+
+
+# Data type, components and property name of each mesh attribute type
+attribute_types = {
+	'FLOAT'			: (np.float32, 1, 'value'),
+	'INT'			: (np.int32, 1, 'value'),
+	'FLOAT_VECTOR'	: (np.float32, 3, 'vector'),
+	'FLOAT_COLOR'	: (np.float32, 4, 'color'),
+	'BYTE_COLOR'	: (np.float32, 4, 'color'),
+	'BOOLEAN'		: (np.bool_, 1, 'value'),
+	'FLOAT2'		: (np.float32, 2, 'vector'),
+	'INT8'			: (np.int32, 1, 'value'),
+	'INT16_2D'		: (np.int32, 2, 'value'),
+	'INT32_2D'		: (np.int32, 2, 'value'),
+	'QUATERNION'	: (np.float32, 4, 'value'),
+	'FLOAT4X4'		: (np.float32, 16, 'value'),
+}
+
+
+def get_array(collection, prop, dtype, components=1):
+	# Read a property of every element with a single foreach_get call
+	array = np.empty(len(collection) * components, dtype=dtype)
+	collection.foreach_get(prop, array)
+	if components > 1:
+		return array.reshape(-1, components)
+	return array
+
+
+def get_attribute(attribute):
+	if attribute.data_type not in attribute_types:
+		return None
+	dtype, components, prop = attribute_types[attribute.data_type]
+	return get_array(attribute.data, prop, dtype, components)
+
+
+def get_positions(mesh):
+	return get_array(mesh.vertices, 'co', np.float32, 3)
+
+
+def get_corner_verts(mesh):
+	return get_array(mesh.loops, 'vertex_index', np.int32)
+
+
+def get_face_sizes(mesh):
+	return get_array(mesh.polygons, 'loop_total', np.int32)
+
+
+def get_face_starts(mesh):
+	return get_array(mesh.polygons, 'loop_start', np.int32)
+
+
+def get_material_indices(mesh):
+	return get_array(mesh.polygons, 'material_index', np.int32)
+
+
+def get_face_smooth(mesh):
+	return get_array(mesh.polygons, 'use_smooth', np.bool_)
+
+
+def get_corner_normals(mesh):
+	if hasattr(mesh, "corner_normals"):
+		return get_array(mesh.corner_normals, 'vector', np.float32, 3)
+
+	# Blender 4.0 and older
+	mesh.calc_normals_split()
+	return get_array(mesh.loops, 'normal', np.float32, 3)
+
+
+def get_uvs(mesh, layer):
+	if hasattr(layer, "uv"):
+		return get_array(layer.uv, 'vector', np.float32, 2)
+
+	# Blender 3.4 and older
+	return get_array(layer.data, 'uv', np.float32, 2)
+
+
+def get_triangles(mesh):
+	# Corner indices and material index of every triangle
+	mesh.calc_loop_triangles()
+	corners = get_array(mesh.loop_triangles, 'loops', np.int32, 3)
+	materials = get_array(mesh.loop_triangles, 'material_index', np.int32)
+	return corners, materials
+
+
+def get_triangle_polygons(mesh):
+	# Face of every triangle, after get_triangles
+	return get_array(mesh.loop_triangles, 'polygon_index', np.int32)
+
+
+def get_triangle_count(mesh):
+	sizes = get_face_sizes(mesh)
+	return int(np.maximum(sizes - 2, 0).sum())
+
+
+def get_color_layers(mesh):
+	if hasattr(mesh, "color_attributes"):
+		return list(mesh.color_attributes)
+
+	# Blender 3.1 and older
+	return list(mesh.vertex_colors)
+
+
+def get_colors(mesh, layer, srgb=True):
+	# RGBA per corner, linear or in sRGB where Blender provides it
+	if len(layer.data) == 0:
+		return np.zeros((0, 4), dtype=np.float32)
+
+	prop = 'color_srgb' if srgb and hasattr(layer.data[0], 'color_srgb') else 'color'
+	colors = get_array(layer.data, prop, np.float32, 4)
+	if getattr(layer, 'domain', 'CORNER') == 'POINT':
+		return colors[get_corner_verts(mesh)]
+	return colors
@@ -0,0 +1,412 @@
+import numpy as np
+
+
+# Collision shapes fitted to point arrays: oriented boxes, spheres and
+# capsules from the principal axes of the points, convex hulls and an
+# approximate convex decomposition into several hulls. Shapes are returned
+# as a 4x4 frame and sizes, hulls as triangles indexing the points.
+
+# Distances below this fraction of the points' extent count as flat
+epsilon = 1e-6
+
+# Iterations moving a sphere's center towards its farthest point
+sphere_iterations = 64
+
+# Cut positions tried across each axis of a part, as fractions of its extent
+split_fractions = (1/6, 2/6, 3/6, 4/6, 5/6)
+
+# Points of a part its hull volume is estimated from
+sample_size = 2000
+
+# Parts stop being cut when their surface lies no deeper inside their hull
+# than this fraction of the whole mesh's extent
+split_concavity = 0.02
+
+
+
+def fit_box(points, axes=()):
+	# Frame and half sizes of the smallest box along the principal axes of
+	# the points, the world axes or any of 'axes' (3x3, vectors in columns)
+	center = points.mean(axis=0)
+	candidates = [get_principal_axes(points), np.identity(3)] + [get_orthonormal(frame) for frame in axes]
+
+	best = None
+	for frame in candidates:
+		local = (points - center) @ frame
+		low, high = local.min(axis=0), local.max(axis=0)
+		volume = np.prod(np.maximum(high - low, 0))
+		if best is None or volume < best[0]:
+			best = (volume, frame, low, high)
+
+	_, frame, low, high = best
+	return get_matrix(frame, center + frame @ ((low + high) / 2)), (high - low) / 2
+
+
+
+def fit_sphere(points):
+	# Frame and radius of a sphere around the points. Starts at the center of
+	# their box and moves towards the farthest point in shrinking steps.
+	matrix, _ = fit_box(points)
+	center = matrix[:3, 3].copy()
+	for iteration in range(sphere_iterations):
+		far = points[np.argmax(np.sum((points - center) ** 2, axis=1))]
+		center += (far - center) / (iteration + 2)
+	radius = np.sqrt(np.max(np.sum((points - center) ** 2, axis=1)))
+	return get_matrix(np.identity(3), center), radius
+
+
+
+def fit_capsule(points, axes=()):
+	# Frame, radius and half length of the cylinder part of a capsule along
+	# the local Z axis, on the longest axis of the points' box
+	matrix, half_sizes = fit_box(points, axes)
+	axis = int(np.argmax(half_sizes))
+	# Longest axis to Z, keeping the frame right handed
+	order = [(axis + 1) % 3, (axis + 2) % 3, axis]
+	frame = matrix[:3, order]
+	center = matrix[:3, 3]
+
+	local = (points - center) @ frame
+	distances = np.sum(local[:, :2] ** 2, axis=1)
+	radius = np.sqrt(distances.max())
+
+	# Ends of the segment every point is within the radius of
+	reach = np.sqrt(np.maximum(radius * radius - distances, 0))
+	top = np.max(local[:, 2] - reach)
+	bottom = np.min(local[:, 2] + reach)
+	if top < bottom:
+		top = bottom = (top + bottom) / 2
+	return get_matrix(frame, center + frame[:, 2] * (top + bottom) / 2), radius, (top - bottom) / 2
+
+
+
+def convex_hull(points, max_vertices=0):
+	# Outward facing triangles of the convex hull, indexing the points. With
+	# 'max_vertices' the hull stops growing at that many vertices, taking
+	# the points farthest out first. None for flat or collinear points.
+	tolerance = get_tolerance(points)
+	simplex = get_simplex(points, tolerance)
+	if simplex is None:
+		return None
+
+	interior = points[simplex].mean(axis=0)
+	a, b, c, d = simplex
+	faces = [orient(points, interior, face) for face in ((a, b, c), (a, b, d), (b, c, d), (c, a, d))]
+	normals, offsets = get_planes(points, faces)
+	alive = [True] * 4
+
+	# Every point outside the hull belongs to the face it is farthest above
+	distances = points @ normals.T - offsets
+	point_faces = np.argmax(distances, axis=1)
+	point_distances = distances[np.arange(len(points)), point_faces]
+	point_faces[point_distances <= tolerance] = -1
+	point_faces[simplex] = -1
+	vertices = 4
+
+	while not max_vertices or vertices < max_vertices:
+		outside = np.flatnonzero(point_faces >= 0)
+		if len(outside) == 0:
+			break
+		point = outside[np.argmax(point_distances[outside])]
+
+		# Faces the point sees, their edges without a twin form the horizon
+		indices = np.flatnonzero(alive)
+		visible = indices[points[point] @ normals[indices].T - offsets[indices] > tolerance]
+		edges = set()
+		for index in visible:
+			alive[index] = False
+			face = faces[index]
+			edges.update(((face[0], face[1]), (face[1], face[2]), (face[2], face[0])))
+		horizon = [edge for edge in edges if (edge[1], edge[0]) not in edges]
+
+		first = len(faces)
+		faces.extend(orient(points, interior, (edge[0], edge[1], point)) for edge in horizon)
+		alive.extend([True] * len(horizon))
+		new_normals, new_offsets = get_planes(points, faces[first:])
+		normals = np.concatenate([normals, new_normals])
+		offsets = np.concatenate([offsets, new_offsets])
+
+		# Points of the removed faces move to the new face they are farthest above
+		point_faces[point] = -1
+		orphans = np.flatnonzero(np.isin(point_faces, visible))
+		if len(orphans) > 0:
+			distances = points[orphans] @ new_normals.T - new_offsets
+			best = np.argmax(distances, axis=1)
+			point_distances[orphans] = distances[np.arange(len(orphans)), best]
+			point_faces[orphans] = np.where(point_distances[orphans] > tolerance, first + best, -1)
+		vertices += 1
+
+	return np.array([face for face, keep in zip(faces, alive) if keep], dtype=np.int64)
+
+
+
+def convex_decomposition(corners, count, max_vertices=0):
+	# Triangles, as corner positions (n x 3 x 3), cut into at most 'count'
+	# parts that each fit their convex hull more tightly. The most concave
+	# part, with its surface deepest inside its hull, is cut where the hulls of
+	# both sides are smallest. Triangles crossing a cut are clipped, so the
+	# hulls of the parts meet. Returns the points of every part.
+	points = corners.reshape(-1, 3)
+	limit = split_concavity * np.linalg.norm(points.max(axis=0) - points.min(axis=0))
+	parts = [corners]
+	concavities = [get_concavity(corners, max_vertices)]
+
+	while len(parts) < count:
+		index = int(np.argmax(concavities))
+		if concavities[index] <= limit:
+			break
+		left, right = get_best_cut(parts[index], max_vertices)
+		if left is None:
+			concavities[index] = 0
+			continue
+		parts[index:index+1] = [left, right]
+		concavities[index:index+1] = [get_concavity(part, max_vertices) for part in (left, right)]
+	return [part.reshape(-1, 3) for part in parts]
+
+
+
+def get_best_cut(corners, max_vertices):
+	# Triangles on either side of the plane across the principal axes of a
+	# part that leaves the smallest hulls
+	points = corners.reshape(-1, 3)
+	best = (None, None, None)
+
+	axes = get_principal_axes(get_sample(points))
+	for axis in axes.T:
+		positions = points @ axis
+		low, high = positions.min(), positions.max()
+		for fraction in split_fractions:
+			left, right = clip(corners, axis, low + (high - low) * fraction)
+			if len(left) == 0 or len(right) == 0:
+				continue
+			volume = get_hull_volume(left.reshape(-1, 3), max_vertices) + get_hull_volume(right.reshape(-1, 3), max_vertices)
+			if best[0] is None or volume < best[0]:
+				best = (volume, left, right)
+	return best[1:]
+
+
+
+def clip(corners, normal, offset):
+	# Triangles below and above a plane, those crossing it cut in two
+	distances = corners @ normal - offset
+	below = distances <= 0
+	count = below.sum(axis=1)
+	crossing = (count == 1) | (count == 2)
+
+	# Crossing triangles rolled to start at the corner alone on its side
+	rows = np.flatnonzero(crossing)
+	alone = np.where(count[rows] == 1, np.argmax(below[rows], axis=1), np.argmin(below[rows], axis=1))
+	order = (alone[:, None] + np.arange(3)) % 3
+	a, b, c = [corners[rows, order[:, i]] for i in range(3)]
+	da, db, dc = [distances[rows, order[:, i]][:, None] for i in range(3)]
+	p = a + (b - a) * (da / (da - db))
+	q = a + (c - a) * (da / (da - dc))
+
+	tip = np.stack([a, p, q], axis=1)
+	base = np.concatenate([np.stack([p, b, c], axis=1), np.stack([p, c, q], axis=1)])
+	tip_below = count[rows] == 1
+	base_below = np.concatenate([~tip_below, ~tip_below])
+
+	left = np.concatenate([corners[count == 3], tip[tip_below], base[base_below]])
+	right = np.concatenate([corners[count == 0], tip[~tip_below], base[~base_below]])
+	return left, right
+
+
+
+def get_hull_volume(points, max_vertices):
+	# Volume of the hull of at most sample_size of the points
+	points = get_sample(points)
+	hull = convex_hull(points, max_vertices)
+	if hull is None:
+		return 0.0
+	corners = points[hull] - points[hull].reshape(-1, 3).mean(axis=0)
+	return abs(np.sum(np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])))) / 6
+
+
+
+def get_concavity(corners, max_vertices):
+	# Farthest any triangle looks along its normal before leaving the hull,
+	# 0 when all of them lie on it
+	points = get_sample(corners.reshape(-1, 3))
+	hull = convex_hull(points, max_vertices)
+	if hull is None:
+		return 0.0
+	planes, offsets = get_planes(points, hull)
+
+	if len(corners) > sample_size:
+		corners = corners[np.linspace(0, len(corners) - 1, sample_size).astype(np.int64)]
+	normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	lengths = np.linalg.norm(normals, axis=1)
+	centers = corners[lengths > 0].mean(axis=1)
+	normals = normals[lengths > 0] / lengths[lengths > 0][:, None]
+
+	facing = normals @ planes.T
+	gaps = np.maximum(offsets - centers @ planes.T, 0)
+	distances = np.where(facing > 1e-9, gaps / np.maximum(facing, 1e-9), np.inf).min(axis=1)
+	distances = distances[np.isfinite(distances)]
+	return float(distances.max()) if len(distances) > 0 else 0.0
+
+
+
+def get_sample(points):
+	# Unique points, every nth of them when there are many. Triangle corners
+	# repeat every vertex about six times.
+	if len(points) > sample_size * 6:
+		points = points[np.linspace(0, len(points) - 1, sample_size * 6).astype(np.int64)]
+	points = np.unique(points, axis=0)
+	if len(points) > sample_size:
+		points = points[np.linspace(0, len(points) - 1, sample_size).astype(np.int64)]
+	return points
+
+
+
+def get_hull_mesh(points, max_vertices=0):
+	# Positions and triangles of the hull of the points, a thin box around
+	# them when they are flat
+	points = np.unique(points, axis=0)
+	hull = convex_hull(points, max_vertices) if len(points) >= 4 else None
+	if hull is None:
+		matrix, half_sizes = fit_box(points)
+		half_sizes = np.maximum(half_sizes, get_tolerance(points) + 1e-6)
+		positions, faces = get_box(half_sizes)
+		positions = positions @ matrix[:3, :3].T + matrix[:3, 3]
+		return positions, triangulate(faces)
+
+	indices, triangles = np.unique(hull, return_inverse=True)
+	return points[indices], triangles.reshape(-1, 3)
+
+
+
+def get_box(half_sizes):
+	# Positions and quads of a box around the origin
+	signs = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float64)
+	quads = np.array([[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1], [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]])
+	return signs * half_sizes, quads
+
+
+
+def get_capsule(radius, half_length, segments=12, rings=3):
+	# Positions and faces of a capsule along Z, 'rings' per cap
+	angles = np.linspace(0, np.pi / 2, rings + 1)
+	heights = list(-half_length - radius * np.cos(angles)) + list(half_length + radius * np.sin(angles))
+	radii = list(radius * np.sin(angles)) + list(radius * np.cos(angles))
+	return get_lathe(heights, radii, segments)
+
+
+
+def get_sphere(radius, segments=12, rings=6):
+	angles = np.linspace(0, np.pi, rings + 1)
+	return get_lathe(-radius * np.cos(angles), radius * np.sin(angles), segments)
+
+
+
+def get_lathe(heights, radii, segments):
+	# Rings of points around Z from pole to pole, the first and last of
+	# radius 0. Returns positions and outward wound faces.
+	angles = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+	positions = [[0, 0, heights[0]]]
+	for height, radius in zip(heights[1:-1], radii[1:-1]):
+		positions += [[radius * np.cos(angle), radius * np.sin(angle), height] for angle in angles]
+	positions.append([0, 0, heights[-1]])
+
+	faces = []
+	last = len(positions) - 1
+	for j in range(segments):
+		k = (j + 1) % segments
+		faces.append([0, 1 + k, 1 + j])
+		for ring in range(len(heights) - 3):
+			start = 1 + ring * segments
+			faces.append([start + j, start + k, start + segments + k, start + segments + j])
+		start = last - segments
+		faces.append([start + j, start + k, last])
+	return np.array(positions, dtype=np.float64), faces
+
+
+
+def triangulate(faces):
+	# Fans of every face
+	triangles = [[face[0], face[i], face[i+1]] for face in faces for i in range(1, len(face) - 1)]
+	return np.array(triangles, dtype=np.int64)
+
+
+
+def get_principal_axes(points):
+	# Eigenvectors of the covariance of the points, largest first, as a
+	# right handed frame
+	if len(points) < 2:
+		return np.identity(3)
+	_, vectors = np.linalg.eigh(np.cov((points - points.mean(axis=0)).T))
+	vectors = vectors[:, ::-1]
+	if np.linalg.det(vectors) < 0:
+		vectors[:, 2] *= -1
+	return vectors
+
+
+
+def get_orthonormal(frame):
+	# Nearest rotation to a frame, e.g. from a scaled object matrix
+	u, _, vt = np.linalg.svd(frame)
+	rotation = u @ vt
+	if np.linalg.det(rotation) < 0:
+		u[:, 2] *= -1
+		rotation = u @ vt
+	return rotation
+
+
+
+def get_matrix(frame, center):
+	matrix = np.identity(4)
+	matrix[:3, :3] = frame
+	matrix[:3, 3] = center
+	return matrix
+
+
+
+def get_tolerance(points):
+	return max(np.linalg.norm(points.max(axis=0) - points.min(axis=0)) * epsilon, 1e-12)
+
+
+
+def get_simplex(points, tolerance):
+	# Four points spanning a tetrahedron, None if there are none
+	if len(points) < 4:
+		return None
+	a = int(np.argmin(points[:, 0]))
+	b = int(np.argmax(np.sum((points - points[a]) ** 2, axis=1)))
+	line = points[b] - points[a]
+	if np.linalg.norm(line) <= tolerance:
+		return None
+
+	line = line / np.linalg.norm(line)
+	offsets = points - points[a]
+	off_line = offsets - np.outer(offsets @ line, line)
+	c = int(np.argmax(np.sum(off_line ** 2, axis=1)))
+	if np.linalg.norm(off_line[c]) <= tolerance:
+		return None
+
+	normal = np.cross(points[b] - points[a], points[c] - points[a])
+	normal /= np.linalg.norm(normal)
+	heights = np.abs(offsets @ normal)
+	d = int(np.argmax(heights))
+	if heights[d] <= tolerance:
+		return None
+	return np.array([a, b, c, d])
+
+
+
+def orient(points, interior, face):
+	# Face wound to face away from the interior point
+	a, b, c = face
+	normal = np.cross(points[b] - points[a], points[c] - points[a])
+	if normal @ (points[a] - interior) < 0:
+		return (a, c, b)
+	return (a, b, c)
+
+
+
+def get_planes(points, faces):
+	faces = np.array(faces, dtype=np.int64).reshape(-1, 3)
+	corners = points[faces]
+	normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+	return normals, np.sum(normals * corners[:, 0], axis=1)
@@ -0,0 +1,452 @@
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+from . import mesh_arrays
+
+
+# Merges mesh objects at the data level: arrays of every mesh are read with
+# foreach_get, transformed to world space and concatenated, vertices are
+# welded with a spatial hash grid and one mesh is built per material or for
+# all of them. Replaces the join operator, bmesh remove_doubles and separating
+# by material for static meshes.
+
+# Spatial hash of integer grid cells, collisions only add candidate pairs
+hash_primes = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+
+# Vertices whose neighbours are searched at once
+weld_chunk = 262144
+
+# Vertices 16 bit indices can address
+chunk_vertices_max = 65535
+
+
+def is_supported(objects):
+	# Skinned and shape keyed meshes need the join operator for their vertex
+	# groups, modifiers and keys
+	for obj in objects:
+		if obj.type == 'MESH':
+			if len(obj.modifiers) > 0 or obj.data.shape_keys:
+				return False
+	return True
+
+
+
+class Part:
+	# Arrays of one mesh object in world space
+	def __init__(self, obj, data, materials):
+		matrix = np.array(obj.matrix_world, dtype=np.float64)
+		self.positions = data.positions @ matrix[:3, :3].T + matrix[:3, 3]
+
+		self.corners = data.corners
+		self.sizes = data.sizes
+		self.smooth = data.smooth
+		self.uvs = data.uvs
+		self.colors = data.colors
+		self.normals = None
+		if data.normals is not None:
+			normal_matrix = np.linalg.inv(matrix[:3, :3]).T
+			normals = data.normals @ normal_matrix.T
+			self.normals = normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+		# Slot indices to indices into the merged materials, clamped like Blender does
+		slots = [slot.material for slot in obj.material_slots] or [None]
+		remap = np.array([materials.setdefault(material, len(materials)) for material in slots], dtype=np.int32)
+		self.materials = remap[np.clip(data.materials, 0, len(remap) - 1)]
+
+		# Mirrored objects reverse the winding
+		if np.linalg.det(matrix[:3, :3]) < 0:
+			self.flip()
+
+
+	def flip(self):
+		starts = np.cumsum(self.sizes) - self.sizes
+		faces = np.repeat(np.arange(len(self.sizes)), self.sizes)
+		order = 2 * starts[faces] + self.sizes[faces] - 1 - np.arange(len(faces))
+		self.corners = self.corners[order]
+		self.uvs = {name: uvs[order] for name, uvs in self.uvs.items()}
+		self.colors = {name: (data_type, colors[order]) for name, (data_type, colors) in self.colors.items()}
+		if self.normals is not None:
+			self.normals = self.normals[order]
+
+
+
+class MeshData:
+	# Arrays of a mesh in object space, read once for meshes shared by objects
+	def __init__(self, mesh, triangulate, normals):
+		self.positions = mesh_arrays.get_positions(mesh).astype(np.float64)
+		corners = mesh_arrays.get_corner_verts(mesh)
+		materials = mesh_arrays.get_material_indices(mesh)
+		smooth = mesh_arrays.get_face_smooth(mesh)
+
+		if triangulate:
+			# Corners of triangles index the loops of the original faces
+			loops, _ = mesh_arrays.get_triangles(mesh)
+			polygons = mesh_arrays.get_triangle_polygons(mesh)
+			loops = loops.reshape(-1)
+			self.sizes = np.full(len(polygons), 3, dtype=np.int32)
+			materials = materials[polygons]
+			smooth = smooth[polygons]
+		else:
+			loops = slice(None)
+			self.sizes = mesh_arrays.get_face_sizes(mesh)
+
+		self.corners = corners[loops]
+		self.materials = materials
+		self.smooth = smooth
+		self.uvs = {layer.name: mesh_arrays.get_uvs(mesh, layer)[loops] for layer in mesh.uv_layers}
+		self.colors = {layer.name: (getattr(layer, 'data_type', 'BYTE_COLOR'), mesh_arrays.get_colors(mesh, layer, srgb=False)[loops]) for layer in mesh_arrays.get_color_layers(mesh)}
+		self.normals = mesh_arrays.get_corner_normals(mesh)[loops].astype(np.float64) if normals else None
+
+
+
+def get_arrays(mesh, triangulate=False, normals=False):
+	# Arrays of a mesh in object space, in the layout create_mesh builds from
+	data = MeshData(mesh, triangulate, normals)
+	return {
+		'positions'	: data.positions,
+		'corners'	: data.corners,
+		'sizes'		: data.sizes,
+		'materials'	: data.materials,
+		'smooth'	: data.smooth,
+		'uvs'		: data.uvs,
+		'colors'	: data.colors,
+		'normals'	: data.normals,
+	}
+
+
+
+def merge(name, objects, distance=0.0, split=False, grid=None, max_vertices=0, format_name=None):
+	# Merges the mesh objects into one new object named 'name' at the world
+	# origin, or one per material with 'split'. Welding triangulates like the
+	# bmesh path did. Returns the new objects, plus the remaining objects
+	# unless split. The merged objects are removed.
+	#
+	# A 'grid' of (origin, cell size) or 'max_vertices' partitions the result
+	# into chunks, named by 'format_name' if given, see get_chunks.
+	meshes = [obj for obj in objects if obj.type == 'MESH']
+	others = [obj for obj in objects if obj.type != 'MESH']
+	if len(meshes) == 0:
+		return objects
+
+	first = meshes[0]
+	collections = list(first.users_collection)
+	uv_active = first.data.uv_layers.active.name if first.data.uv_layers.active else None
+	normals = any(has_split_normals(obj.data) for obj in meshes)
+	weld = distance > 0
+
+	# Read every mesh once, in world space per object
+	materials = {}
+	cache = {}
+	parts = []
+	for obj in meshes:
+		if obj.data not in cache:
+			cache[obj.data] = MeshData(obj.data, weld, normals)
+		parts.append(Part(obj, cache[obj.data], materials))
+	cache.clear()
+
+	# Children that aren't merged keep their place in the world
+	children = {child: child.matrix_world.copy() for obj in meshes for child in obj.children if child not in meshes}
+
+	# Free the sources before building, and their names for the new objects
+	for obj in meshes:
+		mesh = obj.data
+		bpy.data.objects.remove(obj)
+		if mesh.users == 0:
+			bpy.data.meshes.remove(mesh)
+
+	merged = concatenate(parts)
+	parts.clear()
+
+	if weld:
+		apply_weld(merged, get_weld_remap(merged['positions'], distance))
+		remove_degenerate(merged)
+
+	material_list = [None] * len(materials)
+	for material, index in materials.items():
+		material_list[index] = material
+
+	if split:
+		groups = []
+		for index in np.unique(merged['materials']):
+			material = material_list[index]
+			groups.append(("{}_{}".format(name, material.name) if material else name, merged['materials'] == index))
+	else:
+		groups = [(name, None)]
+
+	created = []
+	for group_name, mask in groups:
+		arrays = merged if mask is None else select_faces(merged, mask)
+		if grid is None and max_vertices <= 0:
+			created.append(create_object(group_name, arrays, material_list, uv_active, collections))
+			continue
+
+		for index, faces in enumerate(get_chunks(arrays, grid, max_vertices)):
+			chunk_mask = np.zeros(len(arrays['sizes']), dtype=bool)
+			chunk_mask[faces] = True
+			chunk_name = "{}_{:03d}".format(group_name, index)
+			if format_name:
+				chunk_name = format_name(chunk_name)
+			created.append(create_object(chunk_name, select_faces(arrays, chunk_mask), material_list, uv_active, collections))
+
+	for child, matrix in children.items():
+		child.parent = created[0] if len(created) == 1 else None
+		child.matrix_parent_inverse = Matrix()
+		child.matrix_world = matrix
+
+	if split:
+		return created
+	# Read before the merged objects were removed
+	return created + others
+
+
+
+def get_chunks(arrays, grid, max_vertices):
+	# Face indices of every chunk. Faces go to the 'grid' cell of their center,
+	# cells are then halved along their longest side until they have at most
+	# 'max_vertices', and never more than 16 bit indices address.
+	limit = min(max_vertices, chunk_vertices_max) if max_vertices > 0 else chunk_vertices_max
+	sizes = arrays['sizes']
+	starts = np.cumsum(sizes) - sizes
+	faces = np.repeat(np.arange(len(sizes)), sizes)
+	centers = np.stack([np.bincount(faces, arrays['positions'][arrays['corners'], axis], len(sizes)) for axis in range(3)], axis=1) / sizes[:, None]
+
+	if grid:
+		origin, cell = grid
+		cells = np.floor((centers - np.array(origin)) / cell).astype(np.int64)
+		_, inverse = np.unique(cells, axis=0, return_inverse=True)
+		inverse = inverse.reshape(-1)
+		order = np.argsort(inverse, kind='stable')
+		groups = np.split(order, np.flatnonzero(np.diff(inverse[order])) + 1)
+	else:
+		groups = [np.arange(len(sizes))]
+
+	chunks = []
+	for group in groups:
+		stack = [group]
+		while stack:
+			faces = stack.pop()
+			if len(faces) <= 1 or count_vertices(arrays['corners'], starts, sizes, faces) <= limit:
+				chunks.append(faces)
+				continue
+
+			points = centers[faces]
+			axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+			faces = faces[np.argsort(points[:, axis], kind='stable')]
+			half = len(faces) // 2
+			# Lower half first, chunks stay in spatial order
+			stack.append(faces[half:])
+			stack.append(faces[:half])
+
+	return chunks
+
+
+
+def count_vertices(corners, starts, sizes, faces):
+	counts = sizes[faces]
+	offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+	return len(np.unique(corners[np.repeat(starts[faces], counts) + offsets]))
+
+
+
+def has_split_normals(mesh):
+	# Shading that edge and face flags alone don't rebuild once edges are
+	# recalculated, kept as custom normals
+	if mesh.has_custom_normals:
+		return True
+	if hasattr(mesh, "use_auto_smooth"):
+		# Blender 4.0 and older
+		return mesh.use_auto_smooth
+	return 'sharp_edge' in mesh.attributes
+
+
+
+def concatenate(parts):
+	offsets = np.cumsum([0] + [len(part.positions) for part in parts])
+	merged = {
+		'positions'	: np.concatenate([part.positions for part in parts]),
+		'corners'	: np.concatenate([part.corners + offset for part, offset in zip(parts, offsets)]),
+		'sizes'		: np.concatenate([part.sizes for part in parts]),
+		'materials'	: np.concatenate([part.materials for part in parts]),
+		'smooth'	: np.concatenate([part.smooth for part in parts]),
+		'uvs'		: {},
+		'colors'	: {},
+		'normals'	: None,
+	}
+
+	# Layers by name, zero UVs and white colors where a mesh doesn't have them
+	counts = [len(part.corners) for part in parts]
+	for name in unique_names(part.uvs for part in parts):
+		merged['uvs'][name] = np.concatenate([part.uvs.get(name, np.zeros((count, 2), dtype=np.float32)) for part, count in zip(parts, counts)])
+	for name in unique_names(part.colors for part in parts):
+		data_type = next(part.colors[name][0] for part in parts if name in part.colors)
+		merged['colors'][name] = (data_type, np.concatenate([part.colors[name][1] if name in part.colors else np.ones((count, 4), dtype=np.float32) for part, count in zip(parts, counts)]))
+	if parts[0].normals is not None:
+		merged['normals'] = np.concatenate([part.normals for part in parts])
+
+	return merged
+
+
+
+def unique_names(layers):
+	names = []
+	for layer in layers:
+		for name in layer:
+			if name not in names:
+				names.append(name)
+	return names
+
+
+
+def get_weld_remap(positions, distance):
+	# Index of the vertex each vertex is welded to: the lowest index within
+	# 'distance', followed until it points at itself. Cells are two distances
+	# wide, so vertices close enough are in the same cell or the neighbours on
+	# the side the vertex is closer to, 8 cells in all.
+	scaled = positions / (2 * distance)
+	cells = np.floor(scaled).astype(np.int64)
+	sides = np.where(scaled - cells < 0.5, -1, 1)
+	keys = hash_cells(cells)
+	order = np.argsort(keys)
+	sorted_keys = keys[order]
+	target = np.arange(len(positions))
+	limit = distance * distance
+
+	for corner in range(8):
+		mask = np.array([(corner >> axis) & 1 for axis in range(3)], dtype=np.int64)
+		neighbour_keys = hash_cells(cells + sides * mask)
+
+		# Looked up in sorted order, many times faster than random order
+		queries = np.argsort(neighbour_keys)
+		low = np.searchsorted(sorted_keys, neighbour_keys[queries], 'left')
+		high = np.searchsorted(sorted_keys, neighbour_keys[queries], 'right')
+
+		for start in range(0, len(queries), weld_chunk):
+			counts = high[start:start+weld_chunk] - low[start:start+weld_chunk]
+			total = counts.sum()
+			if total == 0:
+				continue
+
+			# Every candidate pair of a vertex and a vertex in the neighbour cell
+			first = np.repeat(queries[start:start+weld_chunk], counts)
+			second = order[np.repeat(low[start:start+weld_chunk] - np.cumsum(counts) + counts, counts) + np.arange(total)]
+			close = (second < first) & (np.sum((positions[first] - positions[second]) ** 2, axis=1) <= limit)
+			np.minimum.at(target, first[close], second[close])
+
+	while True:
+		followed = target[target]
+		if np.array_equal(followed, target):
+			return target
+		target = followed
+
+
+
+def hash_cells(cells):
+	return np.bitwise_xor.reduce(cells * hash_primes, axis=1)
+
+
+
+def apply_weld(merged, remap):
+	# Drops welded vertices and points the corners at the kept ones
+	kept = np.flatnonzero(remap == np.arange(len(remap)))
+	index = np.zeros(len(remap), dtype=np.int32)
+	index[kept] = np.arange(len(kept), dtype=np.int32)
+	merged['corners'] = index[remap[merged['corners']]]
+	merged['positions'] = merged['positions'][kept]
+
+
+
+def remove_degenerate(merged):
+	# Triangles that lost an edge to welding
+	triangles = merged['corners'].reshape(-1, 3)
+	keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])
+	if keep.all():
+		return
+	merged.update(select_faces(merged, keep))
+
+
+
+def select_faces(merged, mask):
+	# Arrays of the faces in mask, with only the vertices they use
+	corner_mask = np.repeat(mask, merged['sizes'])
+	corners = merged['corners'][corner_mask]
+	used, corners = np.unique(corners, return_inverse=True)
+
+	return {
+		'positions'	: merged['positions'][used],
+		'corners'	: corners.reshape(-1).astype(np.int32),
+		'sizes'		: merged['sizes'][mask],
+		'materials'	: merged['materials'][mask],
+		'smooth'	: merged['smooth'][mask],
+		'uvs'		: {name: uvs[corner_mask] for name, uvs in merged['uvs'].items()},
+		'colors'	: {name: (data_type, colors[corner_mask]) for name, (data_type, colors) in merged['colors'].items()},
+		'normals'	: merged['normals'][corner_mask] if merged['normals'] is not None else None,
+	}
+
+
+
+def create_object(name, arrays, materials, uv_active, collections):
+	mesh = create_mesh(name, arrays, materials, uv_active)
+	obj = bpy.data.objects.new(name, mesh)
+	obj.matrix_world = Matrix()
+	for collection in collections:
+		collection.objects.link(obj)
+	return obj
+
+
+
+def create_mesh(name, arrays, materials, uv_active, compact=True):
+	# Without 'compact' every material is kept and face indices are used as
+	# they are, for meshes replacing the data of an object with its slots
+	sizes = arrays['sizes']
+	mesh = bpy.data.meshes.new(name)
+	mesh.vertices.add(len(arrays['positions']))
+	mesh.vertices.foreach_set('co', arrays['positions'].astype(np.float32).ravel())
+	mesh.loops.add(len(arrays['corners']))
+	mesh.loops.foreach_set('vertex_index', arrays['corners'].astype(np.int32))
+	mesh.polygons.add(len(sizes))
+	mesh.polygons.foreach_set('loop_start', (np.cumsum(sizes) - sizes).astype(np.int32))
+	if not mesh.polygons.bl_rna.properties['loop_total'].is_readonly:
+		# Blender 3.6 and older
+		mesh.polygons.foreach_set('loop_total', sizes.astype(np.int32))
+
+	if compact:
+		# Only the used materials, faces without one get no slot of their own
+		used = np.unique(arrays['materials'])
+		for index in used:
+			if materials[index] or len(used) > 1:
+				mesh.materials.append(materials[index])
+		mesh.polygons.foreach_set('material_index', np.searchsorted(used, arrays['materials']).astype(np.int32))
+	else:
+		for material in materials:
+			mesh.materials.append(material)
+		mesh.polygons.foreach_set('material_index', arrays['materials'].astype(np.int32))
+	mesh.polygons.foreach_set('use_smooth', arrays['smooth'])
+	mesh.update(calc_edges=True)
+
+	for uv_name, uvs in arrays['uvs'].items():
+		layer = mesh.uv_layers.new(name=uv_name, do_init=False)
+		if layer is None:
+			# Out of UV layers
+			break
+		layer.data.foreach_set('uv', uvs.astype(np.float32).ravel())
+		if uv_name == uv_active:
+			mesh.uv_layers.active = layer
+			layer.active_render = True
+
+	for color_name, (data_type, colors) in arrays['colors'].items():
+		if hasattr(mesh, "color_attributes"):
+			layer = mesh.color_attributes.new(color_name, data_type, 'CORNER')
+		else:
+			# Blender 3.1 and older
+			layer = mesh.vertex_colors.new(name=color_name)
+		layer.data.foreach_set('color', colors.astype(np.float32).ravel())
+
+	if arrays['normals'] is not None:
+		if hasattr(mesh, "use_auto_smooth"):
+			# Blender 4.0 and older
+			mesh.use_auto_smooth = True
+		mesh.normals_split_custom_set(arrays['normals'].astype(np.float32))
+
+	mesh.update()
+	return mesh
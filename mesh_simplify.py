@@ -0,0 +1,514 @@
+import os
+import sys
+import site
+import numpy as np
+
+
+# Quadric error metric simplifier for triangle meshes in the array layout of
+# mesh_merge. Imports neither bpy nor the add-on, so worker processes can run
+# it while Blender keeps working.
+#
+# Half-edges are collapsed in passes: every vertex picks its cheapest
+# collapse that flips no triangle, and the collapses whose triangles no cheaper collapse touches are
+# applied at once. Vertices on UV, color, normal and material seams and on
+# borders only slide along them, where seams meet vertices stay put. Corners
+# keep the attributes they had, so seams stay sharp.
+
+# Weight of the planes keeping seams and borders in place, relative to faces
+seam_weight = 10.0
+
+# Decimals corner normals are compared at
+normal_decimals = 3
+
+# Cosine of the largest turn of a triangle's normal in one collapse, and the
+# smallest area left relative to before, squared
+turn_limit = 0.2
+sliver_limit = 1e-6
+
+# Candidates evaluated at once, bounds memory on dense meshes
+chunk_size = 1000000
+
+# Cheaper collapses tried when the cheapest of a vertex is invalid
+validate_rounds = 3
+
+# Rounds choosing independent collapses in a pass
+independent_rounds = 4
+
+# Passes before giving up on reaching the target
+passes_max = 500
+
+# Module name of this file in worker processes
+worker_module = "mesh_simplify"
+
+pool = None
+
+
+def simplify(arrays, target, preserve=True):
+	# Arrays of a triangle mesh simplified to 'target' triangles, or as close
+	# as seams allow. Without 'preserve' UVs, colors and normals are dropped
+	# and only borders and material changes count as seams.
+	return simplify_chain(arrays, [target], preserve)[0]
+
+
+
+def simplify_chain(arrays, targets, preserve=True):
+	# One result per target, each simplified further from the one before
+	if len(arrays['sizes']) == 0:
+		return [arrays for target in targets]
+	mesh = Mesh(arrays, preserve)
+	results = []
+	for target in targets:
+		mesh.simplify(target)
+		results.append(mesh.get_arrays())
+	return results
+
+
+
+def simplify_chains(tasks, preserve=True):
+	# simplify_chain for every (arrays, targets) in tasks, in worker processes
+	# when there are several
+	if len(tasks) < 2:
+		return [simplify_chain(arrays, targets, preserve) for arrays, targets in tasks]
+
+	try:
+		module = get_worker_module()
+		futures = [get_pool().submit(module.simplify_chain, arrays, targets, preserve) for arrays, targets in tasks]
+		return [future.result() for future in futures]
+	except (OSError, RuntimeError) as error:
+		# No worker processes here, BrokenProcessPool is a RuntimeError
+		print("Simplifying in this process: {}".format(error))
+		shutdown()
+		return [simplify_chain(arrays, targets, preserve) for arrays, targets in tasks]
+
+
+
+class Mesh:
+	def __init__(self, arrays, preserve):
+		if np.any(arrays['sizes'] != 3):
+			raise ValueError("Only triangles can be simplified")
+
+		self.positions = arrays['positions'].astype(np.float64)
+		self.triangles = arrays['corners'].reshape(-1, 3).astype(np.int64)
+		self.face_keys = arrays['materials'].astype(np.int64) * 2 + arrays['smooth'].astype(np.int64)
+
+		# Unit normals of the input triangles, zero for degenerate ones. Turns
+		# add up over passes, so collapses are checked against these as well.
+		points = self.positions[self.triangles]
+		normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+		lengths = np.linalg.norm(normals, axis=1)
+		self.reference = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+
+		# Columns of the corner attributes, a wedge is a vertex with one set of them
+		self.layout = []
+		columns = [self.triangles.reshape(-1, 1).astype(np.float64)]
+		if preserve:
+			for name, uvs in arrays['uvs'].items():
+				self.layout.append(('uvs', name, None, 2))
+				columns.append(uvs)
+			for name, (data_type, colors) in arrays['colors'].items():
+				self.layout.append(('colors', name, data_type, 4))
+				columns.append(colors)
+			if arrays.get('normals') is not None:
+				self.layout.append(('normals', None, None, 3))
+				columns.append(np.round(arrays['normals'], normal_decimals))
+
+		rows, wedges = np.unique(np.concatenate(columns, axis=1), axis=0, return_inverse=True)
+		self.wedge_values = rows[:, 1:]
+		self.wedge_vertices = rows[:, 0].astype(np.int64)
+		self.wedges = wedges.reshape(-1, 3)
+
+		edges = self.get_edges()
+		self.quadrics = get_quadrics(self.positions, self.triangles, edges)
+
+
+	def simplify(self, target):
+		for _ in range(passes_max):
+			needed = len(self.triangles) - target
+			if needed <= 0 or not self.collapse(needed):
+				return
+
+
+	def get_edges(self):
+		# Unique edges, whether they are seams and whether they are non-manifold
+		n = len(self.positions)
+		starts = self.triangles.reshape(-1)
+		ends = self.triangles[:, [1, 2, 0]].reshape(-1)
+		wedge_starts = self.wedges.reshape(-1)
+		wedge_ends = self.wedges[:, [1, 2, 0]].reshape(-1)
+		faces = np.repeat(np.arange(len(self.triangles)), 3)
+
+		low = np.minimum(starts, ends)
+		high = np.maximum(starts, ends)
+		order = np.argsort(low * n + high, kind='stable')
+		keys = (low * n + high)[order]
+		first = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+		counts = np.diff(np.concatenate([first, [len(keys)]]))
+
+		edges = Edges()
+		edges.low = low[order[first]]
+		edges.high = high[order[first]]
+		edges.non_manifold = counts > 2
+		edges.seam = counts != 2
+
+		# Two faces: a seam if the winding, a wedge or the face key changes
+		two = np.flatnonzero(counts == 2)
+		h1 = order[first[two]]
+		h2 = order[first[two] + 1]
+		edges.seam[two] = (
+			(starts[h1] == starts[h2]) |
+			(wedge_starts[h1] != wedge_ends[h2]) |
+			(wedge_ends[h1] != wedge_starts[h2]) |
+			(self.face_keys[faces[h1]] != self.face_keys[faces[h2]])
+		)
+		# Face of the first half-edge, for the seam planes
+		edges.face = faces[order[first]]
+		return edges
+
+
+	def get_kinds(self, edges):
+		# 0 for vertices moving freely, 1 for vertices on a seam line and 2 for
+		# vertices where seams meet, end or turn non-manifold
+		n = len(self.positions)
+		seams = np.bincount(edges.low[edges.seam], minlength=n) + np.bincount(edges.high[edges.seam], minlength=n)
+		kinds = np.where(seams == 0, 0, np.where(seams == 2, 1, 2))
+		kinds[edges.low[edges.non_manifold]] = 2
+		kinds[edges.high[edges.non_manifold]] = 2
+
+		# Wedges without a seam between them, e.g. around a split fan
+		kinds[(kinds == 0) & (self.get_wedge_counts() > 1)] = 2
+		return kinds
+
+
+	def get_wedge_counts(self):
+		# Wedges still used of every vertex
+		used = np.zeros(len(self.wedge_values), dtype=bool)
+		used[self.wedges] = True
+		return np.bincount(self.wedge_vertices[used], minlength=len(self.positions))
+
+
+	def collapse(self, needed):
+		# One pass of collapses, returns whether any were applied
+		edges = self.get_edges()
+		kinds = self.get_kinds(edges)
+
+		# Both directions of every edge, a vertex on a seam only moves along it
+		sources = np.concatenate([edges.low, edges.high])
+		targets = np.concatenate([edges.high, edges.low])
+		seam = np.concatenate([edges.seam, edges.seam])
+		allowed = (kinds[sources] == 0) | ((kinds[sources] == 1) & seam & (kinds[targets] != 0))
+		sources, targets = sources[allowed], targets[allowed]
+		if len(sources) == 0:
+			return False
+
+		costs = np.empty(len(sources))
+		for start in range(0, len(sources), chunk_size):
+			part = slice(start, start + chunk_size)
+			points = self.positions[targets[part]]
+			costs[part] = evaluate(self.quadrics[sources[part]], points) + evaluate(self.quadrics[targets[part]], points)
+
+		# Cheapest valid collapse of every vertex, the next cheapest is tried
+		# for a few rounds when one flips triangles or loses a wedge
+		order = np.lexsort((costs, sources))
+		sources, targets, costs = sources[order], targets[order], costs[order]
+		firsts = np.flatnonzero(np.concatenate([[True], sources[1:] != sources[:-1]]))
+		lasts = np.concatenate([firsts[1:], [len(sources)]])
+		wedge_counts = self.get_wedge_counts()
+		best = []
+		pending = firsts
+		for _ in range(validate_rounds):
+			valid = self.is_valid(sources[pending], targets[pending], wedge_counts)
+			best.append(pending[valid])
+			pending = pending[~valid]
+			groups = np.searchsorted(firsts, pending, side='right') - 1
+			pending = pending[pending + 1 < lasts[groups]] + 1
+			if len(pending) == 0:
+				break
+		best = np.concatenate(best)
+		if len(best) == 0:
+			return False
+
+		# Of those the cheapest that could reach the target
+		best = best[np.argsort(costs[best], kind='stable')][:max(needed, 1)]
+		sources, targets = sources[best], targets[best]
+
+		keep = self.get_independent(sources, targets)
+		sources, targets = sources[keep], targets[keep]
+
+		# Stop at the target, collapses are in order of cost
+		removed, collapse_of_triangle = self.get_removed(sources, targets)
+		removals = np.bincount(collapse_of_triangle[removed], minlength=len(sources))
+		keep = np.cumsum(removals) - removals < needed
+		self.apply(sources[keep], targets[keep])
+		return True
+
+
+	def get_independent(self, sources, targets):
+		# Collapses whose triangles no other chosen collapse touches, so all
+		# of them can be applied at once. Ranks follow the cost order, every
+		# round takes the cheapest around and blocks their triangles.
+		n = len(self.positions)
+		count = len(sources)
+		ranks = np.arange(count)
+		keep = np.zeros(count, dtype=bool)
+		pending = np.ones(count, dtype=bool)
+
+		for _ in range(independent_rounds):
+			vertex_best = np.full(n, count)
+			np.minimum.at(vertex_best, sources[pending], ranks[pending])
+			np.minimum.at(vertex_best, targets[pending], ranks[pending])
+			triangle_best = vertex_best[self.triangles].min(axis=1)
+
+			ring_best = np.full(n, count)
+			np.minimum.at(ring_best, self.triangles.reshape(-1), np.repeat(triangle_best, 3))
+			chosen = pending & (ranks <= ring_best[sources]) & (ranks <= ring_best[targets])
+			keep |= chosen
+
+			# Vertices sharing a triangle with a chosen collapse
+			ends = np.zeros(n, dtype=bool)
+			ends[sources[keep]] = True
+			ends[targets[keep]] = True
+			blocked = np.zeros(n, dtype=bool)
+			blocked[self.triangles[np.any(ends[self.triangles], axis=1)]] = True
+			pending &= ~keep & ~blocked[sources] & ~blocked[targets]
+			if not np.any(pending):
+				break
+		return keep
+
+
+	def get_removed(self, sources, targets):
+		# Triangles with both ends of a collapse, and the collapse of each
+		# triangle around a source, -1 elsewhere
+		n = len(self.positions)
+		collapse_of_vertex = np.full(n, -1)
+		collapse_of_vertex[sources] = np.arange(len(sources))
+
+		collapses = collapse_of_vertex[self.triangles]
+		collapse_of_triangle = collapses.max(axis=1)
+		target_of_triangle = np.where(collapse_of_triangle >= 0, targets[np.maximum(collapse_of_triangle, 0)], -1)
+		removed = (collapse_of_triangle >= 0) & np.any(self.triangles == target_of_triangle[:, None], axis=1)
+		return removed, collapse_of_triangle
+
+
+	def is_valid(self, sources, targets, wedge_counts):
+		# Collapses that flip no triangle around the source and give each of
+		# its wedges a wedge of the target
+		valid = np.ones(len(sources), dtype=bool)
+		corners_flat = self.triangles.reshape(-1)
+		corner_order = np.argsort(corners_flat, kind='stable')
+		offsets = np.concatenate([[0], np.cumsum(np.bincount(corners_flat, minlength=len(self.positions)))])
+		degrees = offsets[sources + 1] - offsets[sources]
+
+		# Candidates in chunks of about chunk_size corners around their sources
+		ends = np.cumsum(degrees)
+		first = 0
+		while first < len(sources):
+			last = max(first + 1, np.searchsorted(ends, ends[first] - degrees[first] + chunk_size))
+			part = np.arange(first, last)
+			valid[part] = self.is_valid_part(part, sources, targets, degrees, offsets, corner_order, wedge_counts)
+			first = last
+		return valid
+
+
+	def is_valid_part(self, part, sources, targets, degrees, offsets, corner_order, wedge_counts):
+		# Every corner of the sources in 'part', with its candidate
+		counts = degrees[part]
+		candidates = np.repeat(part, counts)
+		within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+		corners = corner_order[offsets[sources[candidates]] + within]
+		triangles = corners // 3
+		vertices = self.triangles[triangles]
+		removed = np.any(vertices == targets[candidates][:, None], axis=1)
+		valid = np.ones(len(sources), dtype=bool)
+
+		# Triangles that move, with the source at the target's position
+		moved = ~removed
+		points = self.positions[vertices[moved]]
+		before = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+		points[np.arange(len(points)), corners[moved] % 3] = self.positions[targets[candidates[moved]]]
+		after = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+		# Flipped, turned too far or collapsed to a sliver
+		lengths = np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1)
+		flipped = np.sum(before * after, axis=1) <= turn_limit * lengths
+		flipped |= np.sum(after * after, axis=1) <= sliver_limit * np.sum(before * before, axis=1)
+		reference = self.reference[triangles[moved]]
+		flipped |= (np.sum(after * reference, axis=1) <= turn_limit * np.linalg.norm(after, axis=1)) & np.any(reference != 0, axis=1)
+		valid[candidates[moved][flipped]] = False
+
+		# Wedges of the source in moving triangles need one in a removed
+		# triangle, only sources on seams have several
+		split = wedge_counts[sources[candidates]] > 1
+		if np.any(split):
+			keys = candidates[split] * len(self.wedge_values) + self.wedges.reshape(-1)[corners[split]]
+			unmapped = ~np.isin(keys[moved[split]], keys[removed[split]])
+			valid[candidates[split][moved[split]][unmapped]] = False
+		return valid[part]
+
+
+	def get_wedge_map(self, sources, targets, removed, collapse_of_triangle):
+		# Wedge of the source to the wedge of the target in the same removed
+		# triangle, the attributes on that side of the edge
+		wedge_map = np.full(len(self.wedge_values), -1)
+		triangles = np.flatnonzero(removed)
+		if len(triangles) == 0:
+			return wedge_map
+
+		collapse = collapse_of_triangle[triangles]
+		vertices = self.triangles[triangles]
+		wedges = self.wedges[triangles]
+		source_wedges = wedges[vertices == sources[collapse][:, None]]
+		target_wedges = wedges[vertices == targets[collapse][:, None]]
+		wedge_map[source_wedges] = target_wedges
+		return wedge_map
+
+
+	def apply(self, sources, targets):
+		if len(sources) == 0:
+			return
+
+		removed, collapse_of_triangle = self.get_removed(sources, targets)
+		wedge_map = self.get_wedge_map(sources, targets, removed, collapse_of_triangle)
+
+		remap = np.arange(len(self.positions))
+		remap[sources] = targets
+		np.add.at(self.quadrics, targets, self.quadrics[sources])
+
+		is_source = np.isin(self.triangles, sources)
+		self.wedges = np.where(is_source, wedge_map[self.wedges], self.wedges)[~removed]
+		self.triangles = remap[self.triangles][~removed]
+		self.face_keys = self.face_keys[~removed]
+		self.reference = self.reference[~removed]
+
+
+	def get_arrays(self):
+		# Compact arrays in the layout of mesh_merge
+		used, corners = np.unique(self.triangles.reshape(-1), return_inverse=True)
+		values = self.wedge_values[self.wedges.reshape(-1)]
+
+		arrays = {
+			'positions'	: self.positions[used],
+			'corners'	: corners.reshape(-1).astype(np.int32),
+			'sizes'		: np.full(len(self.triangles), 3, dtype=np.int32),
+			'materials'	: (self.face_keys // 2).astype(np.int32),
+			'smooth'	: (self.face_keys % 2).astype(bool),
+			'uvs'		: {},
+			'colors'	: {},
+			'normals'	: None,
+		}
+
+		column = 0
+		for kind, name, data_type, width in self.layout:
+			block = values[:, column:column+width].astype(np.float32)
+			column += width
+			if kind == 'uvs':
+				arrays['uvs'][name] = block
+			elif kind == 'colors':
+				arrays['colors'][name] = (data_type, block)
+			else:
+				arrays['normals'] = block
+		return arrays
+
+
+
+class Edges:
+	pass
+
+
+
+def get_quadrics(positions, triangles, edges):
+	# Area weighted planes of the faces around every vertex, plus planes
+	# through seam and border edges at right angles to their face
+	corners = positions[triangles]
+	normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	lengths = np.linalg.norm(normals, axis=1)
+	areas = lengths / 2
+	normals = normals / np.maximum(lengths, 1e-30)[:, None]
+	planes = get_plane_quadrics(normals, -np.sum(normals * corners[:, 0], axis=1), areas)
+
+	quadrics = np.zeros((len(positions), 10))
+	for component in range(10):
+		values = np.repeat(planes[:, component], 3)
+		quadrics[:, component] = np.bincount(triangles.reshape(-1), values, minlength=len(positions))
+
+	seams = np.flatnonzero(edges.seam)
+	if len(seams) > 0:
+		low = positions[edges.low[seams]]
+		direction = positions[edges.high[seams]] - low
+		length = np.linalg.norm(direction, axis=1)
+		normals = np.cross(direction, normals[edges.face[seams]])
+		normals = normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+		planes = get_plane_quadrics(normals, -np.sum(normals * low, axis=1), length * length * seam_weight)
+		for component in range(10):
+			quadrics[:, component] += np.bincount(edges.low[seams], planes[:, component], minlength=len(positions))
+			quadrics[:, component] += np.bincount(edges.high[seams], planes[:, component], minlength=len(positions))
+
+	return quadrics
+
+
+
+def get_plane_quadrics(normals, distances, weights):
+	# Upper triangle of the weighted outer product of every plane (a, b, c, d)
+	a, b, c = normals[:, 0], normals[:, 1], normals[:, 2]
+	d = distances
+	return np.stack([a*a, a*b, a*c, a*d, b*b, b*c, b*d, c*c, c*d, d*d], axis=1) * weights[:, None]
+
+
+
+def evaluate(quadrics, points):
+	# Squared distance sum of every quadric at its point
+	x, y, z = points[:, 0], points[:, 1], points[:, 2]
+	q = quadrics
+	return (q[:, 0]*x*x + 2*q[:, 1]*x*y + 2*q[:, 2]*x*z + 2*q[:, 3]*x +
+		q[:, 4]*y*y + 2*q[:, 5]*y*z + 2*q[:, 6]*y +
+		q[:, 7]*z*z + 2*q[:, 8]*z + q[:, 9])
+
+
+
+def get_worker_module():
+	# This file as a top-level module, so functions pickled from it are found
+	# by workers that only have its folder on their path
+	import importlib.util
+	module = sys.modules.get(worker_module)
+	if module is None or getattr(module, '__file__', None) != __file__:
+		spec = importlib.util.spec_from_file_location(worker_module, __file__)
+		module = importlib.util.module_from_spec(spec)
+		sys.modules[worker_module] = module
+		spec.loader.exec_module(module)
+	return module
+
+
+
+def get_pool():
+	# Kept between exports, workers take a moment to start
+	global pool
+	if pool is None:
+		import multiprocessing
+		import concurrent.futures
+		context = multiprocessing.get_context('spawn')
+		context.set_executable(get_python())
+		pool = concurrent.futures.ProcessPoolExecutor(
+			max_workers=max(1, (os.cpu_count() or 2) - 1),
+			mp_context=context,
+			# A function the workers can unpickle before this folder is on
+			# their path, sys.path.append would append to a pickled copy
+			initializer=site.addsitedir,
+			initargs=(os.path.dirname(os.path.abspath(__file__)),)
+		)
+	return pool
+
+
+
+def get_python():
+	# sys.executable is Blender itself before Blender 2.91
+	try:
+		import bpy
+		return getattr(bpy.app, "binary_path_python", None) or sys.executable
+	except ImportError:
+		return sys.executable
+
+
+
+def shutdown():
+	global pool
+	if pool is not None:
+		pool.shutdown(wait=False)
+		pool = None
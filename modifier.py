@@ -88,3 +88,8 @@ class Modifier:
 
 	def process_path(self, name, path):
 		return path
+
+
+	def write_sidecars(self, path, objects):
+		# Extra files next to the exported file at 'path', returns their paths
+		return []
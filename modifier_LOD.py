@@ -1,10 +1,31 @@
 import bpy, bmesh
+import os
 import math
+import json
+import hashlib
 import imp
 
+from . import objects_organise
+from . import mesh_arrays
+from . import mesh_merge
+from . import export_cache
+from . import export_manifest
+from . import mesh_simplify
+
 from . import modifier
 imp.reload(modifier) 
+imp.reload(export_cache)
+imp.reload(mesh_simplify)
+
 
+# A level starts at the screen size where the edges of its triangles,
+# estimated from the bounds surface and triangle count, are this many pixels
+# long on a screen this high
+screen_pixels = 2.0
+screen_height = 1080
+
+# Screen sizes of every level, written next to the exported file
+sidecar_extension = ".lods.json"
 
 
 
@@ -26,6 +47,14 @@ class Settings(modifier.Settings):
 		description="Maximum quality ratio.",
 		subtype='FACTOR'
 	)
+	method: bpy.props.EnumProperty (
+		items=[
+			('DECIMATE', "Decimate", "Blender's Decimate modifier"),
+			('QEM', "Quadric", "Built-in quadric simplifier keeping UV, normal and material seams, meets the triangle counts exactly and simplifies several meshes in parallel")
+		],
+		default='DECIMATE',
+		description="How levels of static meshes are simplified"
+	)
 
 
 def get_quality(index, count, max_quality):
@@ -47,6 +76,7 @@ class Modifier(modifier.Modifier):
 			row = layout.row(align=True)
 			row.prop( eval("bpy.context.scene."+self.settings_path()) , "levels", text="Steps", icon='AUTOMERGE_ON')
 			row.prop( eval("bpy.context.scene."+self.settings_path()) , "quality", text="Quality", icon='AUTOMERGE_ON')
+			layout.prop( eval("bpy.context.scene."+self.settings_path()) , "method", text="Method")
 
 			col = layout.column(align=True)
 			for i in range(0, self.get("levels")):
@@ -68,6 +98,16 @@ class Modifier(modifier.Modifier):
 		# UNREAL 	https://docs.unrealengine.com/en-us/Engine/Content/Types/StaticMeshes/HowTo/LODs
 		# 			https://answers.unrealengine.com/questions/416995/how-to-import-lods-as-one-fbx-blender.html
 
+		levels = self.get("levels")
+		quality = self.get("quality")
+
+		# Static meshes get baked levels, each simplified from the one before
+		static = [obj for obj in objects if obj.type == 'MESH' and len(obj.modifiers) == 0 and not obj.data.shape_keys]
+		if self.get("method") == 'QEM':
+			chains = get_chains_simplified(static, levels, quality)
+		else:
+			chains = {obj: get_chain(obj, levels, quality) for obj in static}
+
 		new_objects = []
 		for obj in objects:
 			prefix = obj.name
@@ -75,19 +115,156 @@ class Modifier(modifier.Modifier):
 			obj.name = "{}_LOD{}".format(prefix, 0)
 			new_objects.append(obj)
 
-			for i in range(1, self.get("levels")):
+			meshes = chains.get(obj)
+
+			chain = [obj]
+			for i in range(1, levels):
+				if meshes:
+					copy = obj.copy()
+					copy.data = meshes[i-1]
+					for collection in obj.users_collection:
+						collection.objects.link(copy)
+				else:
+					# Copy & Decimate modifier
+					copy = objects_organise.duplicate_object(obj)
+					mod = copy.modifiers.new("Decimate", type='DECIMATE')
+					mod.ratio = get_quality(i, levels, quality)
+				copy.name = "{}_LOD{}".format(prefix, i)
+
+				new_objects.append(copy)
+				chain.append(copy)
+
+			if obj.type == 'MESH':
+				for i, (level, screen_size) in enumerate(zip(chain, get_screen_sizes(chain))):
+					level["fbxbundle_lod_group"] = prefix
+					level["fbxbundle_lod_level"] = i
+					level["fbxbundle_lod_screen_size"] = screen_size
+
+		return new_objects
+
+
+	def write_sidecars(self, path, objects):
+		# Screen size at which every level starts, for Unity's LODGroup and
+		# Unreal's LOD screen sizes
+		groups = {}
+		for obj in objects:
+			if "fbxbundle_lod_group" in obj:
+				groups.setdefault(obj["fbxbundle_lod_group"], []).append(obj)
+		if len(groups) == 0:
+			return []
+
+		data = {'version': 1, 'groups': []}
+		for group, levels in sorted(groups.items()):
+			levels.sort(key=lambda obj: obj["fbxbundle_lod_level"])
+			data['groups'].append({
+				'name': group,
+				'levels': [{'name': obj.name, 'level': obj["fbxbundle_lod_level"], 'screen_size': obj["fbxbundle_lod_screen_size"]} for obj in levels]
+			})
+
+		path_sidecar = os.path.splitext(path)[0] + sidecar_extension
+		with open(path_sidecar, 'w') as file:
+			json.dump(data, file, indent=1, sort_keys=True)
+		return [path_sidecar]
+
+
+
+def get_chain(obj, levels, quality):
+	# Meshes of LOD1 and up, each decimated from the level before instead of
+	# the full mesh. Cached on disk by source mesh and settings, unchanged
+	# meshes skip decimation.
+	source = get_mesh_key(obj.data)
+	materials = list(obj.data.materials)
+	uv_active = obj.data.uv_layers.active.name if obj.data.uv_layers.active else None
+
+	meshes = []
+	previous, previous_ratio = obj.data, 1.0
+	for level in range(1, levels):
+		ratio = get_quality(level, levels, quality)
+		key = export_cache.get_key('lod', source, levels, quality, level)
+		arrays = export_cache.load_mesh('lod', key)
+		if arrays is None:
+			mesh = decimate(previous, ratio / previous_ratio, obj.users_collection)
+			export_cache.save_mesh('lod', key, mesh_merge.get_arrays(mesh, normals=mesh_merge.has_split_normals(mesh)))
+		else:
+			mesh = mesh_merge.create_mesh(obj.data.name, arrays, materials, uv_active, compact=False)
+
+		meshes.append(mesh)
+		previous, previous_ratio = mesh, ratio
+
+	return meshes
+
+
+
+def get_chains_simplified(objects, levels, quality):
+	# Meshes of LOD1 and up of every object, by the quadric simplifier. The
+	# chains missing from the cache are simplified together in worker
+	# processes, each level from the one before.
+	chains = {}
+	tasks = {}
+	for obj in objects:
+		source = get_mesh_key(obj.data)
+		keys = [export_cache.get_key('lod', source, 'QEM', levels, quality, level) for level in range(1, levels)]
+		cached = [export_cache.load_mesh('lod', key) for key in keys]
+		if all(arrays is not None for arrays in cached):
+			chains[obj] = cached
+		else:
+			arrays = mesh_merge.get_arrays(obj.data, triangulate=True, normals=mesh_merge.has_split_normals(obj.data))
+			triangles = len(arrays['sizes'])
+			targets = [max(1, round(triangles * get_quality(level, levels, quality))) for level in range(1, levels)]
+			tasks[obj] = (keys, arrays, targets)
+
+	results = mesh_simplify.simplify_chains([(arrays, targets) for keys, arrays, targets in tasks.values()])
+	for (obj, (keys, _, _)), chain in zip(tasks.items(), results):
+		for key, arrays in zip(keys, chain):
+			export_cache.save_mesh('lod', key, arrays)
+		chains[obj] = chain
+
+	meshes = {}
+	for obj, chain in chains.items():
+		materials = list(obj.data.materials)
+		uv_active = obj.data.uv_layers.active.name if obj.data.uv_layers.active else None
+		meshes[obj] = [mesh_merge.create_mesh(obj.data.name, arrays, materials, uv_active, compact=False) for arrays in chain]
+	return meshes
+
+
+
+def get_mesh_key(mesh):
+	hash = hashlib.sha1()
+	export_manifest.update_mesh(hash, mesh)
+	return hash.hexdigest()
+
+
+
+def decimate(mesh, ratio, collections):
+	# Collapse decimation of 'mesh' baked into a new mesh, through a temporary
+	# object the depsgraph evaluates
+	temp = bpy.data.objects.new(mesh.name + "_decimate", mesh)
+	for collection in collections:
+		collection.objects.link(temp)
+	try:
+		mod = temp.modifiers.new("Decimate", type='DECIMATE')
+		mod.ratio = ratio
+		depsgraph = bpy.context.evaluated_depsgraph_get()
+		return bpy.data.meshes.new_from_object(temp.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+	finally:
+		bpy.data.objects.remove(temp)
 
-				# Select
-				bpy.ops.object.select_all(action="DESELECT")
-				obj.select_set(state = True)
-				bpy.context.view_layer.objects.active = obj
 
-				# Copy & Decimate modifier
-				bpy.ops.object.duplicate()
-				bpy.context.object.name = "{}_LOD{}".format(prefix, i)
-				bpy.ops.object.modifier_add(type='DECIMATE')
-				bpy.context.object.modifiers["Decimate"].ratio = get_quality(i, self.get("levels"), self.get("quality"))
 
-				new_objects.append(bpy.context.object)
+def get_screen_sizes(chain):
+	# Screen height of the bounds, as a fraction, at which each level starts.
+	# LOD0 starts at 1, the others where their edges get small enough.
+	bounds = objects_organise.ObjectBounds(chain[0])
+	x, y, z = bounds.size
+	area = 2 * (x*y + y*z + z*x)
+	size = max(bounds.size)
 
-		return new_objects
\ No newline at end of file
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	sizes = [1.0]
+	for obj in chain[1:]:
+		triangles = max(1, mesh_arrays.get_triangle_count(obj.evaluated_get(depsgraph).data))
+		edge = math.sqrt(area / triangles)
+		screen_size = screen_pixels * size / (edge * screen_height) if edge > 0 else 0
+		# Strictly decreasing, as Unity requires
+		sizes.append(round(max(min(screen_size, sizes[-1] * 0.9), 0.001), 4))
+	return sizes
\ No newline at end of file
@@ -1,9 +1,26 @@
 import bpy, bmesh
 import math
 import imp
+import mathutils
+import numpy as np
+
+from . import objects_organise
+from . import mesh_arrays
+from . import mesh_merge
+from . import mesh_simplify
+from . import mesh_hull
 
 from . import modifier
 imp.reload(modifier) 
+imp.reload(mesh_simplify)
+imp.reload(mesh_hull)
+
+
+# Prefixes Unreal's FBX import turns into simple collision of the mesh named after them
+unreal_prefixes = {'BOX': "UBX", 'SPHERE': "USP", 'CAPSULE': "UCP", 'HULL': "UCX", 'HULLS': "UCX"}
+
+# Suffixes after _COLLIDER the Unity Editor script turns into colliders
+unity_suffixes = {'BOX': "BOX", 'SPHERE': "SPHERE", 'CAPSULE': "CAPSULE", 'HULL': "CONVEX", 'HULLS': "CONVEX"}
 
 
 
@@ -13,6 +30,30 @@ class Settings(modifier.Settings):
 		name="Active",
 		default=False
 	)
+	shape: bpy.props.EnumProperty (
+		items=[
+			('MESH', "Mesh", "Reduced copy of the mesh, a concave mesh collider"),
+			('BOX', "Box", "Smallest box along the principal axes of the mesh"),
+			('SPHERE', "Sphere", "Sphere around the mesh"),
+			('CAPSULE', "Capsule", "Capsule along the longest axis of the mesh"),
+			('HULL', "Convex Hull", "Single convex hull of the mesh"),
+			('HULLS', "Convex Parts", "Mesh cut into several convex hulls where it is concave")
+		],
+		default='MESH',
+		description="Shape of the collider"
+	)
+	hulls: bpy.props.IntProperty (
+		default=4,
+		min=2,
+		max=32,
+		description="Maximum number of convex parts"
+	)
+	hull_vertices: bpy.props.IntProperty (
+		default=32,
+		min=8,
+		max=255,
+		description="Maximum number of vertices of each convex hull"
+	)
 	ratio: bpy.props.FloatProperty (
 		default=0.35,
 		min = 0.01,
@@ -29,6 +70,15 @@ class Settings(modifier.Settings):
 		subtype='FACTOR'
 	)
 
+	method: bpy.props.EnumProperty (
+		items=[
+			('DECIMATE', "Decimate", "Blender's Decimate modifier"),
+			('QEM', "Quadric", "Built-in quadric simplifier, meets the ratio exactly and simplifies several meshes in parallel")
+		],
+		default='DECIMATE',
+		description="How static meshes are reduced to the ratio"
+	)
+
 
 class Modifier(modifier.Modifier):
 	label = "Collider Mesh"
@@ -42,9 +92,17 @@ class Modifier(modifier.Modifier):
 	def draw(self, layout):
 		super().draw(layout)
 		if(self.get("active")):
-			row = layout.row(align=True)
-			row.prop( eval("bpy.context.scene."+self.settings_path()) , "ratio", text="Ratio", icon='AUTOMERGE_ON')
-			row.prop( eval("bpy.context.scene."+self.settings_path()) , "angle", text="Angle", icon='AUTOMERGE_ON')
+			layout.prop( eval("bpy.context.scene."+self.settings_path()) , "shape", text="Shape")
+			if self.get("shape") == 'MESH':
+				row = layout.row(align=True)
+				row.prop( eval("bpy.context.scene."+self.settings_path()) , "ratio", text="Ratio", icon='AUTOMERGE_ON')
+				row.prop( eval("bpy.context.scene."+self.settings_path()) , "angle", text="Angle", icon='AUTOMERGE_ON')
+				layout.prop( eval("bpy.context.scene."+self.settings_path()) , "method", text="Method")
+			elif self.get("shape") in ('HULL', 'HULLS'):
+				row = layout.row(align=True)
+				if self.get("shape") == 'HULLS':
+					row.prop( eval("bpy.context.scene."+self.settings_path()) , "hulls", text="Parts")
+				row.prop( eval("bpy.context.scene."+self.settings_path()) , "hull_vertices", text="Vertices")
 
 			
 	def process_objects(self, name, objects):
@@ -52,21 +110,33 @@ class Modifier(modifier.Modifier):
 		# UNREAL 	https://docs.unrealengine.com/en-us/Engine/Content/Types/StaticMeshes/HowTo/LODs
 		# 			https://answers.unrealengine.com/questions/416995/how-to-import-lods-as-one-fbx-blender.html
 
+		if self.get("shape") != 'MESH':
+			new_objects = []
+			for obj in objects:
+				new_objects.append(obj)
+				new_objects.extend(self.create_shapes(obj))
+			return new_objects
+
+		# Static meshes reduced up front, together in worker processes
+		simplified = {}
+		if self.get("method") == 'QEM':
+			static = [obj for obj in objects if obj.type == 'MESH' and mesh_merge.is_supported([obj])]
+			tasks = []
+			for obj in static:
+				arrays = mesh_merge.get_arrays(obj.data, triangulate=True)
+				tasks.append((arrays, [max(1, round(len(arrays['sizes']) * self.get("ratio")))]))
+			results = mesh_simplify.simplify_chains(tasks, preserve=False)
+			simplified = {obj: chain[0] for obj, chain in zip(static, results)}
+
 		new_objects = []
 		for obj in objects:
 
 			new_objects.append(obj)
 
 	
-			# Select
-			bpy.ops.object.select_all(action="DESELECT")
-			obj.select_set(state = True)
-			bpy.context.view_layer.objects.active = obj
-
 			# Copy & Decimate modifier
-			bpy.ops.object.duplicate()
-			bpy.context.object.name = "{}_COLLIDER".format(obj.name)
-			copy = bpy.context.object
+			copy = objects_organise.duplicate_object(obj)
+			copy.name = "{}_COLLIDER".format(obj.name)
 
 			# Display as wire
 			copy.display_type = 'WIRE'
@@ -74,8 +144,13 @@ class Modifier(modifier.Modifier):
 			
 
 			# Decimate A
-			mod = copy.modifiers.new("RATIO", type='DECIMATE')
-			mod.ratio = self.get("ratio")
+			if obj in simplified:
+				duplicate = copy.data
+				copy.data = mesh_merge.create_mesh(obj.data.name, simplified[obj], list(obj.data.materials), None, compact=False)
+				bpy.data.meshes.remove(duplicate)
+			else:
+				mod = copy.modifiers.new("RATIO", type='DECIMATE')
+				mod.ratio = self.get("ratio")
 
 			# Displace
 			mod = copy.modifiers.new("__displace", type='DISPLACE')
@@ -107,6 +182,107 @@ class Modifier(modifier.Modifier):
 			# bpy.ops.object.modifier_add(type='DECIMATE')
 			# bpy.context.object.modifiers["Decimate"].ratio = get_quality(i, self.get("levels"), self.get("quality"))
 
-			new_objects.append(bpy.context.object)
-
-		return new_objects
\ No newline at end of file
+			new_objects.append(copy)
+
+		return new_objects
+
+
+	def create_shapes(self, obj):
+		# Fitted colliders of an object, named for the target platform
+		shape = self.get("shape")
+		corners = get_corners(obj)
+		if corners is None or len(corners) == 0:
+			return []
+		points = corners.reshape(-1, 3)
+		axes = [np.array(obj.matrix_world)[:3, :3]]
+
+		if shape == 'BOX':
+			matrix, half_sizes = mesh_hull.fit_box(points, axes)
+			shapes = [(matrix, mesh_hull.get_box(np.maximum(half_sizes, 1e-4)))]
+		elif shape == 'SPHERE':
+			matrix, radius = mesh_hull.fit_sphere(points)
+			shapes = [(matrix, mesh_hull.get_sphere(radius))]
+		elif shape == 'CAPSULE':
+			matrix, radius, half_length = mesh_hull.fit_capsule(points, axes)
+			shapes = [(matrix, mesh_hull.get_capsule(radius, half_length))]
+		else:
+			# Hulls in the object's space, Unity assigns them to its mesh collider
+			matrix = np.array(obj.matrix_world)
+			if abs(np.linalg.det(matrix[:3, :3])) < 1e-12:
+				return []
+			inverse = np.linalg.inv(matrix)
+			if shape == 'HULL':
+				parts = [points]
+			else:
+				parts = mesh_hull.convex_decomposition(corners, self.get("hulls"), self.get("hull_vertices"))
+			shapes = []
+			for part in parts:
+				positions, triangles = mesh_hull.get_hull_mesh(part, self.get("hull_vertices"))
+				shapes.append((matrix, (positions @ inverse[:3, :3].T + inverse[:3, 3], triangles)))
+
+		colliders = []
+		for index, (matrix, (positions, faces)) in enumerate(shapes):
+			name = get_name(obj.name, shape, index)
+			collider = create_collider(obj, name, positions, faces, matrix)
+			colliders.append(collider)
+		return colliders
+
+
+
+def get_name(name, shape, index):
+	if bpy.context.scene.FBXBundleSettings.target_platform == 'UNREAL':
+		return "{}_{}_{:02d}".format(unreal_prefixes[shape], name, index)
+	if shape == 'HULLS':
+		return "{}_COLLIDER_{}_{:02d}".format(name, unity_suffixes[shape], index)
+	return "{}_COLLIDER_{}".format(name, unity_suffixes[shape])
+
+
+
+def get_corners(obj):
+	# World space corner positions of the evaluated triangles of an object,
+	# None for objects without geometry
+	if obj.type not in ('MESH', 'CURVE', 'SURFACE', 'FONT', 'META'):
+		return None
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	evaluated = obj.evaluated_get(depsgraph)
+	mesh = evaluated.to_mesh()
+	if mesh is None:
+		return None
+	try:
+		positions = mesh_arrays.get_positions(mesh).astype(np.float64)
+		loops, _ = mesh_arrays.get_triangles(mesh)
+		triangles = mesh_arrays.get_corner_verts(mesh)[loops]
+	finally:
+		evaluated.to_mesh_clear()
+
+	matrix = np.array(obj.matrix_world)
+	positions = positions @ matrix[:3, :3].T + matrix[:3, 3]
+	return positions[triangles]
+
+
+
+def create_collider(obj, name, positions, faces, matrix):
+	# Object next to 'obj' with a mesh of 'faces', its positions relative to
+	# 'matrix' in world space
+	sizes = np.array([len(face) for face in faces], dtype=np.int32)
+	arrays = {
+		'positions'	: positions,
+		'corners'	: np.concatenate([np.asarray(face) for face in faces]).astype(np.int32),
+		'sizes'		: sizes,
+		'materials'	: np.zeros(len(sizes), dtype=np.int32),
+		'smooth'	: np.zeros(len(sizes), dtype=bool),
+		'uvs'		: {},
+		'colors'	: {},
+		'normals'	: None,
+	}
+	mesh = mesh_merge.create_mesh(name, arrays, [], None, compact=False)
+	collider = bpy.data.objects.new(name, mesh)
+	for collection in obj.users_collection:
+		collection.objects.link(collider)
+	collider.parent = obj.parent
+	collider.matrix_world = mathutils.Matrix(matrix.tolist())
+
+	# Display as wire
+	collider.display_type = 'WIRE'
+	collider.show_all_edges = True
+	return collider
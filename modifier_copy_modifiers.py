@@ -1,6 +1,8 @@
 import bpy, bmesh
 import imp
 
+from . import objects_organise
+
 from . import modifier
 imp.reload(modifier) 
 
@@ -53,13 +55,9 @@ class Modifier(modifier.Modifier):
 	def process_objects(self, name, objects):
 		if self.get('source') in bpy.data.objects:
 			source = bpy.data.objects[ self.get('source') ]
-			source.select_set(state = True)
-			old = bpy.context.view_layer.objects.active
-			bpy.context.view_layer.objects.active = source
 
-			bpy.ops.object.make_links_data(type='MODIFIERS')
-			source.select_set(state = False)
-			bpy.context.view_layer.objects.active = old
+			with objects_organise.context_override(objects + [source], source):
+				bpy.ops.object.make_links_data(type='MODIFIERS')
 		return objects
 
 		
\ No newline at end of file
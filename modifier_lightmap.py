@@ -44,44 +44,34 @@ class Modifier(modifier.Modifier):
     		
 			
 	def process_objects(self, name, objects):
-		# Catch any collection instances and convert them to real objects
-		for obj in objects:
-			if obj.type == 'EMPTY' and obj.instance_collection:
-				bpy.ops.object.duplicates_make_real()
-				# Append newly converted objects
-				objects.extend(bpy.context.selected_objects)
-
-		# Find a mesh object so we can run convert operator
-		for obj in objects:
-			if obj.type == 'MESH':
-				bpy.context.view_layer.objects.active = obj
-				break
-			continue
-
-		bpy.ops.object.make_single_user(type='SELECTED_OBJECTS', object=True, obdata=True)
-
+		# Real objects with single user data, modifiers and transforms applied
 		# TODO Fix scenario where there's already a lightmap or another UV set
-		
-		bpy.ops.object.convert(target='MESH', keep_original=False)
-		bpy.ops.object.transform_apply(location=False, rotation=True, scale=True)
+		objects = objects_organise.consolidate_objects(objects, apply_normals=False, merge_uvs=False, apply_scale=True)
 
 		uv_name = "Light Map"
-		for obj in objects:
-			if obj.type == 'MESH':                
-				bpy.context.view_layer.objects.active = obj
-				obj.data.uv_layers.new(name=uv_name)
-				obj.data.uv_layers.active = obj.data.uv_layers[uv_name]
-				obj.data.uv_layers[uv_name].active_render = True
-
-		# Enter edit mode and pack UVs
-		bpy.ops.object.mode_set(mode='EDIT')
-		bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='FACE')
-		bpy.ops.mesh.select_all(action='SELECT')
-		if self.get('lightmap_pack_type') == 'lightmap_pack':
-			bpy.ops.uv.lightmap_pack()
-		if self.get('lightmap_pack_type') == 'layout_pack':
-			bpy.ops.uv.average_islands_scale()
-			bpy.ops.uv.pack_islands()
+		meshes = [obj for obj in objects if obj.type == 'MESH']
+		for obj in meshes:
+			layer = obj.data.uv_layers.new(name=uv_name)
+			obj.data.uv_layers.active = layer
+			layer.active_render = True
+
+			# Pack all faces
+			obj.data.vertices.foreach_set('select', [True] * len(obj.data.vertices))
+			obj.data.edges.foreach_set('select', [True] * len(obj.data.edges))
+			obj.data.polygons.foreach_set('select', [True] * len(obj.data.polygons))
+
+		if len(meshes) == 0:
+			return objects
+
+		# Enter edit mode of all meshes at once and pack UVs
+		bpy.context.tool_settings.mesh_select_mode = (False, False, True)
+		with objects_organise.context_override(meshes):
+			bpy.ops.object.mode_set(mode='EDIT')
+			if self.get('lightmap_pack_type') == 'lightmap_pack':
+				bpy.ops.uv.lightmap_pack()
+			if self.get('lightmap_pack_type') == 'layout_pack':
+				bpy.ops.uv.average_islands_scale()
+				bpy.ops.uv.pack_islands()
 			bpy.ops.object.mode_set(mode='OBJECT')
 		return objects
 
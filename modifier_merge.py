@@ -1,11 +1,14 @@
 import bpy, bmesh
 import imp
-import string
-import random
-from mathutils import Vector
+import numpy as np
+from mathutils import Matrix
 
 
 from . import objects_organise
+from . import mesh_arrays
+from . import export_memory
+from . import mesh_merge
+from . import modifier_rename
 
 from . import modifier
 imp.reload(modifier) 
@@ -33,6 +36,30 @@ class Settings(modifier.Settings):
 		description="Minimum distance of verts to merge. Set to 0 to disable.",
 		subtype='DISTANCE'
 	)
+	merge_chunks: bpy.props.EnumProperty(
+		name="Chunks",
+		items=[
+			('NONE', "No Chunks", "One mesh, or one per material"),
+			('GRID', "Grid", "Split into cubic cells of the bundle bounds, for culling in the engine"),
+			('VERTICES', "Vertex Count", "Split into compact clusters of at most the vertex count")
+		],
+		description="Split merged meshes into chunks with their own bounds, each under 65535 vertices",
+		default='NONE'
+	)
+	chunk_cells: bpy.props.IntProperty(
+		name="Cells",
+		default=4,
+		min=1,
+		max=256,
+		description="Grid cells along the longest side of the bundle bounds"
+	)
+	chunk_vertices: bpy.props.IntProperty(
+		name="Verts",
+		default=65535,
+		min=256,
+		max=65535,
+		description="Maximum vertices per chunk"
+	)
 	# consistent_normals = bpy.props.BoolProperty (
 	# 	name="Make consistent Normals",
 	# 	default=True
@@ -67,6 +94,15 @@ class Modifier(modifier.Modifier):
 			row.separator()
 			row.prop( eval("bpy.context.scene."+self.settings_path()) , "merge_by_material", text="Split by Material")
 
+			row = col.row(align=True)
+			row.separator()
+			row.separator()
+			row.prop( eval("bpy.context.scene."+self.settings_path()) , "merge_chunks", text="")
+			if self.get("merge_chunks") == 'GRID':
+				row.prop( eval("bpy.context.scene."+self.settings_path()) , "chunk_cells")
+			elif self.get("merge_chunks") == 'VERTICES':
+				row.prop( eval("bpy.context.scene."+self.settings_path()) , "chunk_vertices")
+
 
 			
 			
@@ -74,34 +110,43 @@ class Modifier(modifier.Modifier):
 
 	def process_objects(self, name, objects):
 		
-		bpy.ops.object.join()
+		# Join into the mesh object, no data API equivalent
+		merged = objects_organise.get_mesh_type(objects)
+		if not merged or merged.type != 'MESH':
+			return objects
+
+		# Static meshes are merged, welded and split as arrays
+		if mesh_merge.is_supported(objects):
+			distance = self.get("merge_distance") if self.get("merge_verts") else 0
+			grid, max_vertices, format_name = self.get_chunking(name, objects)
+			return mesh_merge.merge(name, objects, distance, self.get("merge_by_material"), grid, max_vertices, format_name)
+
+		if export_memory.is_active():
+			join_batched(objects, merged)
+		else:
+			with objects_organise.context_override(objects, merged):
+				bpy.ops.object.join()
 	
-		bpy.context.object.name = name #assign bundle name
-		bpy.context.scene.cursor.location = Vector((0,0,0)) 
-		bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-		bpy.ops.object.material_slot_remove_unused()
+		merged.name = name #assign bundle name
 
-		# Convert to mesh
-		#bpy.ops.object.convert(target='MESH')
+		# Origin at the world center with rotation and scale applied
+		children = {child: child.matrix_world.copy() for child in merged.children}
+		merged.data.transform(merged.matrix_world)
+		merged.matrix_world = Matrix()
+		for child, matrix in children.items():
+			child.matrix_world = matrix
 
-		# Apply rotation
-		bpy.ops.object.transform_apply(location=False, rotation=True, scale=True)
-		
+		remove_unused_materials(merged.data)
 
 		# Merge Vertices?
 
 		if self.get("merge_verts") and self.get("merge_distance") > 0:
-
-			bpy.ops.object.mode_set(mode='EDIT')
-			bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='VERT')
-			bpy.ops.mesh.select_all(action='SELECT')
-
-			bpy.ops.mesh.remove_doubles(threshold = self.get("merge_distance"))
-
-			bpy.ops.mesh.quads_convert_to_tris()
-
-			bpy.ops.mesh.select_all(action='DESELECT')
-			bpy.ops.object.mode_set(mode='OBJECT')
+			bm = bmesh.new()
+			bm.from_mesh(merged.data)
+			bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=self.get("merge_distance"))
+			bmesh.ops.triangulate(bm, faces=bm.faces)
+			bm.to_mesh(merged.data)
+			bm.free()
 		
 		# TODO figure out how to preserve normals
 		# if self.get("consistent_normals") :
@@ -116,82 +161,126 @@ class Modifier(modifier.Modifier):
 
 
 		if self.get("merge_by_material") :
-			# TODO: Split faces by materials
-
-			bpy.ops.object.mode_set(mode='EDIT')
-			bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='FACE')
-			
-			# Rename with unique ID
-			prefix = "{}_{}".format( name, id_generator() )
-			
-			
-
-			mats = {}
-			for i in range(0, len(bpy.context.object.material_slots)):
-
-				slot = bpy.context.object.material_slots[i]
-				if slot.material and slot.material not in mats:
-					# Store prefx by material
-					prefix_mat = "{}_{}".format(prefix, slot.material.name)
-					
-					bpy.context.object.name = prefix_mat
-
-					mat = slot.material 
-					mats[mat] = prefix_mat
-
-					if len(bpy.context.object.data.vertices) > 0:
-						bpy.ops.mesh.select_all(action='DESELECT')
-						bpy.context.object.active_material_index = i
-						bpy.ops.object.material_slot_select()
-						if len( [v for v in bpy.context.active_object.data.vertices if v.select] ) > 0:
-							bpy.ops.mesh.separate(type='SELECTED')
-
-			
-			bpy.ops.object.mode_set(mode='OBJECT')
-
-			mat_objs = []
-			for obj in bpy.context.scene.objects:
-				if prefix in obj.name:
-					if len(obj.data.vertices) == 0:
-						bpy.ops.object.select_all(action='DESELECT')
-						obj.select_set(state = True)
-						bpy.ops.object.delete()
-					else:
-						mat_objs.append(obj)
-
-			# Combine & Rename by materials
-			for mat in mats:
-				prefix_mat = mats[mat]
-				for obj in mat_objs:
-
-					bpy.ops.object.select_all(action='DESELECT')
-					bpy.context.view_layer.objects.active = obj
-					obj.select_set(state = True)
-
-					if prefix_mat in obj.name:
-
-						for i in range( len(obj.material_slots)-1 ):
-							bpy.ops.object.material_slot_remove()
-						obj.material_slots[0].material = mat
-
-						obj.name = "{}_{}".format(name, mat.name)
-
 			# return material objects
-			return mat_objs
+			return split_by_material(name, merged)
 
 		# Test if object still exsits
-		filtered_objects = []
-		for obj in objects:
-			try:
-				obj.type					
-				filtered_objects.append(obj)
-			except ReferenceError:
-				continue
-
-		objects = filtered_objects
-
-		return objects
+		return [obj for obj in objects if objects_organise.is_object_alive(obj)]
+
 
 
-def id_generator(size=6, chars=string.ascii_uppercase + string.digits):
-	return ''.join(random.choice(chars) for _ in range(size))
+	def get_chunking(self, name, objects):
+		# Grid and vertex limit for mesh_merge, chunk names get the Rename
+		# modifier's object template like the bundle's objects did
+		chunks = self.get("merge_chunks")
+		if chunks == 'NONE':
+			return None, 0, None
+
+		grid = None
+		if chunks == 'GRID':
+			bounds = objects_organise.get_bounds([obj for obj in objects if obj.type == 'MESH'])
+			size = max(bounds.size)
+			if size > 0:
+				grid = (bounds.min.copy(), size / self.get("chunk_cells"))
+
+		rename = modifier_rename.Modifier()
+		format_name = None
+		if rename.get("active"):
+			format_name = lambda chunk: rename.remove_illegal_characters(rename.format_object_name(name, chunk))
+
+		return grid, self.get("chunk_vertices") if chunks == 'VERTICES' else 0, format_name
+
+
+
+def join_batched(objects, merged):
+	# Memory bounded exports join a batch of vertices at a time and free the
+	# joined meshes in between. Each join copies the merged mesh again, which
+	# is slower but never holds every copy and the merged mesh at once.
+	others = [obj for obj in objects if obj != merged and obj.type == 'MESH']
+	start = 0
+	while start < len(others):
+		batch, vertices = [], 0
+		while start < len(others) and (not batch or vertices < export_memory.get_batch_vertices()):
+			vertices += len(others[start].data.vertices)
+			batch.append(others[start])
+			start += 1
+
+		meshes = [obj.data for obj in batch]
+		with objects_organise.context_override([merged] + batch, merged):
+			bpy.ops.object.join()
+		export_memory.free_meshes(meshes)
+		export_memory.spill_if_over_limit()
+
+
+
+def remove_unused_materials(mesh):
+	# Drop material slots no face uses and remap the face indices
+	indices = mesh_arrays.get_material_indices(mesh)
+	used = [i for i in np.unique(indices) if i < len(mesh.materials)]
+	if len(used) == len(mesh.materials):
+		return
+
+	materials = [mesh.materials[i] for i in used]
+	remap = np.zeros(max(len(mesh.materials), int(indices.max(initial=0)) + 1), dtype=np.int32)
+	remap[used] = np.arange(len(used))
+
+	mesh.materials.clear()
+	for material in materials:
+		mesh.materials.append(material)
+	mesh.polygons.foreach_set('material_index', remap[indices])
+	mesh.update()
+
+
+
+def split_by_material(name, obj):
+	# One object per material, built with bmesh instead of edit mode separate
+	mesh = obj.data
+	indices = mesh_arrays.get_material_indices(mesh)
+
+	# Free the bundle name for the split objects, a fixed name keeps exports reproducible
+	original_name = obj.name
+	obj.name = "{}__split".format(name)
+
+	groups = {}
+	for index, material in enumerate(mesh.materials):
+		if material:
+			groups.setdefault(material, []).append(index)
+
+	# Faces without a material keep the bundle name
+	parts = [("{}_{}".format(name, material.name), material, np.isin(indices, group)) for material, group in groups.items()]
+	parts.append((name, None, ~np.isin(indices, [index for group in groups.values() for index in group])))
+
+	split_objects = []
+	for split_name, material, mask in parts:
+		if not mask.any():
+			continue
+
+		bm = bmesh.new()
+		bm.from_mesh(mesh)
+		bm.faces.ensure_lookup_table()
+		bmesh.ops.delete(bm, geom=[bm.faces[i] for i in np.flatnonzero(~mask)], context='FACES')
+		for face in bm.faces:
+			face.material_index = 0
+
+		split_mesh = bpy.data.meshes.new(split_name)
+		bm.to_mesh(split_mesh)
+		bm.free()
+		if material:
+			split_mesh.materials.append(material)
+
+		split = obj.copy()
+		split.data = split_mesh
+		split.name = split_name
+		for collection in obj.users_collection:
+			collection.objects.link(split)
+		split_objects.append(split)
+
+	if len(split_objects) == 0:
+		obj.name = original_name
+		return [obj]
+
+	bpy.data.objects.remove(obj)
+	if mesh.users == 0:
+		bpy.data.meshes.remove(mesh)
+	return split_objects
+
@@ -3,6 +3,8 @@ import imp
 import math
 from mathutils import Vector
 
+from . import objects_organise
+
 from . import modifier
 imp.reload(modifier) 
 
@@ -70,20 +72,16 @@ class Modifier(modifier.Modifier):
 			bpy.ops.object.mode_set(mode='OBJECT')
 
 			prev_cursor_mode = bpy.context.tool_settings.transform_pivot_point
-			prev_cursor_location = bpy.context.scene.cursor.location
+			prev_cursor_location = bpy.context.scene.cursor.location.copy()
 
 			# Export origin
 			bpy.context.tool_settings.transform_pivot_point = 'CURSOR'
 			bpy.context.scene.cursor.location = Vector((0,0,0))
 
-			for obj in objects:
-				if obj != source:
-
-					
-					bpy.ops.object.select_all(action='DESELECT')
-					bpy.context.view_layer.objects.active = obj
-					obj.select_set(state = True)
-
+			# Transform all objects at once instead of selecting them one by one
+			targets = [obj for obj in objects if obj != source]
+			if len(targets) > 0:
+				with objects_organise.context_override(targets):
 					# Move
 					bpy.ops.transform.translate(value=source.location, orient_type='GLOBAL', mirror=False, use_proportional_edit = False)
 
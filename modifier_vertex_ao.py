@@ -2,6 +2,8 @@ import bpy, bmesh
 import math
 import imp
 
+from . import objects_organise
+
 from . import modifier
 imp.reload(modifier) 
 
@@ -48,18 +50,31 @@ class Modifier(modifier.Modifier):
 		contrast = self.get('contrast')
 
 		for obj in objects:
-			bpy.ops.object.select_all(action="DESELECT")
-			obj.select_set(state = True)
-			bpy.context.view_layer.objects.active = obj
+			if obj.type != 'MESH':
+				continue
+
+			# White base color, the dirt operator has no data API equivalent
+			fill_white(obj.data)
+
+			with objects_organise.context_override([obj]):
+				bpy.ops.object.mode_set(mode='VERTEX_PAINT')
+				bpy.ops.paint.vertex_color_dirt(blur_strength=1, blur_iterations=1, clean_angle= math.pi - (1-contrast) * math.pi/2 , dirt_angle=contrast * math.pi/2)
+
+				# Back to object mode
+				bpy.ops.object.mode_set(mode='OBJECT')
+
+		return objects
+
 
-			# Set AO vertex colors
-			bpy.ops.object.mode_set(mode='VERTEX_PAINT')
-			
-			bpy.context.tool_settings.vertex_paint.brush.color = (1, 1, 1)
-			bpy.ops.paint.vertex_color_set()
-			bpy.ops.paint.vertex_color_dirt(blur_strength=1, blur_iterations=1, clean_angle= math.pi - (1-contrast) * math.pi/2 , dirt_angle=contrast * math.pi/2)
 
-			# Back to object mode
-			bpy.ops.object.mode_set(mode='OBJECT')
+def fill_white(mesh):
+	if hasattr(mesh, "color_attributes"):
+		layer = mesh.color_attributes.active_color
+		if not layer:
+			layer = mesh.color_attributes.new("Col", 'BYTE_COLOR', 'CORNER')
+			mesh.color_attributes.active_color = layer
+	else:
+		# Blender 3.1 and older
+		layer = mesh.vertex_colors.active or mesh.vertex_colors.new()
 
-		return objects
\ No newline at end of file
+	layer.data.foreach_set('color', [1.0] * (len(layer.data) * 4))
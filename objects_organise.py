@@ -12,88 +12,151 @@ from . import platforms
 imp.reload(platforms)
 
 
-def is_object_valid(obj):
+def is_object_valid(obj, graph=None):
 	# Objects to include in a bundle as 'export-able'
 	if obj.hide_viewport:
 		return False
 
 	# Ignore objects that are not in any collection (e.g. MESHMachine stashed objects)
-	if len(obj.users_collection) == 0:
+	collections = graph.get_collections(obj) if graph else obj.users_collection
+	if len(collections) == 0:
 		return False
 
 	# Ensure the object is in the current view layer to avoid selection errors
-	if obj.name not in bpy.context.view_layer.objects:
+	if graph:
+		if obj not in graph.view_layer_objects:
+			return False
+	elif obj.name not in bpy.context.view_layer.objects:
 		return False
 		
 	return obj.type == 'MESH' or obj.type == 'FONT' or obj.type == 'CURVE' or obj.type == 'EMPTY' or obj.type == 'ARMATURE'
 
 
-def get_objects(fast=True):
-	objects = []
-	for obj in bpy.context.selected_objects:
-		objects.append(obj)
+
+class ObjectGraph:
+	# Scene relations gathered in a single pass. Blender resolves
+	# Object.children and Object.users_collection by scanning all data, so
+	# asking for them per object makes bundling quadratic.
+	limit = 100  # max depth
+
+	def __init__(self, scene, view_layer):
+		self.children = {}
+		self.collections = {}
+		self.collection_objects = {}
+		self.roots = {}
+		self.view_layer_objects = set(view_layer.objects)
+
+		for obj in scene.objects:
+			if obj.parent:
+				self.children.setdefault(obj.parent, []).append(obj)
+
+		for collection in list(bpy.data.collections) + [scene.collection]:
+			objects = list(collection.objects)
+			self.collection_objects[collection] = objects
+			for obj in objects:
+				self.collections.setdefault(obj, []).append(collection)
+
+
+	def get_children(self, obj):
+		return self.children.get(obj, [])
+
+
+	def get_collections(self, obj):
+		return self.collections.get(obj, [])
+
+
+	def get_collection_objects(self, collection):
+		return self.collection_objects.get(collection, [])
+
+
+	def get_root(self, obj):
+		# Climb until a known root, then share the result with the whole path
+		path = []
+		root = obj
+		while root.parent and root not in self.roots and len(path) < self.limit:
+			path.append(root)
+			root = root.parent
+		root = self.roots.get(root, root)
+
+		for node in path:
+			self.roots[node] = root
+		return root
+
+
+	def collect_hierarchy(self, obj, objects):
+		# Add obj and its nested children to the ordered 'objects' dict
+		stack = [(obj, 0)]
+		while stack:
+			node, depth = stack.pop()
+			objects[node] = None
+			if depth < self.limit: #Don't exceed limit on traversal depth
+				stack.extend((child, depth+1) for child in reversed(self.get_children(node)))
+
+
+
+def get_root(obj, graph=None):
+	if graph:
+		return graph.get_root(obj)
+
+	root = obj
+	for i in range(ObjectGraph.limit): # safety break
+		if root.parent:
+			root = root.parent
+		else:
+			break
+	return root
+
+
+
+def get_objects(fast=True, graph=None):
+	if not graph:
+		graph = ObjectGraph(bpy.context.scene, bpy.context.view_layer)
+
+	mode_bundle = bpy.context.scene.FBXBundleSettings.mode_bundle
+	return collect_objects(bpy.context.selected_objects, mode_bundle, graph, bpy.context.scene, fast)
+
+
+
+def collect_objects(objects, mode_bundle, graph, scene, fast=False):
+	# Expand input objects to everything their bundles contain
+
+	# Dictionary keys as an insertion ordered set
+	objects = dict.fromkeys(objects)
 
 	# Include all children?
 	if len(objects) > 0:
-		
-		limit = 100  # max depth
-
-		def collect_recursive(obj, depth):
-			if obj not in objects:
-				objects.append(obj)
-			
-			if depth < limit: #Don't exceed limit on traversal depth
-				for child in obj.children:
-					collect_recursive(child, depth+1)
-		
-		if bpy.context.scene.FBXBundleSettings.mode_bundle == 'PARENT':
-			# Collect parent and children objects
-			roots = []
-
+		if mode_bundle == 'PARENT':
 			# Collect roots from input selection
-			for obj in objects:
-				root = obj
-				for i in range(limit):
-					if root.parent:
-						root = root.parent
-					else:
-						break
-				if root not in roots:
-					roots.append(root)
-
-			# Traverse loops and its nested elements
+			roots = dict.fromkeys(graph.get_root(obj) for obj in objects)
+
+			# Traverse roots and their nested elements
 			for root in roots:
-				collect_recursive(root, 0)
+				graph.collect_hierarchy(root, objects)
 
-		elif bpy.context.scene.FBXBundleSettings.mode_bundle == 'COLLECTION':
+		elif mode_bundle == 'COLLECTION':
 			# Collect group objects
 			if not fast:
 				# Collect groups from input selection
-				groups = []
+				groups = {}
 				for obj in objects:
-					groups += [g for g in obj.users_collection if g not in groups]
+					groups.update(dict.fromkeys(graph.get_collections(obj)))
 
 				# Collect objects of groups
 				# TODO needs to check view layer collection
 				for grp in groups:
-					objects += [o for o in grp.objects if o not in objects]
+					objects.update(dict.fromkeys(graph.get_collection_objects(grp)))
 
-		elif bpy.context.scene.FBXBundleSettings.mode_bundle == 'SCENE':
+		elif mode_bundle == 'SCENE':
 			# Include all objects of the scene
-			for obj in bpy.context.scene.objects:
-				if obj not in objects:
-					objects.append(obj)
+			objects.update(dict.fromkeys(scene.objects))
 		
-		elif bpy.context.scene.FBXBundleSettings.mode_bundle == 'COLLECTION_INSTANCE':
+		elif mode_bundle == 'COLLECTION_INSTANCE':
 			# Collect children obejcts
-			for obj in objects:
-				collect_recursive(obj, 0)
+			for obj in list(objects):
+				graph.collect_hierarchy(obj, objects)
 
 
-	filtered = []
-	for obj in objects:
-		if is_object_valid(obj):
-			filtered.append(obj)
+	filtered = [obj for obj in objects if is_object_valid(obj, graph)]
 
 	return sort_objects_name(filtered)
 
@@ -140,6 +203,21 @@ def get_object_animation(obj):
 
 
 
+def get_preferences():
+	# None while the add-on isn't enabled, e.g. when imported by a script
+	addon = bpy.context.preferences.addons.get(__package__)
+	if addon:
+		return addon.preferences
+	return None
+
+
+
+def get_preference(key, default):
+	preferences = get_preferences()
+	return getattr(preferences, key, default) if preferences else default
+
+
+
 def recent_store(bundles):
 	dic = {}
 	dic['selection'] = []
@@ -185,14 +263,130 @@ def recent_load_objects():
 	
 
 
-0
+class BundleIndex:
+	# Bundles of the current selection, kept between redraws. Entries are
+	# dropped from the depsgraph update handler whenever an update could
+	# change which objects end up in which bundle.
+	def __init__(self):
+		self.entries = {}
+		self.parents = {}
+		self.selection = None
+
+
+	def get(self, key, build):
+		if key not in self.entries:
+			if not self.entries:
+				self.snapshot()
+			self.entries[key] = build()
+		return self.entries[key]
+
+
+	def snapshot(self):
+		# Remember hierarchy and selection so updates can be compared against them
+		self.parents = {obj.as_pointer(): get_pointer(obj.parent) for obj in bpy.context.scene.objects}
+		self.selection = get_selection_pointers()
+
+
+	def invalidate(self):
+		self.entries.clear()
+		self.parents.clear()
+		self.selection = None
+
+
+	def update(self, depsgraph):
+		if not self.entries:
+			return
+
+		for update in depsgraph.updates:
+			data = update.id.original
+
+			if isinstance(data, bpy.types.Object):
+				# Moving or editing an object keeps its bundle, re-parenting does not
+				if update.is_updated_transform or update.is_updated_geometry:
+					pointer = data.as_pointer()
+					if pointer in self.parents and self.parents[pointer] == get_pointer(data.parent):
+						continue
+				self.invalidate()
+				return
+
+			elif isinstance(data, bpy.types.Collection):
+				self.invalidate()
+				return
+
+			elif isinstance(data, bpy.types.Scene):
+				# Scene updates are sent for selection changes among many others
+				if self.selection != get_selection_pointers():
+					self.invalidate()
+					return
+
+
+
+bundle_index = BundleIndex()
+
+
+
+def get_pointer(obj):
+	return obj.as_pointer() if obj else 0
+
+
+
+def get_selection_pointers():
+	return frozenset(obj.as_pointer() for obj in bpy.context.selected_objects)
+
+
+
+@bpy.app.handlers.persistent
+def on_depsgraph_update(scene, depsgraph):
+	bundle_index.update(depsgraph)
+
+
+
+@bpy.app.handlers.persistent
+def on_data_reload(*args):
+	# Undo and file loads replace all data-blocks, stored objects are invalid
+	bundle_index.invalidate()
+
+
+
+def handlers_register():
+	bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+	for handler in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+		handler.append(on_data_reload)
+
+
+
+def handlers_unregister():
+	if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+	for handler in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+		if on_data_reload in handler:
+			handler.remove(on_data_reload)
+	bundle_index.invalidate()
+
+
+
 def get_bundles(fast=False):
-	objects = get_objects(fast=fast)
-    
+	scene = bpy.context.scene
+	key = (scene.name, scene.FBXBundleSettings.mode_bundle, fast)
+	bundles = bundle_index.get(key, lambda: build_bundles(fast=fast))
+
+	# Callers are free to modify the lists they get
+	return {name: list(objects) for name, objects in bundles.items()}
+
+
+
+def build_bundles(fast=False):
+	graph = ObjectGraph(bpy.context.scene, bpy.context.view_layer)
+	objects = get_objects(fast=fast, graph=graph)
+	return group_bundles(objects, bpy.context.scene.FBXBundleSettings.mode_bundle, graph, bpy.context.scene)
+
+
+
+def group_bundles(objects, mode_bundle, graph=None, scene=None):
 	bundles = {}
 	for obj in objects:
-		key = get_key(obj)
-		if key not in bundles.keys():
+		key = get_key(obj, graph, mode_bundle, scene)
+		if key not in bundles:
 			bundles[key] = [obj]
 		else:
 			bundles[key].append(obj)
@@ -204,8 +398,9 @@ def get_bundles(fast=False):
 
 
 
-def get_pivot(objects):
-	mode_bundle = bpy.context.scene.FBXBundleSettings.mode_bundle
+def get_pivot(objects, graph=None, mode_bundle=None):
+	if not mode_bundle:
+		mode_bundle = bpy.context.scene.FBXBundleSettings.mode_bundle
 
 	if not objects:
 		return Vector((0, 0, 0))
@@ -214,11 +409,7 @@ def get_pivot(objects):
 	root = obj
 	if mode_bundle == 'PARENT' or mode_bundle == 'COLLECTION_INSTANCE':
 		# climb up to the root parent
-		for i in range(100): # safety break
-			if root.parent:
-				root = root.parent
-			else:
-				break
+		root = get_root(obj, graph)
 	
 	if mode_bundle == 'PARENT':
 		return root.location
@@ -231,52 +422,35 @@ def get_pivot(objects):
 
 
 
-def get_key(obj):
-	mode_bundle = bpy.context.scene.FBXBundleSettings.mode_bundle
+def get_key(obj, graph=None, mode_bundle=None, scene=None):
+	if not mode_bundle:
+		mode_bundle = bpy.context.scene.FBXBundleSettings.mode_bundle
+	if not scene:
+		scene = bpy.context.scene
 
 	if mode_bundle == 'PARENT':
-		# Use group name
-		if obj.parent:
-			limit = 100
-			obj_parent = obj.parent
-			for i in range(limit):
-				if obj_parent.parent:
-					obj_parent = obj_parent.parent
-				else:
-					break
-			return obj_parent.name
-		else:
-			return obj.name
+		# Use root parent name
+		return get_root(obj, graph).name
 
 	elif mode_bundle == 'COLLECTION':
 		# TODO Make this work
 		# Use group name
-		if len(obj.users_collection) >= 1:
-			return obj.users_collection[0].name
+		collections = graph.get_collections(obj) if graph else obj.users_collection
+		if len(collections) >= 1:
+			return collections[0].name
 	
 	elif mode_bundle == 'COLLECTION_INSTANCE':
 		# Use collection instance name
-		if True:
-			if obj.parent:
-				limit = 100
-				obj_parent = obj.parent
-				for i in range(limit):
-					if obj_parent.parent:
-						obj_parent = obj_parent.parent
-					else:
-						break
-				if obj_parent.instance_collection:
-					return obj_parent.instance_collection.name
-			elif obj.instance_collection:
-				return obj.instance_collection.name
-		else:
-			if obj.instance_collection:
-				return obj.instance_collection.name
-		
+		if obj.parent:
+			root = get_root(obj, graph)
+			if root.instance_collection:
+				return root.instance_collection.name
+		elif obj.instance_collection:
+			return obj.instance_collection.name
 
 	elif mode_bundle == 'SCENE':
 		# Use scene name
-		return bpy.context.scene.name
+		return scene.name
 
 	return "UNDEFINED"
 
@@ -333,96 +507,132 @@ class ObjectBounds:
 		return collide_x and collide_y and collide_z
 
 
-def consolidate_objects(objects, apply_normals=True, merge_uvs=True, convert_mesh=True):
-	for obj in objects:
-		if obj.type in ('MESH','EMPTY'):
-			# TODO multi thread this. Only need to run duplicates make real once
-			bpy.ops.object.select_all(action='DESELECT')
-			# Select and make active
-			bpy.context.view_layer.objects.active = obj
-			obj.select_set(state=True)
-
-			# Copy object data
-			if obj.data:
-				copy = obj.data.copy()
-				obj.data = copy
-			
-			bpy.ops.object.duplicates_make_real()
-			
-        	# Test if operation did anything
-			exten = bpy.context.selected_objects
-			if len(exten) < 2:
-				continue
-			
-			# Recursively add new objects
-			exten = [o for o in exten if o != obj]
-			objects.extend(exten)
-			objects.remove(obj)
-
-			bpy.ops.object.select_all(action='DESELECT')
-			bpy.context.view_layer.objects.active = obj
-			obj.select_set(state=True)
-			bpy.ops.object.delete()
-	
-	# After we've insured that there's no more instanced objects - apply modifiers
+def get_bounds(objects):
+	# Combined world space bounds of the objects
+	bounds = ObjectBounds(objects[0])
+	for obj in objects[1:]:
+		bounds.combine(ObjectBounds(obj))
+	return bounds
+
+
+
+def context_override(objects, active=None):
+	# Operator context acting on 'objects' without changing the selection
+	if active is None and len(objects) > 0:
+		active = objects[0]
+	return bpy.context.temp_override(
+		selected_objects=objects,
+		selected_editable_objects=objects,
+		active_object=active,
+		object=active
+	)
+
+
+
+def select_objects(objects, active=None):
+	# Replace the selection through the data API, no operator redraw or undo push
+	for obj in list(bpy.context.view_layer.objects.selected):
+		obj.select_set(state=False)
 	for obj in objects:
-		bpy.ops.object.select_all(action="DESELECT")
 		obj.select_set(state=True)
-		bpy.context.view_layer.objects.active = obj
-		obj.hide_viewport = False
+	if active:
+		bpy.context.view_layer.objects.active = active
+
 
-		# Apply modifiers
-		if obj.type == 'MESH':
-			bpy.ops.object.convert(target='MESH')
-	
-	# Reselect objects list
-	bpy.ops.object.select_all(action='DESELECT')
-	[o.select_set(state=True) for o in objects]
-	
-	# Find a mesh object so we can run convert operator
-	make_mesh_type_active(objects)
 
-	bpy.ops.object.make_single_user(
-			type='SELECTED_OBJECTS', object=False, obdata=True)
+def is_object_alive(obj):
+	# False once the object's data block was removed
+	if obj is None:
+		return False
+	try:
+		obj.name
+		return True
+	except ReferenceError:
+		return False
+
+
+
+def duplicate_object(obj):
+	# Like the duplicate operator with default settings, without touching the selection
+	copy = obj.copy()
+	if obj.data:
+		copy.data = obj.data.copy()
+	for collection in obj.users_collection:
+		collection.objects.link(copy)
+	return copy
+
+
+
+def make_instances_real(instancers):
+	# Real objects for the collection instances of 'instancers'. Reads the
+	# evaluated depsgraph once instead of calling duplicates_make_real per object.
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	instancers = set(instancers)
+
+	instances = []
+	for instance in depsgraph.object_instances:
+		if instance.is_instance and instance.parent and instance.parent.original in instancers:
+			instances.append((instance.parent.original, instance.object.original, instance.matrix_world.copy()))
+
+	created = []
+	for parent, source, matrix in instances:
+		# Nested instancers show up as instances of their own
+		if source.type == 'EMPTY' and source.instance_collection:
+			continue
+
+		obj = source.copy()
+		obj.parent = None
+		obj.matrix_world = matrix
+		for collection in parent.users_collection:
+			collection.objects.link(obj)
+		created.append(obj)
+
+	return created
+
+
+
+def consolidate_objects(objects, apply_normals=True, merge_uvs=True, convert_mesh=True, apply_scale=False):
+	objects = list(objects)
+
+	# Replace collection instances with real objects
+	instancers = [obj for obj in objects if obj.type == 'EMPTY' and obj.instance_collection]
+	if len(instancers) > 0:
+		objects = [obj for obj in objects if obj not in instancers] + make_instances_real(instancers)
+		for obj in instancers:
+			bpy.data.objects.remove(obj)
+
+	# Single user data so applying modifiers doesn't affect other objects
+	for obj in objects:
+		obj.hide_viewport = False
+		if obj.data and obj.data.users > 1:
+			obj.data = obj.data.copy()
 	
 	# TODO figure out a better way to preserve auto smooth
 	if apply_normals:
-		for obj in objects:				
-			if obj.type == 'MESH':
-				data = obj.data
-				if data.use_auto_smooth:
-					mod = obj.modifiers.new("Split Normals","EDGE_SPLIT")
-					mod.split_angle = data.auto_smooth_angle
+		for obj in objects:
+			# Auto smooth only exists up to Blender 4.0
+			if obj.type == 'MESH' and getattr(obj.data, "use_auto_smooth", False):
+				mod = obj.modifiers.new("Split Normals","EDGE_SPLIT")
+				mod.split_angle = obj.data.auto_smooth_angle
 	
 	if convert_mesh:
-		bpy.ops.object.convert(target='MESH', keep_original=False)
-		bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
+		# Apply modifiers and transforms with one operator call for all objects
+		geometry = [obj for obj in objects if obj.type in ('MESH', 'CURVE', 'FONT')]
+		if len(geometry) > 0:
+			with context_override(geometry):
+				bpy.ops.object.convert(target='MESH', keep_original=False)
+		with context_override(objects, get_mesh_type(objects)):
+			bpy.ops.object.transform_apply(location=False, rotation=True, scale=apply_scale)
 
 	if merge_uvs:
 		# Consolidate UVs
 		uv_map_name = "UVMap"
 		for obj in objects:
-			#bpy.context.view_layer.objects.active = obj
 			if obj.type == 'MESH':
-				for layer in obj.data.uv_layers:
+				for layer in list(obj.data.uv_layers):
 					if layer.active_render:
-						active = layer
-						active.name = uv_map_name
-					else:
-						if not layer.name == "Lightmap":
-							obj.data.uv_layers.remove(layer)
-
-	# Consolidate UVs
-	uv_map_name = "UVMap"
-	for obj in objects:
-		bpy.context.view_layer.objects.active = obj
-		if obj.type == 'MESH':
-			for layer in obj.data.uv_layers:
-				if layer.active_render:
-					active = layer
-					active.name = uv_map_name
-				else:
-					if not layer.name == "Lightmap":
+						layer.name = uv_map_name
+					elif not layer.name == "Lightmap":
 						obj.data.uv_layers.remove(layer)
 
 	#Find Mesh Type Again
@@ -430,9 +640,17 @@ def consolidate_objects(objects, apply_normals=True, merge_uvs=True, convert_mes
 
 	return objects
 
+
+
+def get_mesh_type(objects):
+	for obj in objects:
+		if obj.type == 'MESH':
+			return obj
+	return objects[0] if len(objects) > 0 else None
+
+
+
 def make_mesh_type_active(objects):
-		for obj in objects:
-			if obj.type == 'MESH':
-				bpy.context.view_layer.objects.active = obj
-				break
-			continue
+	obj = get_mesh_type(objects)
+	if obj:
+		bpy.context.view_layer.objects.active = obj
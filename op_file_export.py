@@ -9,20 +9,34 @@ from . import objects_organise
 
 from . import modifiers
 from . import platforms
+from . import api
+from . import export_report
+from . import export_output
 
 imp.reload(modifiers)
 imp.reload(platforms)
+imp.reload(api)
+imp.reload(export_report)
+imp.reload(export_output)
 
 
 class op(bpy.types.Operator):
     bl_idname = "fbxbundle.file_export"
     bl_label = "export"
     bl_description = "Export selected bundles"
+    # Operators run during the export don't push undo steps of their own
+    bl_options = {'UNDO'}
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        default=False,
+        description="Export all bundles, including those unchanged since the last export"
+    )
 
     @classmethod
     def poll(cls, context):
 
-        if context.space_data.local_view:
+        if context.space_data and context.space_data.local_view:
             return False
 
         if len(bpy.context.selected_objects) == 0:
@@ -40,14 +54,14 @@ class op(bpy.types.Operator):
         return True
 
     def execute(self, context):
-        export(self, bpy.context.scene.FBXBundleSettings.target_platform)
+        export(self, bpy.context.scene.FBXBundleSettings.target_platform, force=self.force)
         return {'FINISHED'}
 
 
 prefix_copy = "EXPORT_ORG_"
 
 
-def export(self, target_platform):
+def export(self, target_platform, force=False):
     # Warnings
     if bpy.context.scene.FBXBundleSettings.path == "":
         self.report({'ERROR_INVALID_INPUT'}, "Export path not set")
@@ -73,101 +87,48 @@ def export(self, target_platform):
         self.report({'ERROR_INVALID_INPUT'}, platforms.platforms[mode].is_valid()[1])
         return
 
-    # Store previous settings
-    previous_selection = bpy.context.selected_objects.copy()
-    previous_active = bpy.context.view_layer.objects.active
-    previous_unit_system = bpy.context.scene.unit_settings.system
-    previous_pivot = bpy.context.tool_settings.transform_pivot_point
-    previous_cursor = bpy.context.scene.cursor.location.copy()
-
-    if not bpy.context.view_layer.objects.active:
-        bpy.context.view_layer.objects.active = bpy.context.selected_objects[0]
-
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bundles = objects_organise.get_bundles()
-
-    bpy.context.scene.unit_settings.system = 'METRIC'
-    bpy.context.tool_settings.transform_pivot_point = 'MEDIAN_POINT'
-
-    objects_organise.recent_store(bundles)
+    report = export_report.Report(
+        profile_memory=objects_organise.get_preference("profile_memory", False),
+        profile_calls=objects_organise.get_preference("profile_calls", False)
+    )
+
+    selection = bpy.context.selected_objects or [bpy.context.view_layer.objects.active]
+    with report.stage("plan"):
+        plan = api.plan(selection, bpy.context.scene.FBXBundleSettings.mode_bundle)
+
+    objects_organise.recent_store({bundle.name: bundle.objects for bundle in plan})
+
+    workers = objects_organise.get_preference("export_workers", 1)
+    batch = objects_organise.get_preference("export_batch", False)
+    threads = objects_organise.get_preference("export_threads", 0)
+    memory_limit = objects_organise.get_preference("memory_limit", 0) if objects_organise.get_preference("memory_bounded", False) else None
+    try:
+        results = api.export(plan, mode, folder, force=force, workers=workers, report=report, batch=batch, threads=threads, memory_limit=memory_limit)
+    except export_output.LockError as error:
+        self.report({'ERROR'}, str(error))
+        return
+    finally:
+        report.close()
 
-    for name, objects in bundles.items():
-        export_bundle(self, name, objects, folder, mode)
+    exported = [result for result in results if result.status == 'EXPORTED']
+    skipped = [result for result in results if result.status == 'UNCHANGED']
+    failed = [result for result in results if result.status == 'FAILED']
 
-    # Restore previous settings
-    bpy.context.scene.unit_settings.system = previous_unit_system
-    bpy.context.tool_settings.transform_pivot_point = previous_pivot
-    bpy.context.scene.cursor.location = previous_cursor
-    bpy.context.view_layer.objects.active = previous_active
-    bpy.ops.object.select_all(action='DESELECT')
-    for obj in previous_selection:
-        obj.select_set(state=True)
+    for result in failed:
+        self.report({'ERROR'}, "Failed to export '{}': {}".format(result.name, result.error))
 
     # Show popup
     def draw(self, context):
-        filenames = []
-        # Get bundle file names
-        for name, objects in bundles.items():
-            for modifier in modifiers.modifiers:
-                if modifier.get("active"):
-                    name = modifier.process_name(name)
-            filenames.append(name + "." + platforms.platforms[mode].extension)
-
+        filenames = [os.path.basename(result.path) for result in exported]
         self.layout.label(text="Exported {}".format(", ".join(filenames)))
-
-    bpy.context.window_manager.popup_menu(draw, title="Exported {}x files".format(len(bundles)), icon='INFO')
-
-
-def export_bundle(self, name, objects, folder, mode):
-    # Store original locations
-    original_locations = {obj: obj.location.copy() for obj in objects}
-
-    pivot = objects_organise.get_pivot(objects).copy()
-
-    # Get root objects
-    root_objects = [obj for obj in objects if obj.parent not in objects]
-
-    # Deselect all
-    bpy.ops.object.select_all(action="DESELECT")
-
-    for obj in root_objects:
-        obj.select_set(state=True)
-        bpy.context.view_layer.objects.active = obj
-        obj.hide_viewport = False
-        bpy.context.object.location -= pivot
-
-    bpy.ops.object.select_all(action="DESELECT")
-    for obj in objects:
-        obj.select_set(state=True)
-    bpy.context.view_layer.objects.active = objects[0]
-
-    # Apply modifiers
-    processed_objects = objects
-    path_folder = folder
-    path_name = name
-    for modifier in modifiers.modifiers:
-        if modifier.get("active"):
-            processed_objects = modifier.process_objects(name, processed_objects)
-            path_folder = modifier.process_path(path_name, path_folder)
-            path_name = modifier.process_name(path_name)
-
-    path_full = os.path.join(path_folder, path_name) + "." + platforms.platforms[mode].extension
-
-    # Create path if not yet available
-    directory = os.path.dirname(path_full)
-    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
-
-    # Select all objects in the bundle
-    bpy.ops.object.select_all(action="DESELECT")
-    for obj in processed_objects:
-        obj.select_set(state=True)
-
-    # Export per platform (Unreal, Unity, ...)
-    print("Export {}x = {}".format(len(objects), path_full))
-    platforms.platforms[mode].file_export(path_full)
-
-    # Move objects back to their original locations
-    for obj in root_objects:
-        obj.location = original_locations[obj]
-
-    return
+        if len(skipped) > 0:
+            self.layout.label(text="Skipped {}x unchanged".format(len(skipped)))
+        for result in failed:
+            self.layout.label(text="Failed {}: {}".format(result.name, result.error), icon='ERROR')
+        # Slowest stages, the full report is next to the files
+        self.layout.separator()
+        for line in report.get_summary():
+            self.layout.label(text=line, icon='TIME')
+
+    if not bpy.app.background:
+        bpy.context.window_manager.popup_menu(draw, title="Exported {}x files".format(len(exported)), icon='INFO')
@@ -20,7 +20,7 @@ class op(bpy.types.Operator):
 	@classmethod
 	def poll(cls, context):
 
-		if context.space_data.local_view:
+		if context.space_data and context.space_data.local_view:
 			return False
 
 		if bpy.context.scene.FBXBundleSettings.path == "":
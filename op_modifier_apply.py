@@ -37,10 +37,7 @@ class op(bpy.types.Operator):
 			if(len(bundles) > 0):
 				for fileName,objects in bundles.items():
 
-					bpy.ops.object.select_all(action="DESELECT")
-					for obj in objects:
-						obj.select_set(state = True)
-					bpy.context.view_layer.objects.active = objects[0]
+					objects_organise.select_objects(objects, objects[0])
 
 					modifiers.modifiers[self.modifier_index].process_objects(fileName, objects)
 
@@ -1,14 +1,95 @@
 import bpy
+import os
 import bmesh
 import operator
 import mathutils
+import imp
+import types
+import datetime
+import importlib
+from contextlib import contextmanager
 from mathutils import Vector
 
+from . import writer
+from . import writer_fbx
+imp.reload(writer)
+imp.reload(writer_fbx)
+
+
+@contextmanager
+def batch_scene(collections):
+	# Temporary scene holding only 'collections', with the units of the current scene
+	scene = bpy.data.scenes.new("FBXBundle_Batch")
+	scene.unit_settings.system = bpy.context.scene.unit_settings.system
+	scene.unit_settings.scale_length = bpy.context.scene.unit_settings.scale_length
+	try:
+		for collection in collections:
+			scene.collection.children.link(collection)
+		yield scene
+	finally:
+		bpy.data.scenes.remove(scene)
+
+
+
+def is_deterministic():
+	# Identical input exports identical bytes, set in the scene settings
+	settings = getattr(bpy.context.scene, "FBXBundleSettings", None)
+	return bool(settings and getattr(settings, "deterministic", False))
+
+
+
+class FixedDatetime(datetime.datetime):
+	@classmethod
+	def now(cls, tz=None):
+		return cls.combine(writer.epoch.date(), writer.epoch.time(), tz)
+
+	@classmethod
+	def today(cls):
+		return cls.now()
+
+	@classmethod
+	def utcnow(cls):
+		return cls.now()
+
+
+
+@contextmanager
+def fixed_time(module_name, enabled=True):
+	# Python exporters writing datetime.now() see writer.epoch instead
+	module = None
+	if enabled:
+		try:
+			module = importlib.import_module(module_name)
+		except ImportError:
+			pass
+
+	if module is None or not isinstance(getattr(module, 'datetime', None), types.ModuleType):
+		yield
+		return
+
+	original = module.datetime
+	module.datetime = types.SimpleNamespace(**vars(original))
+	module.datetime.datetime = FixedDatetime
+	try:
+		yield
+	finally:
+		module.datetime = original
+
+
 
 class Platform:
 	label = "Platform"
 	extension = 'fbx'
 
+	# FBX axis and scale settings
+	axis_forward = '-Z'
+	axis_up = 'Y'
+	scale_options = 'FBX_SCALE_NONE'
+	bake_space_transform = False
+
+	# Supports file_export_batch
+	batch = False
+
 	def __init__(self):
 		pass
 
@@ -23,6 +104,102 @@ class Platform:
 
 	def file_export(self, path):
 		print("{} export {}".format(self.label, path))
+
+
+	def file_export_deferred(self, path):
+		# Reads what the file needs from Blender and returns a function that
+		# writes it without bpy, for pipelined exports. None if the platform
+		# can only export directly.
+		return None
+
+
+	def get_objects(self):
+		# Objects to export, in name order for deterministic exports
+		objects = bpy.context.selected_objects
+		if is_deterministic():
+			objects = sorted(objects, key=lambda obj: obj.name)
+		return objects
+
+
+	def use_native_fbx(self, objects):
+		# Optional native writer for static meshes, set in the add-on preferences
+		addon = bpy.context.preferences.addons.get(__package__)
+		if not addon or not getattr(addon.preferences, "native_fbx", False):
+			return False
+		return writer.is_supported(objects)
+
+
+	def file_export_fbx(self, path):
+		objects = self.get_objects()
+		if self.use_native_fbx(objects):
+			writer_fbx.write(path, objects, **self.get_native_fbx_options())
+			return
+
+		# The stock exporter writes the current time into the header
+		with fixed_time("io_scene_fbx.export_fbx_bin", is_deterministic()):
+			bpy.ops.export_scene.fbx(filepath=path, batch_mode='OFF', **self.get_fbx_options())
+
+
+	def file_export_fbx_deferred(self, path):
+		# Only the native writer can write off the main thread
+		objects = self.get_objects()
+		if self.use_native_fbx(objects):
+			return writer_fbx.defer(path, objects, **self.get_native_fbx_options())
+		return None
+
+
+	def get_native_fbx_options(self):
+		return dict(
+			axis_forward	=self.axis_forward,
+			axis_up			=self.axis_up,
+			scale_options	=self.scale_options,
+			bake_space_transform = self.bake_space_transform,
+			smooth_type		='FACE',
+			timestamp		=writer.epoch if is_deterministic() else None
+		)
+
+
+	def is_batch_supported(self, objects):
+		# One exporter call for many bundles, when the stock exporter is used
+		return self.batch and not self.use_native_fbx(objects)
+
+
+	def file_export_batch(self, folder, collections):
+		# Every collection to folder/<collection>.fbx with a single exporter
+		# call. The exporter prefixes files with the basename of the path, the
+		# folder path leaves it empty. Only the scene the collections are
+		# linked into is walked, not the user's own collections.
+		with batch_scene(collections) as scene:
+			with bpy.context.temp_override(scene=scene, view_layer=scene.view_layers[0]):
+				with fixed_time("io_scene_fbx.export_fbx_bin", is_deterministic()):
+					bpy.ops.export_scene.fbx(
+						filepath		=os.path.join(folder, ""),
+						batch_mode		='ACTIVE_SCENE_COLLECTION',
+						use_batch_own_dir=False,
+						**dict(self.get_fbx_options(), use_selection=False)
+					)
+
+
+	def get_fbx_options(self):
+		# Settings shared by single and batch exports
+		return dict(
+			use_selection	=True,
+
+			axis_forward	=self.axis_forward,
+			axis_up			=self.axis_up,
+
+			object_types={'ARMATURE', 'MESH', 'OTHER', 'EMPTY'},
+
+			apply_scale_options = self.scale_options,
+			global_scale =1.00,
+			apply_unit_scale=True,
+
+			use_mesh_modifiers=True,
+			mesh_smooth_type = 'FACE',
+			use_custom_props=False,
+
+			bake_space_transform = self.bake_space_transform
+		)
 		
 
 
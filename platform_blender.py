@@ -2,6 +2,7 @@ import bpy
 import bmesh
 import operator
 import mathutils
+import re
 
 from . import platform
 
@@ -15,6 +16,7 @@ class Platform(platform.Platform):
 
 	def file_export(self, path):
 		# bpy.ops.export_scene.selected(exporter_str="BLEND", use_file_browser=True)
+		deterministic = platform.is_deterministic()
 		bpy.ops.wm.collada_export(
 			filepath		= path,
 			selected 		= True,
@@ -22,8 +24,11 @@ class Platform(platform.Platform):
 
 			include_children =False,
 			include_armatures=False,
-			include_shapekeys=True
+			include_shapekeys=True,
+			sort_by_name	= deterministic
 		)
+		if deterministic:
+			normalize_dates(path)
 		'''
 		bpy.ops.wm.collada_export(
 			filepath="",
@@ -66,4 +71,17 @@ class Platform(platform.Platform):
 			limit_precision=False,
 			keep_bind_info=False
 		)
-		'''
\ No newline at end of file
+		'''
+
+
+
+def normalize_dates(path):
+	# Created and modified dates of the asset header, set to writer.epoch
+	with open(path, 'r', encoding='utf-8') as file:
+		content = file.read()
+
+	date = platform.writer.epoch.isoformat()
+	content = re.sub(r"<(created|modified)>[^<]*</\1>", lambda match: "<{0}>{1}</{0}>".format(match.group(1), date), content)
+
+	with open(path, 'w', encoding='utf-8', newline='') as file:
+		file.write(content)
@@ -0,0 +1,49 @@
+import bpy
+import bmesh
+import operator
+import mathutils
+import addon_utils
+import imp
+
+from . import platform
+from . import writer
+from . import writer_glb
+
+imp.reload(writer_glb)
+
+class Platform(platform.Platform):
+	extension = 'glb'
+
+
+	def __init__(self):
+		super().__init__()
+		
+
+	def is_valid(self):
+		# Static meshes don't need the glTF add-on
+		return True, ""
+
+
+	def file_export(self, path):
+		objects = self.get_objects()
+		if writer.is_supported(objects):
+			return writer_glb.write(path, objects, quantize=bpy.context.scene.FBXBundleSettings.quantize)
+
+		# Skins, shape keys and animation
+		if not addon_utils.check("io_scene_gltf2")[1]:
+			raise RuntimeError("GLTF addon not enabled, needed for armatures, shape keys and animation")
+
+		bpy.ops.export_scene.gltf(
+			filepath		=path, 
+			export_format	='GLB',
+			use_selection	=True, 
+			
+			export_apply=True
+		)
+
+
+	def file_export_deferred(self, path):
+		objects = self.get_objects()
+		if writer.is_supported(objects):
+			return writer_glb.defer(path, objects, quantize=bpy.context.scene.FBXBundleSettings.quantize)
+		return None
@@ -3,8 +3,13 @@ import bmesh
 import operator
 import mathutils
 import addon_utils
+import imp
 
 from . import platform
+from . import writer
+from . import writer_glb
+
+imp.reload(writer_glb)
 
 class Platform(platform.Platform):
 	extension = 'gltf'
@@ -27,6 +32,11 @@ class Platform(platform.Platform):
 
 
 	def file_export(self, path):
+		# Blender's exporter can't quantize, static meshes use the add-on's writer
+		objects = self.get_objects()
+		if bpy.context.scene.FBXBundleSettings.quantize and writer.is_supported(objects):
+			return writer_glb.write(path, objects, quantize=True)
+
 		bpy.ops.export_scene.gltf(
 			filepath		=path, 
 			export_selected	=True, 
@@ -34,6 +44,13 @@ class Platform(platform.Platform):
 			export_apply=True
 		)
 
+
+	def file_export_deferred(self, path):
+		objects = self.get_objects()
+		if bpy.context.scene.FBXBundleSettings.quantize and writer.is_supported(objects):
+			return writer_glb.defer(path, objects, quantize=True)
+		return None
+
 		'''
 		bpy.ops.export_scene.gltf(
 			export_morph=True,
@@ -3,12 +3,22 @@ import bmesh
 import operator
 import mathutils
 import addon_utils
+import imp
 
 from . import platform
+from . import writer_obj
+
+imp.reload(writer_obj)
 
 class Platform(platform.Platform):
 	extension = 'obj'
 
+	# OBJ scale and axis settings
+	global_scale = 1
+	axis_forward = '-Z'
+	axis_up = 'Y'
+	use_triangles = False
+
 
 	def __init__(self):
 		super().__init__()
@@ -20,17 +30,22 @@ class Platform(platform.Platform):
 
 
 	def file_export(self, path):
-		bpy.ops.export_scene.obj(
-			filepath		=path,
-			use_selection=True,
-			use_mesh_modifiers=True,
-			use_smooth_groups=True,
-			use_triangles=False,
-			use_uvs=True,
-			use_materials=True,
-			global_scale=1,
-			axis_forward = '-Z',
-			axis_up = 'Y'
+		# The OBJ exporter operator was removed in Blender 4.0
+		writer_obj.write(path, self.get_objects(), **self.get_obj_options())
 
 
+	def file_export_deferred(self, path):
+		return writer_obj.defer(path, self.get_objects(), **self.get_obj_options())
+
+
+	def get_obj_options(self):
+		return dict(
+			global_scale	=self.global_scale,
+			axis_forward	=self.axis_forward,
+			axis_up			=self.axis_up,
+			use_triangles	=self.use_triangles,
+			use_smooth_groups=True,
+			use_uvs			=True,
+			use_normals		=True,
+			use_materials	=True
 		)
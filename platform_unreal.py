@@ -8,6 +8,12 @@ from . import platform
 class Platform(platform.Platform):
 	extension = 'fbx'
 
+	axis_forward = 'Y'
+	axis_up = 'Z'
+	scale_options = 'FBX_SCALE_NONE'
+	bake_space_transform = False
+	batch = True
+
 
 	def __init__(self):
 		super().__init__()
@@ -24,23 +30,8 @@ class Platform(platform.Platform):
 
 
 	def file_export(self, path):
-		bpy.ops.export_scene.fbx(
-			filepath		=path, 
-			use_selection	=True, 
-			
-			axis_forward	='Y', 
-			axis_up			='Z', 
-
-			object_types={'ARMATURE', 'MESH', 'EMPTY', 'OTHER'},
-
-			apply_scale_options = 'FBX_SCALE_NONE',
-			global_scale =1.00, 
-			apply_unit_scale=True,
+		self.file_export_fbx(path)
 
-			use_mesh_modifiers=True, 
-			mesh_smooth_type = 'FACE', 
-			batch_mode='OFF', 
-			use_custom_props=False,
 
- 			bake_space_transform = False
-		)
+	def file_export_deferred(self, path):
+		return self.file_export_fbx_deferred(path)
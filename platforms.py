@@ -8,6 +8,7 @@ from mathutils import Vector
 
 from . import platform_unity
 from . import platform_gltf
+from . import platform_glb
 from . import platform_unreal
 from . import platform_blender
 from . import platform_obj
@@ -17,6 +18,7 @@ from . import platform_houdini
 import imp
 imp.reload(platform_unity)
 imp.reload(platform_gltf)
+imp.reload(platform_glb)
 imp.reload(platform_unreal)
 imp.reload(platform_blender)
 imp.reload(platform_obj)
@@ -26,6 +28,7 @@ imp.reload(platform_houdini)
 platforms = {
 	'UNITY' : platform_unity.Platform(),
 	'GLTF' : platform_gltf.Platform(),
+	'GLB' : platform_glb.Platform(),
 	'UNREAL' : platform_unreal.Platform(),
 	'BLENDER' : platform_blender.Platform(),
 	'OBJ' : platform_obj.Platform(),
@@ -5,6 +5,25 @@ using UnityEngine;
 
 public class PostprocessorMeshes : AssetPostprocessor {
 
+	//Screen sizes written by the LOD modifier next to the model
+	[System.Serializable]
+	public class LODFile {
+		public LODFileGroup[] groups;
+	}
+
+	[System.Serializable]
+	public class LODFileGroup {
+		public string name;
+		public LODFileLevel[] levels;
+	}
+
+	[System.Serializable]
+	public class LODFileLevel {
+		public string name;
+		public int level;
+		public float screen_size;
+	}
+
 	protected ModelImporter ModelImporter {
 		get {
 			return (ModelImporter)assetImporter;
@@ -22,6 +41,64 @@ public class PostprocessorMeshes : AssetPostprocessor {
 
 	private void OnPostprocessModel(GameObject gameObject) {
 		MapMeshColliders(gameObject);
+		ApplyLODScreenSizes(gameObject);
+	}
+
+
+	private void ApplyLODScreenSizes(GameObject gameObject) {
+		string path = Path.ChangeExtension(assetPath, null) + ".lods.json";
+		if (!File.Exists(path)) {
+			return;
+		}
+		LODFile file = JsonUtility.FromJson<LODFile>(File.ReadAllText(path));
+		if (file == null || file.groups == null) {
+			return;
+		}
+
+		//Unity's own LODGroup from the _LODn names only covers one group per model
+		LODGroup existing = gameObject.GetComponent<LODGroup>();
+		if (existing != null) {
+			Object.DestroyImmediate(existing);
+		}
+
+		foreach (LODFileGroup group in file.groups) {
+			//Several groups get a parent each
+			GameObject target = gameObject;
+			if (file.groups.Length > 1) {
+				target = new GameObject(group.name);
+				target.transform.SetParent(gameObject.transform, false);
+			}
+
+			List<LOD> lods = new List<LOD>();
+			for (int i = 0; i < group.levels.Length; i++) {
+				Transform level = FindChild(gameObject.transform, group.levels[i].name);
+				if (level == null) {
+					continue;
+				}
+				if (target != gameObject) {
+					level.SetParent(target.transform, true);
+				}
+				//A level ends where the next one starts, the last one is culled at half its size
+				float height = i + 1 < group.levels.Length ? group.levels[i + 1].screen_size : group.levels[i].screen_size * 0.5f;
+				lods.Add(new LOD(height, level.GetComponentsInChildren<Renderer>()));
+			}
+
+			if (lods.Count > 0) {
+				LODGroup lodGroup = target.AddComponent<LODGroup>();
+				lodGroup.SetLODs(lods.ToArray());
+				lodGroup.RecalculateBounds();
+			}
+		}
+	}
+
+
+	private Transform FindChild(Transform parent, string name) {
+		foreach (Transform child in parent.GetComponentsInChildren<Transform>(true)) {
+			if (child.name == name) {
+				return child;
+			}
+		}
+		return null;
 	}
 
 
@@ -39,14 +116,26 @@ public class PostprocessorMeshes : AssetPostprocessor {
 
 		//Find COLLIDER renders and map to target render
 		foreach (Renderer render in renders) {
-			if (render.name.Contains("COLLIDER")) {
-				//Name to find
-				string name = render.name.Replace("_","").Replace(" ","").Replace("COLLIDER","");
-				if (nameRenders.ContainsKey(name)) {
-					//Found a match, add MeshCollider to target render
-					MeshCollider meshCollider = nameRenders[name].gameObject.AddComponent<MeshCollider>();
-					if (render.GetComponent<MeshFilter>()) {
-						meshCollider.sharedMesh = render.GetComponent<MeshFilter>().sharedMesh;
+			int index = render.name.IndexOf("COLLIDER");
+			if (index >= 0) {
+				//Name to find, and the shape after COLLIDER: BOX, SPHERE, CAPSULE, CONVEX or none for a mesh
+				string name = render.name.Substring(0, index).Replace("_","").Replace(" ","");
+				string[] suffix = render.name.Substring(index + "COLLIDER".Length).Split(new char[] {'_', ' '}, System.StringSplitOptions.RemoveEmptyEntries);
+				string shape = suffix.Length > 0 ? suffix[0] : "";
+				MeshFilter filter = render.GetComponent<MeshFilter>();
+				if (nameRenders.ContainsKey(name) && filter) {
+					GameObject target = nameRenders[name].gameObject;
+					if (shape == "BOX" || shape == "SPHERE" || shape == "CAPSULE") {
+						//Primitive on the collider's own transform, under the target render
+						AddPrimitiveCollider(render.gameObject, filter.sharedMesh.bounds, shape);
+						render.transform.SetParent(target.transform, true);
+						Object.DestroyImmediate(render);
+						Object.DestroyImmediate(filter);
+					} else {
+						//Found a match, add MeshCollider to target render
+						MeshCollider meshCollider = target.AddComponent<MeshCollider>();
+						meshCollider.sharedMesh = filter.sharedMesh;
+						meshCollider.convex = shape == "CONVEX";
 						destroy.Add(render.gameObject);
 					}
 				}
@@ -59,6 +148,28 @@ public class PostprocessorMeshes : AssetPostprocessor {
 	}
 
 
+	private void AddPrimitiveCollider(GameObject gameObject, Bounds bounds, string shape) {
+		Vector3 size = bounds.size;
+		if (shape == "BOX") {
+			BoxCollider box = gameObject.AddComponent<BoxCollider>();
+			box.center = bounds.center;
+			box.size = size;
+		} else if (shape == "SPHERE") {
+			SphereCollider sphere = gameObject.AddComponent<SphereCollider>();
+			sphere.center = bounds.center;
+			sphere.radius = Mathf.Max(size.x, size.y, size.z) / 2;
+		} else {
+			//Along the longest axis, as the capsule was fitted
+			CapsuleCollider capsule = gameObject.AddComponent<CapsuleCollider>();
+			int direction = size.x >= size.y && size.x >= size.z ? 0 : (size.y >= size.z ? 1 : 2);
+			capsule.center = bounds.center;
+			capsule.direction = direction;
+			capsule.height = size[direction];
+			capsule.radius = Mathf.Max(size[(direction + 1) % 3], size[(direction + 2) % 3]) / 2;
+		}
+	}
+
+
 	public Material OnAssignMaterialModel(Material material, Renderer renderer) {
 		string name = material.name;
 		if (name.Length > 0 && name.Contains(".")) {
@@ -0,0 +1,52 @@
+# export_output needs only the standard library, it is loaded by path
+
+import os
+import time
+import importlib.util
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def export_output():
+	path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "export_output.py")
+	spec = importlib.util.spec_from_file_location("export_output", path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+
+def write_lock(path, owner, age):
+	with open(path, 'w') as file:
+		file.write(owner)
+	os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_stale_lock_taken_over(export_output, tmp_path):
+	path = os.path.join(tmp_path, export_output.lock_filename)
+	write_lock(path, "crashed", 1000)
+
+	with export_output.lock(str(tmp_path), timeout=1, stale=100):
+		assert export_output.read_owner(path) == export_output.get_owner()
+	assert not os.path.exists(path)
+
+
+def test_fresh_lock_kept(export_output, tmp_path):
+	path = os.path.join(tmp_path, export_output.lock_filename)
+	write_lock(path, "other", 0)
+
+	export_output.remove_stale(path, 100)
+	assert export_output.read_owner(path) == "other"
+	assert os.listdir(tmp_path) == [export_output.lock_filename]
+
+	with pytest.raises(export_output.LockError):
+		with export_output.lock(str(tmp_path), timeout=0, stale=100):
+			pass
+
+
+def test_release_keeps_lock_of_others(export_output, tmp_path):
+	path = os.path.join(tmp_path, export_output.lock_filename)
+	with export_output.lock(str(tmp_path), timeout=1, stale=100):
+		# Taken over by another exporter while this one was still exporting
+		write_lock(path, "other", 0)
+	assert export_output.read_owner(path) == "other"
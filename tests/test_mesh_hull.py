@@ -0,0 +1,96 @@
+# mesh_hull needs only numpy, it is loaded by path
+
+import os
+import importlib.util
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope="module")
+def mesh_hull():
+	path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mesh_hull.py")
+	spec = importlib.util.spec_from_file_location("mesh_hull", path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+
+@pytest.fixture
+def points():
+	# Stretched and rotated cloud, so no shape lines up with the world axes
+	random = np.random.default_rng(7)
+	points = random.normal(size=(500, 3)) * (3.0, 1.0, 0.5)
+	angle = 0.6
+	rotation = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+	return points @ rotation.T + (1.0, -2.0, 0.5)
+
+
+def get_area(corners):
+	return np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1).sum() / 2
+
+
+def test_hull_closed_and_containing(mesh_hull, points):
+	hull = mesh_hull.convex_hull(points)
+
+	# Every edge is shared by two triangles, once in each direction
+	edges = [(face[i], face[(i + 1) % 3]) for face in hull.tolist() for i in range(3)]
+	assert len(set(edges)) == len(edges)
+	assert all((b, a) in set(edges) for a, b in edges)
+
+	# Outward facing, with every point inside or on it
+	normals, offsets = mesh_hull.get_planes(points, hull)
+	assert np.all(points @ normals.T - offsets <= 1e-9 + mesh_hull.get_tolerance(points))
+	assert np.all(points.mean(axis=0) @ normals.T - offsets < 0)
+
+
+def test_hull_max_vertices(mesh_hull, points):
+	hull = mesh_hull.convex_hull(points, max_vertices=12)
+	assert len(np.unique(hull)) <= 12
+
+
+def test_hull_flat(mesh_hull):
+	flat = np.random.default_rng(1).random((50, 3)) * (1, 1, 0)
+	assert mesh_hull.convex_hull(flat) is None
+
+
+def test_fit_box(mesh_hull, points):
+	matrix, half_sizes = mesh_hull.fit_box(points)
+	local = (points - matrix[:3, 3]) @ matrix[:3, :3]
+	assert np.all(np.abs(local) <= half_sizes + 1e-9)
+
+
+def test_fit_sphere(mesh_hull, points):
+	matrix, radius = mesh_hull.fit_sphere(points)
+	assert np.all(np.linalg.norm(points - matrix[:3, 3], axis=1) <= radius + 1e-9)
+
+
+def test_fit_capsule(mesh_hull, points):
+	matrix, radius, half_length = mesh_hull.fit_capsule(points)
+	frame = matrix[:3, :3]
+	assert np.allclose(frame.T @ frame, np.identity(3))
+	assert np.linalg.det(frame) > 0
+
+	# Every point within the radius of the segment along local Z
+	local = (points - matrix[:3, 3]) @ frame
+	heights = np.clip(local[:, 2], -half_length, half_length)
+	distances = np.linalg.norm(local - np.stack([np.zeros_like(heights), np.zeros_like(heights), heights], axis=1), axis=1)
+	assert np.all(distances <= radius + 1e-9)
+
+
+def test_clip(mesh_hull):
+	corners = np.array([
+		[(0, 0, 0), (1, 0, 0), (0, 1, 0)],		# below
+		[(0, 0, 3), (1, 0, 3), (0, 1, 3)],		# above
+		[(0, 0, 0), (1, 0, 2), (0, 1, 2)],		# one corner below
+		[(0, 0, 0), (1, 0, 0), (0, 1, 2)],		# two corners below
+	], dtype=np.float64)
+	left, right = mesh_hull.clip(corners, np.array([0.0, 0.0, 1.0]), 1.0)
+
+	# Whole triangles stay, crossing ones become a tip and a base of two
+	assert len(left) == 1 + 1 + 2
+	assert len(right) == 1 + 2 + 1
+	assert np.all(left[..., 2] <= 1 + 1e-9)
+	assert np.all(right[..., 2] >= 1 - 1e-9)
+	assert np.isclose(get_area(left) + get_area(right), get_area(corners))
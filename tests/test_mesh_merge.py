@@ -0,0 +1,121 @@
+# Runs inside Blender, skipped elsewhere:
+#
+#	blender -b --factory-startup --python-expr "import pytest; pytest.main(['tests'])"
+
+import os
+import sys
+import types
+import importlib
+
+import pytest
+
+bpy = pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+
+
+def import_addon():
+	path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	sys.path.insert(0, os.path.dirname(path))
+	addon = importlib.import_module(os.path.basename(path))
+	if not hasattr(bpy.types.Scene, "FBXBundleSettings"):
+		addon.register()
+	return addon
+
+
+@pytest.fixture(scope="module")
+def mesh_merge():
+	return importlib.import_module(import_addon().__name__ + ".mesh_merge")
+
+
+def get_quads(count, offset=0.0):
+	# Quads in a row along x, each its own 4 vertices
+	positions = []
+	for index in range(count):
+		x = index + offset
+		positions += [(x, 0, 0), (x + 1, 0, 0), (x + 1, 1, 0), (x, 1, 0)]
+	corners = np.arange(4 * count, dtype=np.int32)
+	return {
+		'positions'	: np.array(positions, dtype=np.float64),
+		'corners'	: corners,
+		'sizes'		: np.full(count, 4, dtype=np.int32),
+		'materials'	: np.arange(count, dtype=np.int32) % 2,
+		'smooth'	: np.zeros(count, dtype=bool),
+		'uvs'		: {'UVMap': np.zeros((len(corners), 2), dtype=np.float32)},
+		'colors'	: {},
+		'normals'	: None
+	}
+
+
+def test_weld(mesh_merge):
+	arrays = get_quads(3)
+	remap = mesh_merge.get_weld_remap(arrays['positions'], 0.001)
+	mesh_merge.apply_weld(arrays, remap)
+
+	# Shared edges of neighbouring quads become one pair of vertices
+	assert len(arrays['positions']) == 8
+	assert arrays['corners'].max() == 7
+	assert len(np.unique(arrays['positions'], axis=0)) == 8
+
+
+def test_weld_distance(mesh_merge):
+	positions = np.array([(0, 0, 0), (0.0005, 0, 0), (0.01, 0, 0)], dtype=np.float64)
+	assert mesh_merge.get_weld_remap(positions, 0.001).tolist() == [0, 0, 2]
+
+
+def test_select_faces(mesh_merge):
+	arrays = get_quads(3)
+	selected = mesh_merge.select_faces(arrays, np.array([True, False, True]))
+
+	assert selected['sizes'].tolist() == [4, 4]
+	assert selected['materials'].tolist() == [0, 0]
+	assert len(selected['positions']) == 8
+	assert len(selected['uvs']['UVMap']) == 8
+	assert np.array_equal(selected['positions'][selected['corners'][4:]], arrays['positions'][8:12])
+
+
+def test_chunks(mesh_merge):
+	arrays = get_quads(16)
+
+	chunks = mesh_merge.get_chunks(arrays, None, 16)
+	assert sorted(np.concatenate(chunks).tolist()) == list(range(16))
+	assert all(len(faces) * 4 <= 16 for faces in chunks)
+
+	# One chunk per grid cell of the face centers
+	chunks = mesh_merge.get_chunks(arrays, ((0, 0, 0), 4.0), 0)
+	assert [faces.tolist() for faces in chunks] == [list(range(start, start + 4)) for start in range(0, 16, 4)]
+
+
+def test_concatenate(mesh_merge):
+	parts = []
+	for index, arrays in enumerate((get_quads(1), get_quads(2, offset=5))):
+		part = types.SimpleNamespace(**arrays)
+		part.uvs = {} if index == 0 else arrays['uvs']
+		part.colors = {'Col': ('BYTE_COLOR', np.zeros((len(arrays['corners']), 4), dtype=np.float32))} if index == 0 else {}
+		parts.append(part)
+	merged = mesh_merge.concatenate(parts)
+
+	assert len(merged['positions']) == 12
+	assert merged['corners'][4:].tolist() == list(range(4, 12))
+	assert merged['sizes'].tolist() == [4, 4, 4]
+	# Layers a part doesn't have are filled in
+	assert np.all(merged['uvs']['UVMap'][:4] == 0)
+	assert merged['colors']['Col'][0] == 'BYTE_COLOR'
+	assert np.all(merged['colors']['Col'][1][4:] == 1)
+
+
+def test_merge_keeps_other_objects(mesh_merge):
+	collection = bpy.data.collections.new("Merge")
+	bpy.context.scene.collection.children.link(collection)
+	objects = []
+	for index in range(2):
+		mesh = bpy.data.meshes.new("Merge{}".format(index))
+		mesh.from_pydata([(index, 0, 0), (index + 1, 0, 0), (index, 1, 0)], [], [(0, 1, 2)])
+		objects.append(bpy.data.objects.new(mesh.name, mesh))
+	objects.append(bpy.data.objects.new("MergeEmpty", None))
+	for obj in objects:
+		collection.objects.link(obj)
+
+	result = mesh_merge.merge("Merged", objects)
+
+	assert [obj.name for obj in result] == ["Merged", "MergeEmpty"]
+	assert len(result[0].data.polygons) == 2
@@ -0,0 +1,68 @@
+# mesh_simplify needs only numpy, it is loaded by path like the workers do
+
+import os
+import sys
+import importlib.util
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope="module")
+def mesh_simplify():
+	path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mesh_simplify.py")
+	spec = importlib.util.spec_from_file_location("mesh_simplify", path)
+	module = importlib.util.module_from_spec(spec)
+	sys.modules["mesh_simplify"] = module
+	spec.loader.exec_module(module)
+	yield module
+	module.shutdown()
+	del sys.modules["mesh_simplify"]
+
+
+def get_grid(size):
+	# Gently curved grid with UVs, in the layout of mesh_merge
+	u, v = np.meshgrid(np.linspace(0, 1, size), np.linspace(0, 1, size))
+	positions = np.stack([u.ravel(), v.ravel(), (0.2 * np.sin(3 * u) * np.cos(2 * v)).ravel()], axis=1)
+	index = np.arange(size * size).reshape(size, size)
+	a, b, c, d = index[:-1, :-1].ravel(), index[:-1, 1:].ravel(), index[1:, 1:].ravel(), index[1:, :-1].ravel()
+	corners = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)]).ravel()
+	count = len(corners) // 3
+	return {
+		'positions'	: positions.astype(np.float32),
+		'corners'	: corners.astype(np.int32),
+		'sizes'		: np.full(count, 3, dtype=np.int32),
+		'materials'	: np.zeros(count, dtype=np.int32),
+		'smooth'	: np.ones(count, dtype=bool),
+		'uvs'		: {'UVMap': positions[corners, :2].astype(np.float32)},
+		'colors'	: {},
+		'normals'	: None
+	}
+
+
+def get_surface_normals(points):
+	# Normals of the curved surface, pointing up like the input triangles
+	du = 0.6 * np.cos(3 * points[:, 0]) * np.cos(2 * points[:, 1])
+	dv = -0.4 * np.sin(3 * points[:, 0]) * np.sin(2 * points[:, 1])
+	normals = np.stack([-du, -dv, np.ones(len(points))], axis=1)
+	return normals / np.linalg.norm(normals, axis=1)[:, None]
+
+
+def test_chain_keeps_normals(mesh_simplify):
+	targets = [1000, 800, 700, 600, 400]
+	for arrays in mesh_simplify.simplify_chain(get_grid(40), targets):
+		points = arrays['positions'].astype(np.float64)[arrays['corners'].reshape(-1, 3)]
+		normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+		normals /= np.linalg.norm(normals, axis=1)[:, None]
+		assert np.all(np.sum(normals * get_surface_normals(points.mean(axis=1)), axis=1) > 0)
+
+
+def test_chains_in_workers(mesh_simplify):
+	tasks = [(get_grid(12), [100, 50]), (get_grid(16), [200, 100])]
+	results = mesh_simplify.simplify_chains(tasks)
+	# The pool is dropped when simplifying falls back to this process
+	assert mesh_simplify.pool is not None
+	for chain, (arrays, targets) in zip(results, tasks):
+		expected = mesh_simplify.simplify_chain(arrays, targets)
+		assert [len(result['sizes']) for result in chain] == [len(result['sizes']) for result in expected]
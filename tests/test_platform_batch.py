@@ -0,0 +1,51 @@
+# Runs inside Blender, skipped elsewhere:
+#
+#	blender -b --factory-startup --python-expr "import pytest; pytest.main(['tests'])"
+
+import os
+import sys
+import importlib
+
+import pytest
+
+bpy = pytest.importorskip("bpy")
+
+
+def import_addon():
+	path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	sys.path.insert(0, os.path.dirname(path))
+	addon = importlib.import_module(os.path.basename(path))
+	if not hasattr(bpy.types.Scene, "FBXBundleSettings"):
+		addon.register()
+	return addon
+
+
+def add_cube(name, collection):
+	mesh = bpy.data.meshes.new(name)
+	mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+	obj = bpy.data.objects.new(name, mesh)
+	collection.objects.link(obj)
+	return obj
+
+
+def test_batch_writes_staged_collections_only(tmp_path):
+	addon = import_addon()
+	platform = importlib.import_module(addon.__name__ + ".platforms").platforms['UNITY']
+
+	# A collection of the user's that must not be written
+	user = bpy.data.collections.new("Props")
+	bpy.context.scene.collection.children.link(user)
+	add_cube("Prop", user)
+
+	staged = []
+	for index in range(2):
+		collection = bpy.data.collections.new("FBXBundle_Batch_{:04d}".format(index))
+		bpy.context.scene.collection.children.link(collection)
+		add_cube("Bundle{}".format(index), collection)
+		staged.append(collection)
+
+	scenes = len(bpy.data.scenes)
+	platform.file_export_batch(str(tmp_path), staged)
+
+	assert sorted(os.listdir(tmp_path)) == ["FBXBundle_Batch_0000.fbx", "FBXBundle_Batch_0001.fbx"]
+	assert len(bpy.data.scenes) == scenes
@@ -0,0 +1,83 @@
+import bpy
+import datetime
+import numpy as np
+
+
+# Helpers shared by the native writers
+
+# Creation time written by deterministic exports
+epoch = datetime.datetime(2000, 1, 1)
+
+
+def is_supported(objects):
+	# Static meshes and empties, anything else needs the stock exporter
+	for obj in objects:
+		if obj.type not in ('MESH', 'EMPTY'):
+			return False
+		if obj.animation_data and obj.animation_data.action:
+			return False
+		if obj.type == 'EMPTY' and obj.instance_type == 'COLLECTION' and obj.instance_collection:
+			return False
+		if obj.type == 'MESH':
+			if obj.data.shape_keys:
+				return False
+			if any(mod.type == 'ARMATURE' for mod in obj.modifiers):
+				return False
+	return True
+
+
+
+def get_local_matrix(obj, objects):
+	# Relative to the parent if that is written too, else the world matrix.
+	# Returns the matrix and whether the object is a root.
+	if obj.parent in objects:
+		return obj.parent.matrix_world.inverted_safe() @ obj.matrix_world, False
+	return obj.matrix_world.copy(), True
+
+
+
+def get_indexed(values):
+	# Unique rows and the index of each input row into them
+	unique, lookup = np.unique(values, axis=0, return_inverse=True)
+	return unique, lookup.reshape(-1).astype(np.int32)
+
+
+
+def get_materials(obj):
+	# Used materials in slot order, without empty slots or duplicates
+	materials = []
+	for slot in obj.material_slots:
+		if slot.material and slot.material not in materials:
+			materials.append(slot.material)
+	return materials
+
+
+
+def get_material_indices(obj, indices):
+	# Slot indices to indices into get_materials(obj)
+	materials = get_materials(obj)
+	remap = np.zeros(max(1, len(obj.material_slots)), dtype=np.int32)
+	for index, slot in enumerate(obj.material_slots):
+		if slot.material:
+			remap[index] = materials.index(slot.material)
+
+	return remap[np.clip(indices, 0, len(remap) - 1)]
+
+
+
+def get_material_values(material):
+	# Base color, metallic and roughness of the Principled BSDF if there is one
+	color = list(material.diffuse_color)
+	metallic = material.metallic
+	roughness = material.roughness
+
+	if material.use_nodes and material.node_tree:
+		for node in material.node_tree.nodes:
+			if node.bl_idname == 'ShaderNodeBsdfPrincipled':
+				color = list(node.inputs['Base Color'].default_value)
+				color[3] = node.inputs['Alpha'].default_value
+				metallic = node.inputs['Metallic'].default_value
+				roughness = node.inputs['Roughness'].default_value
+				break
+
+	return [float(v) for v in color], float(metallic), float(roughness)
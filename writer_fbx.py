@@ -0,0 +1,489 @@
+import bpy
+import zlib
+import datetime
+import struct
+import itertools
+import numpy as np
+from mathutils import Matrix
+from bpy_extras.io_utils import axis_conversion
+
+from . import mesh_arrays
+from . import writer
+
+
+# Binary FBX 7.4 writer for static meshes and empties. Mesh attributes are
+# read with foreach_get and written as whole arrays, instead of the per
+# vertex Python loops of the stock exporter. Axis and scale options follow
+# bpy.ops.export_scene.fbx with apply_unit_scale enabled.
+
+version = 7400
+header = b"Kaydara FBX Binary  \x00\x1a\x00"
+
+# Fixed values the FBX SDK checks against each other, same as Blender's exporter
+file_id = b"\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1"
+creation_time = "1970-01-01 10:00:00:000"
+footer_id = b"\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e"
+footer_magic = b"\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b"
+sentinel = b"\x00" * 13
+
+array_types = {
+	np.dtype(np.float64)	: b'd',
+	np.dtype(np.float32)	: b'f',
+	np.dtype(np.int32)		: b'i',
+	np.dtype(np.int64)		: b'l',
+	np.dtype(np.bool_)		: b'b',
+}
+# Arrays above this many bytes are zlib compressed
+compress_size = 128
+
+
+class Int64(int):
+	# Written as 64 bit integer, used for ids and times
+	pass
+
+
+
+class Node:
+	def __init__(self, name, *props):
+		self.name = name.encode()
+		self.props = props
+		self.children = []
+
+
+	def add(self, name, *props):
+		child = Node(name, *props)
+		self.children.append(child)
+		return child
+
+
+	def add_property(self, name, type, label, flags, *values):
+		# Entry of a Properties70 node
+		return self.add("P", name, type, label, flags, *values)
+
+
+
+def encode_property(value):
+	if isinstance(value, bool):
+		return b'C' + struct.pack('<?', value)
+	if isinstance(value, Int64):
+		return b'L' + struct.pack('<q', value)
+	if isinstance(value, int):
+		return b'I' + struct.pack('<i', value)
+	if isinstance(value, float):
+		return b'D' + struct.pack('<d', value)
+	if isinstance(value, str):
+		value = value.encode()
+		return b'S' + struct.pack('<I', len(value)) + value
+	if isinstance(value, bytes):
+		return b'R' + struct.pack('<I', len(value)) + value
+	if isinstance(value, np.ndarray):
+		data = np.ascontiguousarray(value).tobytes()
+		encoding = 0
+		if len(data) > compress_size:
+			data = zlib.compress(data, 1)
+			encoding = 1
+		return array_types[value.dtype] + struct.pack('<III', value.size, encoding, len(data)) + data
+	raise TypeError("Can't write {} to FBX".format(type(value)))
+
+
+
+def write_node(file, node):
+	# End offset is patched in once the children are written
+	props = [encode_property(value) for value in node.props]
+	start = file.tell()
+	file.write(struct.pack('<IIIB', 0, len(props), sum(len(prop) for prop in props), len(node.name)))
+	file.write(node.name)
+	for prop in props:
+		file.write(prop)
+
+	for child in node.children:
+		write_node(file, child)
+	if node.children or not node.props:
+		file.write(sentinel)
+
+	end = file.tell()
+	file.seek(start)
+	file.write(struct.pack('<I', end))
+	file.seek(end)
+
+
+
+def write_file(path, nodes):
+	with open(path, 'wb') as file:
+		file.write(header)
+		file.write(struct.pack('<I', version))
+		for node in nodes:
+			write_node(file, node)
+		file.write(sentinel)
+
+		file.write(footer_id)
+		file.write(b"\x00" * 4)
+		# Pad to 16 bytes, a full 16 if already aligned
+		padding = ((file.tell() + 15) & ~15) - file.tell()
+		file.write(b"\x00" * (padding or 16))
+		file.write(struct.pack('<I', version))
+		file.write(b"\x00" * 120)
+		file.write(footer_magic)
+
+
+
+def get_axes(axis_forward, axis_up):
+	# FBX up, front and coordinate axes as (index, sign), front points
+	# opposite of the forward axis and coord = front x up
+	axes = {'X': 0, 'Y': 1, 'Z': 2}
+	up = (axes[axis_up[-1]], -1 if axis_up.startswith('-') else 1)
+	front = (axes[axis_forward[-1]], 1 if axis_forward.startswith('-') else -1)
+
+	vector_up = [0, 0, 0]
+	vector_up[up[0]] = up[1]
+	vector_front = [0, 0, 0]
+	vector_front[front[0]] = front[1]
+	coord = np.cross(vector_front, vector_up)
+	index = int(np.flatnonzero(coord)[0])
+	return up, front, (index, int(coord[index]))
+
+
+
+def write(path, objects, **options):
+	write_file(path, get_nodes(path, objects, **options))
+
+
+
+def defer(path, objects, **options):
+	# Reads the objects now and returns a function writing the file later,
+	# without touching bpy, so it can run on another thread
+	nodes = get_nodes(path, objects, **options)
+	return lambda: write_file(path, nodes)
+
+
+
+def get_nodes(path, objects, axis_forward='-Z', axis_up='Y', scale_options='FBX_SCALE_NONE', bake_space_transform=False, smooth_type='FACE', depsgraph=None, timestamp=None):
+	scene = bpy.context.scene
+	depsgraph = depsgraph or bpy.context.evaluated_depsgraph_get()
+
+	# Same global matrix and unit scale as the stock exporter
+	global_matrix = axis_conversion(to_forward=axis_forward, to_up=axis_up).to_4x4()
+	unit_scale = 1.0 if scene.unit_settings.system == 'NONE' else 100.0 * scene.unit_settings.scale_length
+	unit_scale_original = unit_scale
+	if scale_options == 'FBX_SCALE_NONE':
+		global_matrix = Matrix.Scale(unit_scale, 4) @ global_matrix
+		unit_scale = 1.0
+
+	fbx = Writer(objects, global_matrix, bake_space_transform, smooth_type, depsgraph)
+	for obj in objects:
+		fbx.add_object(obj)
+
+	return [
+		get_header(path, timestamp or datetime.datetime.now()),
+		Node("FileId", file_id),
+		Node("CreationTime", creation_time),
+		Node("Creator", "FBX Bundle"),
+		get_global_settings(axis_forward, axis_up, unit_scale, unit_scale_original),
+		get_documents(fbx),
+		Node("References"),
+		fbx.get_definitions(),
+		fbx.nodes,
+		fbx.connections,
+		get_takes()
+	]
+
+
+
+class Writer:
+	# Objects and connections of one file
+
+	def __init__(self, objects, global_matrix, bake_space_transform, smooth_type, depsgraph):
+		self.objects = set(objects)
+		self.global_matrix = global_matrix
+		self.global_matrix_inverse = global_matrix.inverted_safe()
+		self.bake_space_transform = bake_space_transform
+		self.smooth_type = smooth_type
+		self.depsgraph = depsgraph
+
+		self.ids = itertools.count(1000000)
+		self.nodes = Node("Objects")
+		self.connections = Node("Connections")
+		self.counts = {}
+		self.materials = {}
+		self.models = {}
+
+
+	def get_id(self):
+		return Int64(next(self.ids))
+
+
+	def count(self, type):
+		self.counts[type] = self.counts.get(type, 0) + 1
+
+
+	def connect(self, child, parent):
+		self.connections.add("C", "OO", child, parent)
+
+
+	def add_object(self, obj):
+		model = self.get_model_id(obj)
+		node = self.nodes.add("Model", model, obj.name + "\x00\x01Model", "Mesh" if obj.type == 'MESH' else "Null")
+		self.count("Model")
+		node.add("Version", 232)
+
+		location, rotation, scale = self.get_matrix(obj).decompose()
+		rotation = np.degrees(rotation.to_euler('XYZ'))
+		properties = node.add("Properties70")
+		properties.add_property("Lcl Translation", "Lcl Translation", "", "A", *[float(v) for v in location])
+		properties.add_property("Lcl Rotation", "Lcl Rotation", "", "A", *[float(v) for v in rotation])
+		properties.add_property("Lcl Scaling", "Lcl Scaling", "", "A", *[float(v) for v in scale])
+		properties.add_property("InheritType", "enum", "", "", 1)
+		if obj.type == 'MESH':
+			properties.add_property("DefaultAttributeIndex", "int", "Integer", "", 0)
+
+		node.add("MultiLayer", 0)
+		node.add("MultiTake", 0)
+		node.add("Shading", True)
+		node.add("Culling", "CullingOff")
+
+		self.connect(model, self.get_model_id(obj.parent) if obj.parent in self.objects else Int64(0))
+
+		if obj.type == 'MESH':
+			self.add_mesh(obj, model)
+		else:
+			attribute = self.get_id()
+			node = self.nodes.add("NodeAttribute", attribute, "\x00\x01NodeAttribute", "Null")
+			self.count("NodeAttribute")
+			node.add("TypeFlags", "Null")
+			self.connect(attribute, model)
+
+
+	def get_model_id(self, obj):
+		if obj not in self.models:
+			self.models[obj] = self.get_id()
+		return self.models[obj]
+
+
+	def get_matrix(self, obj):
+		matrix, is_root = writer.get_local_matrix(obj, self.objects)
+
+		if self.bake_space_transform:
+			return self.global_matrix @ matrix @ self.global_matrix_inverse
+		if is_root:
+			return self.global_matrix @ matrix
+		return matrix
+
+
+	def add_mesh(self, obj, model):
+		obj_eval = obj.evaluated_get(self.depsgraph)
+		mesh = obj_eval.to_mesh()
+		try:
+			self.add_geometry(obj, mesh, model)
+		finally:
+			obj_eval.to_mesh_clear()
+
+		# Materials in slot order, connection order is the material index
+		for material in writer.get_materials(obj):
+			self.connect(self.get_material_id(material), model)
+
+
+	def add_geometry(self, obj, mesh, model):
+		geometry = self.get_id()
+		node = self.nodes.add("Geometry", geometry, obj.data.name + "\x00\x01Geometry", "Mesh")
+		self.count("Geometry")
+		node.add("Properties70")
+		node.add("GeometryVersion", 124)
+
+		positions = mesh_arrays.get_positions(mesh).astype(np.float64)
+		normals = mesh_arrays.get_corner_normals(mesh).astype(np.float64)
+		if self.bake_space_transform:
+			matrix = np.array(self.global_matrix.to_3x3())
+			positions = positions @ matrix.T
+			normals = normals @ np.linalg.inv(matrix)
+			normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+		# Last corner of each face is stored as -(index + 1)
+		indices = mesh_arrays.get_corner_verts(mesh).copy()
+		sizes = mesh_arrays.get_face_sizes(mesh)
+		last = mesh_arrays.get_face_starts(mesh) + sizes - 1
+		indices[last] = ~indices[last]
+
+		node.add("Vertices", positions.ravel())
+		node.add("PolygonVertexIndex", indices)
+
+		layers = [[]]
+
+		element = node.add("LayerElementNormal", 0)
+		element.add("Version", 101)
+		element.add("Name", "")
+		element.add("MappingInformationType", "ByPolygonVertex")
+		element.add("ReferenceInformationType", "Direct")
+		element.add("Normals", normals.ravel())
+		layers[0].append("LayerElementNormal")
+
+		if self.smooth_type == 'FACE':
+			element = node.add("LayerElementSmoothing", 0)
+			element.add("Version", 102)
+			element.add("Name", "")
+			element.add("MappingInformationType", "ByPolygon")
+			element.add("ReferenceInformationType", "Direct")
+			element.add("Smoothing", mesh_arrays.get_face_smooth(mesh).astype(np.int32))
+			layers[0].append("LayerElementSmoothing")
+
+		for index, layer in enumerate(mesh_arrays.get_color_layers(mesh)):
+			values, lookup = writer.get_indexed(mesh_arrays.get_colors(mesh, layer).astype(np.float64))
+			element = node.add("LayerElementColor", index)
+			element.add("Version", 101)
+			element.add("Name", layer.name)
+			element.add("MappingInformationType", "ByPolygonVertex")
+			element.add("ReferenceInformationType", "IndexToDirect")
+			element.add("Colors", values.ravel())
+			element.add("ColorIndex", lookup)
+			add_layer(layers, index, "LayerElementColor")
+
+		for index, layer in enumerate(mesh.uv_layers):
+			values, lookup = writer.get_indexed(mesh_arrays.get_uvs(mesh, layer).astype(np.float64))
+			element = node.add("LayerElementUV", index)
+			element.add("Version", 101)
+			element.add("Name", layer.name)
+			element.add("MappingInformationType", "ByPolygonVertex")
+			element.add("ReferenceInformationType", "IndexToDirect")
+			element.add("UV", values.ravel())
+			element.add("UVIndex", lookup)
+			add_layer(layers, index, "LayerElementUV")
+
+		materials = writer.get_materials(obj)
+		if len(materials) > 0:
+			element = node.add("LayerElementMaterial", 0)
+			element.add("Version", 101)
+			element.add("Name", "")
+			element.add("MappingInformationType", "ByPolygon")
+			element.add("ReferenceInformationType", "IndexToDirect")
+			element.add("Materials", writer.get_material_indices(obj, mesh_arrays.get_material_indices(mesh)))
+			layers[0].append("LayerElementMaterial")
+
+		for index, types in enumerate(layers):
+			layer = node.add("Layer", index)
+			layer.add("Version", 100)
+			for type in types:
+				element = layer.add("LayerElement")
+				element.add("Type", type)
+				element.add("TypedIndex", index)
+
+		self.connect(geometry, model)
+
+
+	def get_material_id(self, material):
+		if material in self.materials:
+			return self.materials[material]
+
+		id = self.materials[material] = self.get_id()
+		node = self.nodes.add("Material", id, material.name + "\x00\x01Material", "")
+		self.count("Material")
+		node.add("Version", 102)
+		node.add("ShadingModel", "Phong")
+		node.add("MultiLayer", 0)
+
+		color, metallic, roughness = writer.get_material_values(material)
+		properties = node.add("Properties70")
+		properties.add_property("ShadingModel", "KString", "", "", "Phong")
+		properties.add_property("DiffuseColor", "Color", "", "A", *color[:3])
+		properties.add_property("DiffuseFactor", "Number", "", "A", 1.0)
+		properties.add_property("TransparencyFactor", "Number", "", "A", 1.0 - color[3])
+		properties.add_property("Opacity", "double", "Number", "", color[3])
+		properties.add_property("ReflectionFactor", "Number", "", "A", metallic)
+		properties.add_property("Shininess", "double", "Number", "", (1.0 - roughness) * 100.0)
+		properties.add_property("ShininessExponent", "Number", "", "A", (1.0 - roughness) * 100.0)
+		return id
+
+
+	def get_definitions(self):
+		node = Node("Definitions")
+		node.add("Version", 100)
+		node.add("Count", 1 + sum(self.counts.values()))
+
+		object_type = node.add("ObjectType", "GlobalSettings")
+		object_type.add("Count", 1)
+		for type, count in self.counts.items():
+			object_type = node.add("ObjectType", type)
+			object_type.add("Count", count)
+		return node
+
+
+
+def add_layer(layers, index, type):
+	while len(layers) <= index:
+		layers.append([])
+	layers[index].append(type)
+
+
+
+def get_header(path, timestamp):
+	node = Node("FBXHeaderExtension")
+	node.add("FBXHeaderVersion", 1003)
+	node.add("FBXVersion", version)
+	node.add("EncryptionType", 0)
+
+	stamp = node.add("CreationTimeStamp")
+	stamp.add("Version", 1000)
+	stamp.add("Year", timestamp.year)
+	stamp.add("Month", timestamp.month)
+	stamp.add("Day", timestamp.day)
+	stamp.add("Hour", timestamp.hour)
+	stamp.add("Minute", timestamp.minute)
+	stamp.add("Second", timestamp.second)
+	stamp.add("Millisecond", 0)
+
+	node.add("Creator", "FBX Bundle")
+
+	info = node.add("SceneInfo", "GlobalInfo\x00\x01SceneInfo", "UserData")
+	info.add("Type", "UserData")
+	info.add("Version", 100)
+	meta = info.add("MetaData")
+	meta.add("Version", 100)
+	for key in ("Title", "Subject", "Author", "Keywords", "Revision", "Comment"):
+		meta.add(key, "")
+	properties = info.add("Properties70")
+	properties.add_property("DocumentUrl", "KString", "Url", "", path)
+	properties.add_property("SrcDocumentUrl", "KString", "Url", "", path)
+	return node
+
+
+
+def get_global_settings(axis_forward, axis_up, unit_scale, unit_scale_original):
+	up, front, coord = get_axes(axis_forward, axis_up)
+
+	node = Node("GlobalSettings")
+	node.add("Version", 1000)
+	properties = node.add("Properties70")
+	properties.add_property("UpAxis", "int", "Integer", "", up[0])
+	properties.add_property("UpAxisSign", "int", "Integer", "", up[1])
+	properties.add_property("FrontAxis", "int", "Integer", "", front[0])
+	properties.add_property("FrontAxisSign", "int", "Integer", "", front[1])
+	properties.add_property("CoordAxis", "int", "Integer", "", coord[0])
+	properties.add_property("CoordAxisSign", "int", "Integer", "", coord[1])
+	properties.add_property("OriginalUpAxis", "int", "Integer", "", -1)
+	properties.add_property("OriginalUpAxisSign", "int", "Integer", "", 1)
+	properties.add_property("UnitScaleFactor", "double", "Number", "", float(unit_scale))
+	properties.add_property("OriginalUnitScaleFactor", "double", "Number", "", float(unit_scale_original))
+	properties.add_property("AmbientColor", "ColorRGB", "Color", "", 0.0, 0.0, 0.0)
+	properties.add_property("DefaultCamera", "KString", "", "", "Producer Perspective")
+	properties.add_property("TimeMode", "enum", "", "", 11)
+	properties.add_property("TimeSpanStart", "KTime", "Time", "", Int64(0))
+	properties.add_property("TimeSpanStop", "KTime", "Time", "", Int64(46186158000))
+	properties.add_property("CustomFrameRate", "double", "Number", "", -1.0)
+	return node
+
+
+
+def get_documents(fbx):
+	node = Node("Documents")
+	node.add("Count", 1)
+	document = node.add("Document", fbx.get_id(), "Scene", "Scene")
+	properties = document.add("Properties70")
+	properties.add_property("SourceObject", "object", "", "")
+	properties.add_property("ActiveAnimStackName", "KString", "", "", "")
+	document.add("RootNode", Int64(0))
+	return node
+
+
+
+def get_takes():
+	node = Node("Takes")
+	node.add("Current", "")
+	return node
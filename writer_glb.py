@@ -0,0 +1,445 @@
+import bpy
+import os
+import json
+import struct
+import shutil
+import tempfile
+import numpy as np
+from mathutils import Matrix, Vector
+
+from . import mesh_arrays
+from . import writer
+
+
+# Binary glTF 2.0 writer for static meshes and empties. Vertex and index
+# buffers are built from foreach_get arrays and spooled to a temporary file
+# as they are made, the .glb is assembled from it once the JSON is known.
+# Meshes shared by several objects are written once. With 'quantize' vertex
+# attributes are stored as 8 and 16 bit integers (KHR_mesh_quantization).
+
+# Blender Z up to glTF Y up
+axis_matrix = Matrix((
+	(1, 0, 0, 0),
+	(0, 0, 1, 0),
+	(0, -1, 0, 0),
+	(0, 0, 0, 1)
+))
+
+component_types = {
+	np.dtype(np.int8)		: 5120,
+	np.dtype(np.uint8)		: 5121,
+	np.dtype(np.int16)		: 5122,
+	np.dtype(np.uint16)		: 5123,
+	np.dtype(np.uint32)		: 5125,
+	np.dtype(np.float32)	: 5126,
+}
+element_types = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4'}
+
+target_vertices = 34962
+target_indices = 34963
+
+chunk_json = 0x4E4F534A
+chunk_bin = 0x004E4942
+
+extension_quantization = "KHR_mesh_quantization"
+
+
+class Buffer:
+	# Binary chunk spooled to disk, arrays are written without copies. Without
+	# 'spool' the arrays are kept in memory until the file is written.
+
+	def __init__(self, spool=True):
+		self.file = tempfile.TemporaryFile() if spool else None
+		self.arrays = []
+		self.length = 0
+		# Length with float32 attributes and uint32 indices, for the report
+		self.length_unquantized = 0
+		self.views = []
+		self.accessors = []
+
+
+	def add_view(self, array, target=None, stride=None):
+		padding = -self.length % 4
+		if padding:
+			self.write(b"\x00" * padding)
+			self.length += padding
+
+		array = np.ascontiguousarray(array)
+		self.write(array.data)
+
+		view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': array.nbytes}
+		if target:
+			view['target'] = target
+		if stride:
+			view['byteStride'] = stride
+		self.views.append(view)
+		self.length += array.nbytes
+		return len(self.views) - 1
+
+
+	def add_accessor(self, array, target=None, bounds=False, normalized=False, components=None):
+		# Arrays with more columns than 'components' are padded for the
+		# 4 byte alignment of vertex attributes
+		columns = 1 if array.ndim == 1 else array.shape[1]
+		components = components or columns
+		stride = array.itemsize * columns if components < columns else None
+		accessor = {
+			'bufferView': self.add_view(array, target, stride),
+			'componentType': component_types[array.dtype],
+			'count': len(array),
+			'type': element_types[components]
+		}
+		if bounds:
+			values = array[:, :components] if array.ndim > 1 else array
+			accessor['min'] = values.min(axis=0).reshape(-1).tolist()
+			accessor['max'] = values.max(axis=0).reshape(-1).tolist()
+		if normalized:
+			accessor['normalized'] = True
+		self.accessors.append(accessor)
+		self.length_unquantized += len(array) * components * 4
+		return len(self.accessors) - 1
+
+
+	def write(self, data):
+		if self.file:
+			self.file.write(data)
+		else:
+			self.arrays.append(data)
+
+
+	def copy_to(self, file):
+		if self.file:
+			self.file.seek(0)
+			shutil.copyfileobj(self.file, file, 1 << 20)
+		else:
+			for data in self.arrays:
+				file.write(data)
+		file.write(b"\x00" * (-self.length % 4))
+
+
+	def close(self):
+		if self.file:
+			self.file.close()
+		self.arrays = []
+
+
+
+def write(path, objects, depsgraph=None, quantize=False):
+	# Writes .glb, or .gltf with a .bin next to it. Returns buffer sizes.
+	return prepare(objects, depsgraph, quantize, spool=True)(path)
+
+
+
+def defer(path, objects, depsgraph=None, quantize=False):
+	# Reads the objects now and returns a function writing the file later,
+	# without touching bpy, so it can run on another thread
+	finish = prepare(objects, depsgraph, quantize, spool=False)
+	return lambda: finish(path)
+
+
+
+def prepare(objects, depsgraph, quantize, spool):
+	depsgraph = depsgraph or bpy.context.evaluated_depsgraph_get()
+
+	glb = Writer(objects, depsgraph, quantize, spool)
+	try:
+		for obj in objects:
+			glb.add_object(obj)
+		glb.add_hierarchy()
+		glb.release()
+	except Exception:
+		glb.buffer.close()
+		raise
+
+	def finish(path):
+		try:
+			glb.write(path)
+		finally:
+			glb.buffer.close()
+		return {
+			'buffer_bytes': glb.buffer.length,
+			'buffer_bytes_unquantized': glb.buffer.length_unquantized
+		}
+
+	return finish
+
+
+
+class Writer:
+	# Nodes, meshes and materials of one file
+
+	def __init__(self, objects, depsgraph, quantize=False, spool=True):
+		self.objects = set(objects)
+		self.depsgraph = depsgraph
+		self.quantize = quantize
+		self.buffer = Buffer(spool)
+
+		self.nodes = []
+		self.roots = []
+		self.node_matrices = []
+		self.dequantize = {}
+		self.node_indices = {}
+		self.meshes = []
+		self.mesh_indices = {}
+		self.materials = []
+		self.material_indices = {}
+
+
+	def add_object(self, obj):
+		matrix, is_root = writer.get_local_matrix(obj, self.objects)
+		matrix = axis_matrix @ matrix @ axis_matrix.inverted()
+
+		node = {'name': obj.name}
+		set_transform(node, matrix)
+
+		if obj.type == 'MESH':
+			mesh = self.get_mesh_index(obj)
+			if mesh is not None:
+				node['mesh'] = mesh
+
+		self.node_indices[obj] = len(self.nodes)
+		self.nodes.append(node)
+		self.node_matrices.append(matrix)
+
+
+	def get_mesh_index(self, obj):
+		# Unmodified objects share the written mesh of their data
+		materials = writer.get_materials(obj)
+		key = obj if len(obj.modifiers) > 0 else (obj.data, tuple(materials))
+		if key in self.mesh_indices:
+			return self.mesh_indices[key]
+
+		if len(obj.modifiers) > 0:
+			obj_eval = obj.evaluated_get(self.depsgraph)
+			try:
+				index = self.add_mesh(obj, obj_eval.to_mesh(), materials)
+			finally:
+				obj_eval.to_mesh_clear()
+		else:
+			index = self.add_mesh(obj, obj.data, materials)
+
+		self.mesh_indices[key] = index
+		return index
+
+
+	def add_mesh(self, obj, mesh, materials):
+		corners, triangle_materials = mesh_arrays.get_triangles(mesh)
+		if len(corners) == 0:
+			return None
+
+		# Per corner attributes, merged into vertices where all of them match
+		axis = np.array(axis_matrix.to_3x3(), dtype=np.float32)
+		columns = [
+			mesh_arrays.get_positions(mesh)[mesh_arrays.get_corner_verts(mesh)] @ axis.T,
+			mesh_arrays.get_corner_normals(mesh) @ axis.T
+		]
+		for layer in mesh.uv_layers:
+			uvs = mesh_arrays.get_uvs(mesh, layer)
+			columns.append(np.stack([uvs[:, 0], 1.0 - uvs[:, 1]], axis=1))
+		color_layers = mesh_arrays.get_color_layers(mesh)[:1]
+		for layer in color_layers:
+			columns.append(mesh_arrays.get_colors(mesh, layer, srgb=False))
+
+		vertices, lookup = get_vertices(np.concatenate(columns, axis=1).astype(np.float32))
+
+		attributes = {}
+		if self.quantize:
+			positions, low, scale = quantize_positions(vertices[:, 0:3])
+			attributes['POSITION'] = self.buffer.add_accessor(positions, target_vertices, bounds=True, components=3)
+			attributes['NORMAL'] = self.buffer.add_accessor(quantize_normals(vertices[:, 3:6]), target_vertices, normalized=True, components=3)
+			self.dequantize[len(self.meshes)] = (low, scale)
+		else:
+			attributes['POSITION'] = self.buffer.add_accessor(vertices[:, 0:3], target_vertices, bounds=True)
+			attributes['NORMAL'] = self.buffer.add_accessor(vertices[:, 3:6], target_vertices)
+
+		offset = 6
+		for index, layer in enumerate(mesh.uv_layers):
+			uvs = vertices[:, offset:offset+2]
+			# Unsigned 16 bit when inside the 0-1 range, which core glTF allows
+			if self.quantize and uvs.min() >= 0 and uvs.max() <= 1:
+				attributes['TEXCOORD_{}'.format(index)] = self.buffer.add_accessor(quantize_unit(uvs), target_vertices, normalized=True)
+			else:
+				attributes['TEXCOORD_{}'.format(index)] = self.buffer.add_accessor(uvs, target_vertices)
+			offset += 2
+		for index, layer in enumerate(color_layers):
+			colors = vertices[:, offset:offset+4]
+			if self.quantize:
+				attributes['COLOR_{}'.format(index)] = self.buffer.add_accessor(quantize_unit(np.clip(colors, 0, 1)), target_vertices, normalized=True)
+			else:
+				attributes['COLOR_{}'.format(index)] = self.buffer.add_accessor(colors, target_vertices)
+			offset += 4
+
+		# A primitive per material, all sharing the vertices. 16 bit indices
+		# when they fit, 65535 is left out as it restarts strips on some APIs.
+		triangles = lookup[corners].astype(np.uint16 if len(vertices) < 65535 else np.uint32)
+		triangle_materials = writer.get_material_indices(obj, triangle_materials)
+		primitives = []
+		for material in np.unique(triangle_materials):
+			primitive = {
+				'attributes': attributes,
+				'indices': self.buffer.add_accessor(triangles[triangle_materials == material].reshape(-1), target_indices),
+				'mode': 4
+			}
+			if len(materials) > 0:
+				primitive['material'] = self.get_material_index(materials[material])
+			primitives.append(primitive)
+
+		self.meshes.append({'name': obj.data.name, 'primitives': primitives})
+		return len(self.meshes) - 1
+
+
+	def get_material_index(self, material):
+		if material in self.material_indices:
+			return self.material_indices[material]
+
+		color, metallic, roughness = writer.get_material_values(material)
+		data = {
+			'name': material.name,
+			'pbrMetallicRoughness': {
+				'baseColorFactor': color,
+				'metallicFactor': metallic,
+				'roughnessFactor': roughness
+			},
+			'doubleSided': not material.use_backface_culling
+		}
+		if color[3] < 1:
+			data['alphaMode'] = 'BLEND'
+
+		self.material_indices[material] = len(self.materials)
+		self.materials.append(data)
+		return self.material_indices[material]
+
+
+	def add_hierarchy(self):
+		self.roots = []
+		for obj, index in self.node_indices.items():
+			if obj.parent in self.node_indices:
+				self.nodes[self.node_indices[obj.parent]].setdefault('children', []).append(index)
+			else:
+				self.roots.append(index)
+		self.add_dequantization()
+
+
+	def release(self):
+		# Drop references to Blender data, the file may be written on another thread
+		self.objects = None
+		self.depsgraph = None
+		self.node_indices = {}
+		self.mesh_indices = {}
+		self.material_indices = {}
+
+
+	def write(self, path):
+		# Only the collected data from here on, no bpy
+
+		is_gltf = os.path.splitext(path)[1].lower() == ".gltf"
+		buffer = {'byteLength': self.buffer.length}
+		if is_gltf:
+			path_bin = os.path.splitext(path)[0] + ".bin"
+			buffer['uri'] = os.path.basename(path_bin)
+
+		data = {
+			'asset': {'version': "2.0", 'generator': "FBX Bundle"},
+			'extensionsUsed': [extension_quantization] if self.dequantize else [],
+			'extensionsRequired': [extension_quantization] if self.dequantize else [],
+			'scene': 0,
+			'scenes': [{'nodes': self.roots}],
+			'nodes': self.nodes,
+			'meshes': self.meshes,
+			'materials': self.materials,
+			'accessors': self.buffer.accessors,
+			'bufferViews': self.buffer.views,
+			'buffers': [buffer] if self.buffer.length > 0 else []
+		}
+		# Empty arrays aren't valid glTF
+		data = {key: value for key, value in data.items() if value != []}
+
+		if is_gltf:
+			with open(path, 'w') as file:
+				json.dump(data, file, separators=(',', ':'))
+			if self.buffer.length > 0:
+				with open(path_bin, 'wb') as file:
+					self.buffer.copy_to(file)
+			return
+
+		content = json.dumps(data, separators=(',', ':')).encode()
+		content += b" " * (-len(content) % 4)
+		length_bin = self.buffer.length + -self.buffer.length % 4
+
+		length = 12 + 8 + len(content)
+		if length_bin > 0:
+			length += 8 + length_bin
+
+		with open(path, 'wb') as file:
+			file.write(struct.pack('<4sII', b"glTF", 2, length))
+			file.write(struct.pack('<II', len(content), chunk_json))
+			file.write(content)
+			if length_bin > 0:
+				file.write(struct.pack('<II', length_bin, chunk_bin))
+				self.buffer.copy_to(file)
+
+
+
+	def add_dequantization(self):
+		# Quantized meshes are moved onto their bounds by the node. Nodes with
+		# children get a child node for the mesh, so the children keep their scale.
+		for index, node in enumerate(list(self.nodes)):
+			if node.get('mesh') not in self.dequantize:
+				continue
+
+			offset, scale = self.dequantize[node['mesh']]
+			matrix = Matrix.LocRotScale(offset, None, (scale, scale, scale))
+			if 'children' in node:
+				child = {'name': "{}_mesh".format(node['name']), 'mesh': node.pop('mesh')}
+				set_transform(child, matrix)
+				node['children'].append(len(self.nodes))
+				self.nodes.append(child)
+			else:
+				set_transform(node, self.node_matrices[index] @ matrix)
+
+
+
+def set_transform(node, matrix):
+	for key in ('translation', 'rotation', 'scale'):
+		node.pop(key, None)
+
+	location, rotation, scale = matrix.decompose()
+	if location.length > 0:
+		node['translation'] = list(location)
+	if rotation.angle > 0:
+		node['rotation'] = [rotation.x, rotation.y, rotation.z, rotation.w]
+	if tuple(scale) != (1, 1, 1):
+		node['scale'] = list(scale)
+
+
+
+def quantize_positions(positions):
+	# Unsigned 16 bit on a uniform grid over the bounds, a uniform scale keeps
+	# the normals valid. Padded to 4 components for alignment.
+	low = positions.min(axis=0)
+	scale = float((positions.max(axis=0) - low).max()) / 65535 or 1.0
+	quantized = np.zeros((len(positions), 4), dtype=np.uint16)
+	quantized[:, :3] = np.clip(np.rint((positions - low) / scale), 0, 65535)
+	return quantized, Vector(low.tolist()), scale
+
+
+
+def quantize_normals(normals):
+	# Signed normalized 8 bit, padded to 4 components
+	quantized = np.zeros((len(normals), 4), dtype=np.int8)
+	quantized[:, :3] = np.rint(np.clip(normals, -1, 1) * 127)
+	return quantized
+
+
+
+def quantize_unit(values):
+	# Unsigned normalized 16 bit for values in the 0-1 range
+	return np.rint(values * 65535).astype(np.uint16)
+
+
+
+def get_vertices(values):
+	# Unique rows, compared as raw bytes, and the vertex of each input row
+	rows = np.ascontiguousarray(values).view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).reshape(-1)
+	unique, first, lookup = np.unique(rows, return_index=True, return_inverse=True)
+	return values[first], lookup.reshape(-1)
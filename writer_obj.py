@@ -0,0 +1,226 @@
+import bpy
+import os
+import numpy as np
+from mathutils import Matrix
+from bpy_extras.io_utils import axis_conversion
+
+from . import mesh_arrays
+from . import writer
+
+
+# OBJ and MTL writer, a replacement for the bpy.ops.export_scene.obj
+# operator removed in Blender 4.0. Blocks of vertices, UVs, normals and faces
+# are formatted with one string operation per chunk of rows and written
+# object by object, so memory stays bounded by the largest mesh.
+
+# Rows formatted and written at once
+chunk_size = 65536
+
+
+def write_rows(file, format, rows):
+	# One % operation per chunk instead of one per row
+	for start in range(0, len(rows), chunk_size):
+		block = rows[start:start+chunk_size]
+		file.write((format * len(block)) % tuple(block.ravel().tolist()))
+
+
+
+def get_name(name):
+	# No whitespace in OBJ names
+	return "_".join(name.split()) or "None"
+
+
+
+class Stream:
+	# Formats rows straight into the file as objects are read
+	def __init__(self, file):
+		self.file = file
+
+	def write(self, text):
+		self.file.write(text)
+
+	def write_rows(self, format, rows):
+		write_rows(self.file, format, rows)
+
+
+
+class Recording:
+	# Keeps text and rows to be formatted later, off Blender's main thread
+	def __init__(self):
+		self.blocks = []
+
+	def write(self, text):
+		self.blocks.append((text, None))
+
+	def write_rows(self, format, rows):
+		self.blocks.append((format, rows))
+
+	def replay(self, file):
+		for text, rows in self.blocks:
+			if rows is None:
+				file.write(text)
+			else:
+				write_rows(file, text, rows)
+
+
+
+def write(path, objects, **options):
+	with open(path, 'w', newline='\n') as file:
+		materials = add_objects(Stream(file), path, objects, **options)
+	write_mtl(path, materials)
+
+
+
+def defer(path, objects, **options):
+	# Reads the objects now and returns a function writing the files later,
+	# without touching bpy, so it can run on another thread
+	recording = Recording()
+	materials = add_objects(recording, path, objects, **options)
+
+	def finish():
+		with open(path, 'w', newline='\n') as file:
+			recording.replay(file)
+		write_mtl(path, materials)
+
+	return finish
+
+
+
+def add_objects(out, path, objects, global_scale=1.0, axis_forward='-Z', axis_up='Y', use_triangles=False, use_smooth_groups=True, use_uvs=True, use_normals=True, use_materials=True, depsgraph=None):
+	# Returns name and values of the used materials, None without materials
+	depsgraph = depsgraph or bpy.context.evaluated_depsgraph_get()
+	global_matrix = Matrix.Scale(global_scale, 4) @ axis_conversion(to_forward=axis_forward, to_up=axis_up).to_4x4()
+
+	materials = []
+	offsets = [1, 1, 1]
+
+	out.write("# FBX Bundle OBJ\n")
+	if use_materials:
+		out.write("mtllib {}\n".format(os.path.basename(get_path_mtl(path))))
+
+	for obj in objects:
+		if obj.type not in ('MESH', 'CURVE', 'FONT', 'SURFACE', 'META'):
+			continue
+
+		obj_eval = obj.evaluated_get(depsgraph)
+		mesh = obj_eval.to_mesh()
+		try:
+			if mesh and len(mesh.polygons) > 0:
+				out.write("o {}\n".format(get_name(obj.name)))
+				write_mesh(out, obj, mesh, global_matrix @ obj.matrix_world, offsets, materials, use_triangles, use_smooth_groups, use_uvs, use_normals, use_materials)
+		finally:
+			obj_eval.to_mesh_clear()
+
+	if not use_materials:
+		return None
+	return [(get_name(material.name), writer.get_material_values(material)) for material in materials]
+
+
+
+def get_path_mtl(path):
+	return os.path.splitext(path)[0] + ".mtl"
+
+
+
+def write_mesh(out, obj, mesh, matrix, offsets, materials, use_triangles, use_smooth_groups, use_uvs, use_normals, use_materials):
+	positions = mesh_arrays.get_positions(mesh).astype(np.float64)
+	positions = positions @ np.array(matrix.to_3x3()).T + np.array(matrix.translation)
+	out.write_rows("v %.6f %.6f %.6f\n", positions)
+
+	# Corner columns of the face rows: vertex, UV and normal index
+	columns = [mesh_arrays.get_corner_verts(mesh) + offsets[0]]
+	offsets[0] += len(positions)
+
+	layer = mesh.uv_layers.active
+	if use_uvs and layer:
+		uvs, lookup = writer.get_indexed(mesh_arrays.get_uvs(mesh, layer))
+		out.write_rows("vt %.6f %.6f\n", uvs)
+		columns.append(lookup + offsets[1])
+		offsets[1] += len(uvs)
+
+	if use_normals:
+		normal_matrix = np.array(matrix.to_3x3().inverted_safe().transposed())
+		normals = mesh_arrays.get_corner_normals(mesh) @ normal_matrix.T
+		normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+		normals, lookup = writer.get_indexed(np.round(normals, 4))
+		out.write_rows("vn %.4f %.4f %.4f\n", normals)
+		columns.append(lookup + offsets[2])
+		offsets[2] += len(normals)
+
+	corners = np.stack(columns, axis=1)
+	# Mirrored objects wind their faces the other way
+	flip = matrix.determinant() < 0
+	if len(columns) == 3:
+		corner_format = " %d/%d/%d"
+	elif use_uvs and layer:
+		corner_format = " %d/%d"
+	elif use_normals:
+		corner_format = " %d//%d"
+	else:
+		corner_format = " %d"
+
+	# Corners of every face and the polygon it comes from
+	sizes = mesh_arrays.get_face_sizes(mesh)
+	if use_triangles:
+		triangles, _ = mesh_arrays.get_triangles(mesh)
+		polygons = np.repeat(np.arange(len(sizes)), sizes)[triangles[:, 0]]
+		face_sizes = np.full(len(triangles), 3)
+	else:
+		starts = mesh_arrays.get_face_starts(mesh)
+		polygons = np.arange(len(sizes))
+		face_sizes = sizes
+
+	if use_smooth_groups:
+		smooth = np.array(mesh.calc_smooth_groups(use_bitflags=False)[0], dtype=np.int32)
+	else:
+		smooth = mesh_arrays.get_face_smooth(mesh).astype(np.int32)
+	smooth = smooth[polygons]
+
+	material_list = writer.get_materials(obj)
+	material = writer.get_material_indices(obj, mesh_arrays.get_material_indices(mesh))[polygons]
+	for item in material_list:
+		if item not in materials:
+			materials.append(item)
+
+	# Runs of faces with the same material, smooth group and size
+	order = np.lexsort((face_sizes, smooth, material))
+	keys = np.stack([material[order], smooth[order], face_sizes[order]], axis=1)
+	bounds = np.concatenate([[0], np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1, [len(order)]])
+
+	current_material, current_group = None, None
+	for start, end in zip(bounds[:-1], bounds[1:]):
+		material_index, group, size = (int(value) for value in keys[start])
+		if use_materials and len(material_list) > 0 and material_index != current_material:
+			out.write("usemtl {}\n".format(get_name(material_list[material_index].name)))
+			current_material = material_index
+		if group != current_group:
+			out.write("s {}\n".format(group if group > 0 else "off"))
+			current_group = group
+
+		run = order[start:end]
+		if use_triangles:
+			rows = corners[triangles[run]]
+		else:
+			rows = corners[starts[run][:, None] + np.arange(size)]
+		if flip:
+			rows = rows[:, ::-1]
+		out.write_rows("f" + corner_format * size + "\n", rows)
+
+
+
+def write_mtl(path, materials):
+	if materials is None:
+		return
+
+	with open(get_path_mtl(path), 'w', newline='\n') as file:
+		file.write("# FBX Bundle MTL\n")
+		for name, (color, metallic, roughness) in materials:
+			file.write("\nnewmtl {}\n".format(name))
+			file.write("Ns {:.6f}\n".format((1.0 - roughness) ** 2 * 1000))
+			file.write("Ka {0:.6f} {0:.6f} {0:.6f}\n".format(metallic))
+			file.write("Kd {:.6f} {:.6f} {:.6f}\n".format(*color[:3]))
+			file.write("Ks 0.500000 0.500000 0.500000\n")
+			file.write("Ke 0.000000 0.000000 0.000000\n")
+			file.write("Ni 1.450000\n")
+			file.write("d {:.6f}\n".format(color[3]))
+			file.write("illum 2\n")